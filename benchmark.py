@@ -0,0 +1,558 @@
+"""
+소설 파일 정리 프로그램 성능 측정 도구
+
+가상의 한국어/영어 소설 라이브러리를 생성하여 검색, 해시, 그룹화, 유사도 계산
+단계의 처리 시간과 처리량, 최대 메모리 사용량(RSS)을 측정합니다.
+그룹화 결과는 기준 결과(golden)와 비교하여 성능 개선이 결과를 바꾸지 않았는지 확인합니다.
+인코딩, BOM, 줄바꿈만 다른 같은 글의 내용 지문이 같은 내용으로 판정되는지도 확인합니다.
+
+사용 예:
+    python benchmark.py --sizes 10000,100000 --update-golden
+    python benchmark.py --sizes 10000,100000,1000000 --no-disk
+    python benchmark.py --sizes 10000 --latency 5 --io-backend network
+"""
+import os
+import sys
+import io
+import json
+import codecs
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+import threading
+import builtins
+import contextlib
+from typing import List, Dict, Tuple, Optional
+
+import psutil
+
+import novel_core
+from novel_core import FileStore, normalize_filename, parse_title
+
+# 기본 설정
+DEFAULT_SIZES = (10000, 100000, 1000000)  # 측정할 파일 수
+DEFAULT_SEED = 20240101  # 생성기 난수 시드
+DEFAULT_THRESHOLD = 0.75  # 프로그램 기본 유사도 임계값과 동일
+DEFAULT_PAIRS = 100000  # 유사도 계산 단계에서 비교할 쌍의 수
+FILES_PER_DIR = 200  # 생성할 폴더 하나에 담을 파일 수
+RSS_SAMPLE_INTERVAL = 0.05  # 메모리 사용량 측정 간격 (초)
+GOLDEN_FILENAME = 'benchmark_golden.json'  # 기준 결과 파일 이름
+STARTUP_RUNS = 5  # 시작 시간 측정 반복 횟수 (가장 짧은 값을 사용)
+TEXT_FINGERPRINT_CHARS = 600 * 1024  # 내용 지문 확인에 사용할 글의 길이 (글자 수)
+
+# 제목 생성에 사용할 단어
+KOREAN_WORDS = [
+    '달빛', '조각사', '화산', '귀환', '전지적', '독자', '시점', '나혼자만', '레벨업', '검술',
+    '마법사', '회귀', '환생', '황제', '공작', '영애', '아카데미', '천재', '기사', '용사',
+    '마왕', '던전', '헌터', '무림', '검신', '천마', '신의', '탑', '게임', '세계',
+    '재벌집', '막내아들', '악역', '영주', '전생', '최강', '대마법사', '성녀', '북부', '대공',
+]
+KOREAN_SYLLABLES = '가나다라마바사아자차카타파하강남동룡명백서설신연월윤진청태한현혜화'
+ENGLISH_WORDS = [
+    'Omniscient', 'Reader', 'Solo', 'Leveling', 'Return', 'Mount', 'Hua', 'Sword', 'Master',
+    'Legendary', 'Moonlight', 'Sculptor', 'Tower', 'God', 'Regressor', 'Academy', 'Hunter',
+    'Dragon', 'Knight', 'Emperor', 'Villainess', 'Second', 'Life', 'Lord', 'Shadow',
+]
+AUTHORS = ['남희성', '비가', '싱숑', '추공', '이기영', '산경', '김재한', '유진성', 'SIU', 'Sing-Shong']
+PART_SUFFIXES = ['상', '중', '하']
+
+def _make_title(rng: random.Random) -> Tuple[str, bool]:
+    """임의의 작품 제목과 영어 제목 여부를 반환합니다."""
+    if rng.random() < 0.15:
+        words = rng.sample(ENGLISH_WORDS, rng.randint(2, 4))
+        return ' '.join(words), True
+    words = rng.sample(KOREAN_WORDS, rng.randint(1, 3))
+    # 단어 조합만으로는 제목이 겹치므로 임의의 음절을 덧붙여 다양하게 만듭니다.
+    words.append(''.join(rng.choice(KOREAN_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return ''.join(words) if rng.random() < 0.5 else ' '.join(words), False
+
+def _decorate(stem: str, rng: random.Random, author: str) -> str:
+    """작가 태그, 완결 표시 같은 부가 정보를 임의로 붙입니다."""
+    if rng.random() < 0.3:
+        stem = f"[{author}] {stem}"
+    roll = rng.random()
+    if roll < 0.15:
+        stem += ' 완결'
+    elif roll < 0.2:
+        stem += ' 完'
+    elif roll < 0.25:
+        stem += ' (완)'
+    return stem
+
+def generate_library(count: int, seed: int = DEFAULT_SEED, duplicate_ratio: float = 0.2,
+                     series_ratio: float = 0.3, min_size: int = 100 * 1024,
+                     max_size: int = 10 * 1024 * 1024) -> List[Tuple[str, str, int, int]]:
+    """가상의 소설 라이브러리 목록을 생성합니다.
+
+    duplicate_ratio 는 다른 이름이나 형식의 사본이 추가되는 작품의 비율,
+    series_ratio 는 여러 권으로 나뉜 작품의 비율입니다. 반환값은
+    (상대 폴더, 파일 이름, 크기, 내용 번호) 목록이며, 내용 번호가 같은 파일은
+    내용이 완전히 같은 사본입니다. 같은 시드로는 항상 같은 목록을 만듭니다.
+    """
+    rng = random.Random(seed)
+    entries = []
+    names = set()
+    content_id = 0
+
+    def add(stem: str, ext: str, size: int, content: int) -> None:
+        directory = f"d{len(entries) // FILES_PER_DIR:05d}"
+        name = stem + ext
+        if (directory, name) in names:
+            return
+        names.add((directory, name))
+        entries.append((directory, name, size, content))
+
+    while len(entries) < count:
+        title, english = _make_title(rng)
+        author = rng.choice(AUTHORS)
+        ext = '.epub' if rng.random() < 0.4 else '.txt'
+
+        if rng.random() < series_ratio:
+            volumes = rng.randint(2, 12)
+            style = rng.randrange(4)
+            for volume in range(1, volumes + 1):
+                if style == 0:
+                    stem = f"{title} {volume}권"
+                elif style == 1:
+                    stem = f"{title} vol.{volume}" if english else f"{title} {volume}"
+                elif style == 2 and volumes <= 3:
+                    stem = f"{title} {PART_SUFFIXES[volume - 1]}"
+                else:
+                    stem = f"{title} 시즌{volume}"
+                add(_decorate(stem, rng, author), ext, rng.randint(min_size, max_size), content_id)
+                content_id += 1
+        else:
+            chapters = rng.randint(50, 400)
+            stem = f"{title} 1-{chapters}"
+            size = rng.randint(min_size, max_size)
+            add(_decorate(stem, rng, author), ext, size, content_id)
+
+            if rng.random() < duplicate_ratio:
+                roll = rng.random()
+                if roll < 0.3:
+                    # 다른 폴더에 있는 완전히 같은 사본
+                    add(stem + ' (1)', ext, size, content_id)
+                elif roll < 0.6:
+                    # 다른 형식으로 변환된 사본
+                    other = '.txt' if ext == '.epub' else '.epub'
+                    add(_decorate(stem, rng, author), other, int(size * rng.uniform(0.8, 1.2)),
+                        content_id + 1)
+                    content_id += 1
+                else:
+                    # 연재 중에 받은 이전 판본
+                    add(f"{title} 1-{max(1, chapters - rng.randint(1, 30))}", ext,
+                        int(size * rng.uniform(0.7, 1.0)), content_id + 1)
+                    content_id += 1
+            content_id += 1
+
+    return entries[:count]
+
+def write_library(root_dir: str, entries: List[Tuple[str, str, int, int]]) -> None:
+    """생성한 목록대로 파일을 만듭니다.
+
+    파일 앞부분에 내용 번호를 기록하고 나머지는 truncate 로 채워 디스크 사용을 줄입니다.
+    """
+    for directory, name, size, content in entries:
+        dir_path = os.path.join(root_dir, directory)
+        os.makedirs(dir_path, exist_ok=True)
+        with open(os.path.join(dir_path, name), 'wb') as f:
+            f.write(f"content-{content}\n".encode('ascii'))
+            f.truncate(size)
+
+def generate_text(chars: int, seed: int) -> str:
+    """단어와 임의의 음절로 이루어진 가상의 소설 본문을 생성합니다."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < chars:
+        words = [rng.choice(KOREAN_WORDS) if rng.random() < 0.3 else
+                 ''.join(rng.choice(KOREAN_SYLLABLES) for _ in range(rng.randint(1, 4)))
+                 for _ in range(rng.randint(3, 30))]
+        line = ' '.join(words) + rng.choice('.!?')
+        if rng.random() < 0.3:
+            line = f'"{line}" {rng.randint(1, 999)}'
+        lines.append(line)
+        if rng.random() < 0.1:
+            lines.append('')
+        total += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+def check_text_fingerprints(seed: int, work_dir: Optional[str] = None) -> bool:
+    """같은 글을 인코딩, BOM, 줄바꿈만 바꿔 저장한 사본의 내용 지문을 비교합니다.
+
+    모든 사본 사이의 거리가 TEXT_SIMHASH_DISTANCE 이하이고, 다른 글과의 거리는
+    그보다 커야 통과합니다.
+    """
+    text = generate_text(TEXT_FINGERPRINT_CHARS, seed)
+    variants = {
+        'UTF-8': text.encode('utf-8'),
+        'UTF-8 BOM': codecs.BOM_UTF8 + text.encode('utf-8'),
+        'CP949': text.encode('cp949'),
+        'CP949 CRLF': text.replace('\n', '\r\n').encode('cp949'),
+        'UTF-16 LE': text.encode('utf-16-le'),
+        'UTF-16 LE BOM': codecs.BOM_UTF16_LE + text.encode('utf-16-le'),
+        'UTF-16 BE': text.encode('utf-16-be'),
+        'UTF-16 BE BOM': codecs.BOM_UTF16_BE + text.encode('utf-16-be'),
+        '다른 글': generate_text(TEXT_FINGERPRINT_CHARS, seed + 1).encode('utf-8'),
+    }
+    text_dir = tempfile.mkdtemp(prefix='clean_up_novel_text_', dir=work_dir)
+    try:
+        fingerprints = {}
+        for index, (name, data) in enumerate(variants.items()):
+            path = os.path.join(text_dir, f"{index}.txt")
+            with open(path, 'wb') as f:
+                f.write(data)
+            fingerprints[name] = novel_core.fingerprint_text(path, len(data))
+    finally:
+        shutil.rmtree(text_dir, ignore_errors=True)
+
+    other = fingerprints.pop('다른 글')
+    if None in fingerprints.values() or other is None:
+        print("❌ 내용 지문을 계산하지 못했습니다.")
+        return False
+    distance = max(bin(a ^ b).count('1') for a in fingerprints.values() for b in fingerprints.values())
+    other_distance = min(bin(other ^ value).count('1') for value in fingerprints.values())
+    limit = novel_core.TEXT_SIMHASH_DISTANCE
+    if distance <= limit < other_distance:
+        print(f"✓ 내용 지문: 인코딩별 사본 최대 거리 {distance}, 다른 글 거리 {other_distance} (기준 {limit})")
+        return True
+    base = fingerprints['UTF-8']
+    print(f"❌ 내용 지문이 기준 {limit} 을 벗어났습니다: " +
+          ", ".join(f"{name} {bin(base ^ value).count('1')}" for name, value in fingerprints.items()) +
+          f", 다른 글 {other_distance}")
+    return False
+
+def build_store(entries: List[Tuple[str, str, int, int]], root_dir: str = '') -> FileStore:
+    """디스크를 거치지 않고 생성한 목록에서 바로 FileStore 를 만듭니다."""
+    store = FileStore()
+    for directory, name, size, _ in entries:
+        stem, ext = os.path.splitext(name)
+        store.add(os.path.join(root_dir, directory), name, normalize_filename(stem),
+                  size, 0, parse_title(stem, ext))
+    return store
+
+class _SlowEntry:
+    """stat() 에 지연 시간을 더한 os.DirEntry 대리 객체입니다."""
+
+    def __init__(self, entry: os.DirEntry, latency: float):
+        self._entry = entry
+        self._latency = latency
+
+    def __getattr__(self, name: str):
+        return getattr(self._entry, name)
+
+    def __fspath__(self) -> str:
+        return self._entry.path
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        time.sleep(self._latency)
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+class LatencyFS:
+    """로컬 파일 시스템 호출에 고정된 지연 시간을 더해 네트워크 공유 폴더를 흉내냅니다.
+
+    구간 안에서 os.scandir, os.stat, os.listdir, os.rename, open 과 scandir 이 돌려준
+    항목의 stat() 이 호출마다 latency 초씩 늦어집니다. 지연은 time.sleep 으로
+    만들므로 GIL 을 잡지 않아, 동시에 보낸 호출은 실제 공유 폴더처럼 겹쳐서 기다립니다.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._saved = []
+
+    def _patch(self, owner, name: str) -> None:
+        original = getattr(owner, name)
+        latency = self.latency
+
+        def slow(*args, **kwargs):
+            time.sleep(latency)
+            return original(*args, **kwargs)
+
+        self._saved.append((owner, name, original))
+        setattr(owner, name, slow)
+
+    def __enter__(self) -> 'LatencyFS':
+        original_scandir = os.scandir
+        latency = self.latency
+
+        @contextlib.contextmanager
+        def scandir(path='.'):
+            time.sleep(latency)
+            with original_scandir(path) as entries:
+                yield (_SlowEntry(entry, latency) for entry in entries)
+
+        self._saved.append((os, 'scandir', original_scandir))
+        os.scandir = scandir
+        for name in ('stat', 'listdir', 'rename'):
+            self._patch(os, name)
+        self._patch(builtins, 'open')
+        return self
+
+    def __exit__(self, *exc) -> None:
+        while self._saved:
+            owner, name, original = self._saved.pop()
+            setattr(owner, name, original)
+
+def io_context(args: argparse.Namespace):
+    """--latency 가 주어지면 LatencyFS 를, 아니면 아무것도 하지 않는 컨텍스트를 반환합니다."""
+    if args.latency > 0:
+        return LatencyFS(args.latency / 1000)
+    return contextlib.nullcontext()
+
+class RssSampler:
+    """구간 안에서의 최대 메모리 사용량(RSS)을 주기적으로 측정합니다."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        while True:
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self) -> 'RssSampler':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+def run_stage(results: List[dict], name: str, items: int, func, quiet: bool = True):
+    """한 단계를 실행하고 시간, 처리량, 최대 RSS 를 기록합니다."""
+    output = io.StringIO() if quiet else sys.stdout
+    with RssSampler() as sampler, contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+    results.append({
+        'stage': name,
+        'items': items,
+        'seconds': round(elapsed, 4),
+        'per_second': round(items / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss': sampler.peak,
+    })
+    return value
+
+def measure_startup(runs: int = STARTUP_RUNS) -> Dict[str, float]:
+    """새 프로세스에서 모듈을 불러오는 데 걸리는 시간(초)을 잽니다.
+
+    spawn 방식의 작업 프로세스는 시작할 때마다 main 과 novel_core 를 다시 불러오므로
+    이 시간이 작업 프로세스 하나의 시작 비용입니다. 인터프리터 자체의 시작 시간은 뺍니다.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def best(code: str) -> float:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=script_dir, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    interpreter = best('pass')
+    return {module: round(max(0.0, best(f'import {module}') - interpreter), 4)
+            for module in ('novel_core', 'main')}
+
+def canonical_groups(groups: Dict[str, List[int]], store: FileStore, root_dir: str) -> List[List[str]]:
+    """그룹 결과를 비교할 수 있도록 상대 경로로 바꾸어 정렬합니다."""
+    return sorted(sorted(os.path.relpath(store.path_str(i), root_dir).replace(os.sep, '/')
+                         for i in file_ids)
+                  for file_ids in groups.values())
+
+def canonical_stream(groups, root_dir: str) -> List[List[str]]:
+    """(그룹 이름, FileStore) 스트림을 canonical_groups 와 같은 형식으로 바꿉니다."""
+    return sorted(sorted(os.path.relpath(group_store.path_str(i), root_dir).replace(os.sep, '/')
+                         for i in range(len(group_store)))
+                  for _, group_store in groups)
+
+def groups_digest(groups: List[List[str]]) -> str:
+    return hashlib.sha256(json.dumps(groups, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def sample_pairs(store: FileStore, limit: int, seed: int) -> List[Tuple[int, int]]:
+    """같은 후보 그룹 안에서 유사도 계산 대상이 될 쌍을 고릅니다."""
+    rng = random.Random(seed)
+    buckets = [ids for ids in novel_core.build_candidate_index(store, range(len(store))).values()
+               if len(ids) > 1]
+    pairs = []
+    while buckets and len(pairs) < limit:
+        ids = rng.choice(buckets)
+        i, j = rng.sample(ids, 2)
+        pairs.append((i, j))
+    return pairs
+
+def benchmark_size(count: int, args: argparse.Namespace) -> Tuple[List[dict], List[List[str]]]:
+    """파일 수 하나에 대해 모든 단계를 측정합니다."""
+    results = []
+    novel_core.CACHE.clear()
+    entries = run_stage(results, 'generate', count, lambda: generate_library(
+        count, args.seed, args.duplicate_ratio, args.series_ratio, args.min_size, args.max_size))
+
+    work_dir = tempfile.mkdtemp(prefix='clean_up_novel_bench_', dir=args.work_dir)
+    root_dir = os.path.join(work_dir, 'library')
+    try:
+        if args.no_disk:
+            if args.shuffle:
+                entries = random.Random(args.seed).sample(entries, len(entries))
+            store = run_stage(results, 'build', count, lambda: build_store(entries, root_dir))
+        else:
+            run_stage(results, 'write', count, lambda: write_library(root_dir, entries))
+            with contextlib.ExitStack() as stack:
+                io_backend = None
+                if args.io_backend == 'network':
+                    io_backend = stack.enter_context(novel_core.IOBackend(args.io_workers))
+                stack.enter_context(io_context(args))
+                records = run_stage(results, 'scan', count,
+                                    lambda: list(novel_core.scan_files(root_dir, io_backend=io_backend)))
+                # 검색 순서는 스레드 실행 순서에 따라 달라지므로 경로 순으로 정렬합니다.
+                # --shuffle 이면 대신 섞어서, 그룹화 결과가 입력 순서와 관계없는지 확인합니다.
+                records.sort(key=lambda record: (record[0], record[1]))
+                if args.shuffle:
+                    random.Random(args.seed).shuffle(records)
+                store = FileStore().extend(records)
+                run_stage(results, 'hash', count, lambda: novel_core.find_exact_duplicates(
+                    store, range(len(store)), io_backend=io_backend))
+
+        novel_core.CACHE.clear()
+        pairs = sample_pairs(store, args.pairs, args.seed)
+        run_stage(results, 'similarity', len(pairs), lambda: [
+            novel_core.calculate_similarity(store.stem(i), store.stem(j), store.infos[i], store.infos[j])
+            for i, j in pairs])
+        novel_core.CACHE.clear()
+        run_stage(results, 'batch_score', len(pairs), lambda: novel_core.SimilarityScorer(
+            args.similarity).score_pairs(((store.stem(i), store.stem(j)) for i, j in pairs),
+                                         args.threshold))
+
+        novel_core.CACHE.clear()
+        if args.memory_budget is not None:
+            def group_external() -> List[List[str]]:
+                records = (store.record(i) for i in range(len(store)))
+                with novel_core.ExternalGrouping(records, args.threshold, args.memory_budget * 1024 * 1024,
+                                                 content_hash=not args.no_disk, workers=args.workers,
+                                                 similarity_mode=args.similarity,
+                                                 temp_dir=work_dir,
+                                                 size_ratios=tuple(args.size_ratio)) as grouping:
+                    return canonical_stream(grouping, root_dir)
+            return results, run_stage(results, 'group', count, group_external, quiet=not args.verbose)
+        groups = run_stage(results, 'group', count, lambda: novel_core.group_similar_files(
+            store, args.threshold, content_hash=not args.no_disk, workers=args.workers,
+            similarity_mode=args.similarity, size_ratios=tuple(args.size_ratio)),
+            quiet=not args.verbose)
+        return results, canonical_groups(groups, store, root_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def golden_key(count: int, args: argparse.Namespace) -> str:
+    """생성 조건이 같을 때만 기준 결과를 비교하도록 조건을 키로 만듭니다."""
+    key = (f"n={count},seed={args.seed},dup={args.duplicate_ratio},series={args.series_ratio},"
+           f"size={args.min_size}-{args.max_size},threshold={args.threshold},"
+           f"hash={not args.no_disk}")
+    if args.similarity != novel_core.SIMILARITY_MODE:
+        key += f",similarity={args.similarity}"
+    if tuple(args.size_ratio) != (novel_core.SIZE_RATIO_LOWER, novel_core.SIZE_RATIO_UPPER):
+        key += f",size_ratio={args.size_ratio[0]}-{args.size_ratio[1]}"
+    return key
+
+def format_report(count: int, results: List[dict]) -> str:
+    lines = [f"\n=== 파일 {count:,}개 ===",
+             f"{'단계':<12}{'항목 수':>12}{'시간(초)':>12}{'처리량(/초)':>16}{'최대 RSS':>12}"]
+    for result in results:
+        per_second = f"{result['per_second']:,.0f}" if result['per_second'] else '-'
+        lines.append(f"{result['stage']:<12}{result['items']:>12,}{result['seconds']:>12.3f}"
+                     f"{per_second:>16}{novel_core.format_file_size(result['peak_rss']):>12}")
+    return '\n'.join(lines)
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="소설 파일 정리 프로그램 성능 측정")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="측정할 파일 수 (쉼표로 구분, 기본값: 10000,100000,1000000)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="생성기 난수 시드")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2, help="사본이 있는 작품 비율")
+    parser.add_argument('--series-ratio', type=float, default=0.3, help="여러 권으로 된 작품 비율")
+    parser.add_argument('--min-size', type=int, default=100 * 1024, help="최소 파일 크기 (바이트)")
+    parser.add_argument('--max-size', type=int, default=10 * 1024 * 1024, help="최대 파일 크기 (바이트)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="유사도 임계값")
+    parser.add_argument('--pairs', type=int, default=DEFAULT_PAIRS, help="유사도 계산 단계의 비교 쌍 수")
+    parser.add_argument('--similarity', choices=novel_core.SIMILARITY_MODES, default=novel_core.SIMILARITY_MODE,
+                        help="유사도 계산 방식")
+    parser.add_argument('--size-ratio', type=float, nargs=2, metavar=('LOWER', 'UPPER'),
+                        default=(novel_core.SIZE_RATIO_LOWER, novel_core.SIZE_RATIO_UPPER),
+                        help="이름을 비교할 두 파일의 크기 비율 범위")
+    parser.add_argument('--workers', type=int, default=None, help="그룹화 프로세스 수")
+    parser.add_argument('--memory-budget', type=int, metavar='MB', default=None,
+                        help="그룹화 단계를 메모리 예산 모드(ExternalGrouping)로 측정")
+    parser.add_argument('--latency', type=float, metavar='MS', default=0,
+                        help="검색/해시 단계의 파일 시스템 호출마다 더할 지연 시간 (네트워크 공유 폴더 흉내)")
+    parser.add_argument('--io-backend', choices=novel_core.IO_BACKENDS, default='local',
+                        help="검색/해시 단계의 입출력 방식")
+    parser.add_argument('--io-workers', type=int, default=novel_core.IO_WORKERS,
+                        help="--io-backend network 의 최대 동시 입출력 작업 수")
+    parser.add_argument('--no-disk', action='store_true',
+                        help="파일을 만들지 않고 메모리에서 그룹화만 측정 (검색/해시 단계 생략)")
+    parser.add_argument('--shuffle', action='store_true',
+                        help="검색 레코드 순서를 섞어 그룹화 (결과는 섞지 않았을 때의 기준 결과와 같아야 함)")
+    parser.add_argument('--work-dir', default=None, help="가상 라이브러리를 만들 임시 폴더 위치")
+    parser.add_argument('--golden', default=GOLDEN_FILENAME, help="기준 결과 파일")
+    parser.add_argument('--update-golden', action='store_true', help="현재 결과를 기준 결과로 저장")
+    parser.add_argument('--json', default=None, help="측정 결과를 JSON 으로 저장할 파일")
+    parser.add_argument('--verbose', action='store_true', help="그룹화 단계의 진행 메시지 표시")
+    return parser.parse_args(argv)
+
+def main_benchmark(argv: List[str]) -> int:
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    golden = {}
+    if os.path.exists(args.golden):
+        with open(args.golden, encoding='utf-8') as f:
+            golden = json.load(f)
+
+    novel_core.configure_cache()
+    startup = measure_startup()
+    print("모듈 불러오기 시간: " + ", ".join(f"{module} {seconds * 1000:.1f}ms"
+                                           for module, seconds in startup.items()))
+
+    report = {'startup': startup}
+    mismatches = 0 if check_text_fingerprints(args.seed, args.work_dir) else 1
+    for count in sizes:
+        results, groups = benchmark_size(count, args)
+        print(format_report(count, results))
+
+        key = golden_key(count, args)
+        current = {'groups': len(groups), 'files': sum(map(len, groups)),
+                   'digest': groups_digest(groups)}
+        expected = golden.get(key)
+        if args.update_golden:
+            golden[key] = current
+            print(f"기준 결과 저장: 그룹 {current['groups']:,}개, 파일 {current['files']:,}개")
+        elif expected is None:
+            print("기준 결과 없음 (--update-golden 으로 저장할 수 있습니다)")
+        elif expected != current:
+            mismatches += 1
+            print(f"❌ 그룹화 결과가 기준과 다릅니다: 기준 그룹 {expected['groups']:,}개/파일 "
+                  f"{expected['files']:,}개, 현재 그룹 {current['groups']:,}개/파일 {current['files']:,}개")
+        else:
+            print("✓ 그룹화 결과가 기준과 같습니다.")
+        report[key] = {'stages': results, 'result': current}
+
+    if args.update_golden:
+        with open(args.golden, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark(sys.argv[1:]))
@@ -1,18 +1,21 @@
 import os
-from pathlib import Path
-from difflib import SequenceMatcher
-from typing import List, Dict, Set, Tuple, Optional, Iterator
-import shutil
-import re
-from collections import defaultdict
-import multiprocessing as mp
-from tqdm import tqdm
 import sys
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
-from functools import lru_cache
-import psutil
-import msvcrt
+import sqlite3
+import argparse
+import contextlib
+import json
 import time
+import multiprocessing as mp
+from typing import List, Dict, Tuple, Optional
+
+from novel_core import (
+    CACHE, STATS, DUPLICATE_DIR_NAME, REPORT_PAGE_LINES, SIMILARITY_MODE, SIMILARITY_MODES,
+    SIZE_RATIO_LOWER, SIZE_RATIO_UPPER, IO_BACKENDS, IO_WORKERS, SERIES_REPORT_FORMATS,
+    WATCH_INTERVAL, KEEP_POLICIES, FileStore, ScanIndex, ExternalGrouping, Relocator, MoveJournal,
+    IOBackend, SeriesIndex, LiveIndex, LiveMatch, PollingWatcher, configure_cache, scan_files, open_watcher,
+    extract_epub_metadata, group_similar_files, format_file_size, write_report, report_format_for,
+    write_plan, write_series_report,
+)
 
 # Windows 환경에서 콘솔 출력 인코딩 설정
 def setup_encoding():
@@ -25,437 +28,47 @@ def setup_encoding():
     except Exception:
         pass
 
-# 버전 정보
-VERSION = "1.0.3"
-
-# 인코딩 설정 시도
-setup_encoding()
-
-# 시스템 메모리 정보 가져오기
-SYSTEM_MEMORY = psutil.virtual_memory()
-AVAILABLE_MEMORY = SYSTEM_MEMORY.available
-
-# 메모리 관련 상수 설정
-BATCH_SIZE = 100  # 배치 사이즈
-CACHE_SIZE = min(32768, int(AVAILABLE_MEMORY / (1024 * 1024)))  # 캐시 크기
-
-# 전역 캐시 설정
-filename_cache = {}
-similarity_cache = {}
-normalized_cache = {}
-
-# 컴파일된 정규식 패턴
-_METADATA_PATTERN = re.compile(r'[\[\(\{].*?[\]\)\}]')
-_SEPARATOR_PATTERN = re.compile(r'[_\-+\s]')
-_NUMBER_PATTERN = re.compile(r'\d+|완$|完$')
-_SPECIAL_PATTERN = re.compile(r'[^\w가-힣]')
-_VOLUME_PATTERNS = [
-    re.compile(pattern) for pattern in [
-        r'\d+권.*?완결',
-        r'\d+권.*?完',
-        r'\d+권',
-        r'제\d+권',
-        r'\d+부',
-        r'[상중하]권',
-        r'vol\.\d+',
-        r'volume\d+',
-        r'\d+-\d+권',
-        r'시즌\d+',
-        r'season\d+'
-    ]
-]
-
-# 시리즈 인식을 위한 패턴
-_SERIES_PATTERNS = [
-    r'(.*?)[\s_-]*(\d+)권',  # 기본 숫자+권
-    r'(.*?)[\s_-]*(\d+)-\d+권',  # 1-1권 형태
-    r'(.*?)[\s_-]*[제권]\s*(\d+)',  # 제1권, 권1 형태
-    r'(.*?)[\s_-]*(상|중|하)편?',  # 상/중/하 표기
-    r'(.*?)[\s_-]*(first|second|third|fourth|fifth)',  # 영문 표기
-    r'(.*?)[\s_-]*vol\.?\s*(\d+)',  # Vol.1 형태
-    r'(.*?)[\s_-]*part\.?\s*(\d+)',  # Part.1 형태
-    r'(.*?)[\s_-]*\#(\d+)',  # #1 형태
-    r'(.*?)[\s_-]*(\d+)화',  # 1화 형태
-    r'(.*?)[\s_-]*(\d+)장',  # 1장 형태
-    r'(.*?)[\s_-]*(\d+)편',  # 1편 형태
-    r'(.*?)[\s_-]*시즌\s*(\d+)',  # 시즌1 형태
-    r'(.*?)[\s_-]*season\s*(\d+)',  # season1 형태
-    r'(.*?)[\s_-]*(\d+)(?:\.(txt|epub))?$'  # 파일명 끝의 숫자
-]
-
-@lru_cache(maxsize=CACHE_SIZE)
-def remove_metadata_tags(filename: str) -> str:
-    """파일명에서 메타데이터 태그를 제거합니다."""
-    if filename in filename_cache:
-        return filename_cache[filename]
-    
-    cleaned = re.sub(r'[\[\(\{].*?[\]\)\}]', '', filename)
-    cleaned = ' '.join(cleaned.split())
-    result = cleaned.strip()
-    filename_cache[filename] = result
-    return result
-
-def is_volume_pattern(filename: str) -> bool:
-    """파일명이 권수 패턴을 가지고 있는지 확인합니다."""
-    filename_lower = filename.lower()
-    return any(pattern.search(filename_lower) for pattern in _VOLUME_PATTERNS)
-
-def get_base_title(filename: str) -> str:
-    """파일명에서 권수 표시를 제외한 기본 제목을 추출합니다."""
-    base = re.sub(r'\(완결\)|완결|\(完\)|完', '', filename)
-    base = re.sub(r'\d+권|\d+부|[상중하]권|vol\.\d+|volume\d+|\d+-\d+권|시즌\d+|season\d+', '', base)
-    base = re.sub(r'\d+|[^\w\s]', '', base)
-    base = ' '.join(base.split())
-    return base.strip()
-
-def normalize_series_name(title: str) -> str:
-    """시리즈명을 정규화합니다."""
-    normalized = re.sub(r'[\s\-_]+', '', title)
-    normalized = re.sub(r'[\[\(\{].*?[\]\)\}]', '', normalized)
-    normalized = re.sub(r'시리즈|series', '', normalized, flags=re.IGNORECASE)
-    normalized = re.sub(r'권|화|편|장|part|vol|volume', '', normalized, flags=re.IGNORECASE)
-    normalized = re.sub(r'\d+', '', normalized)
-    return normalized.lower()
-
-def extract_volume_info(filename: str) -> Optional[Tuple[str, str]]:
-    """파일명에서 시리즈명과 권수 정보를 추출합니다."""
-    for pattern in _SERIES_PATTERNS:
-        match = re.search(pattern, filename, re.IGNORECASE)
-        if match:
-            series_name = match.group(1).strip()
-            volume_info = match.group(2)
-            
-            if len(series_name) < 2:
-                continue
-                
-            return series_name, volume_info
-    
-    return None
-
-def get_volume_number(volume_info: str) -> Optional[int]:
-    """권수 정보를 숫자로 변환합니다."""
-    if volume_info.isdigit():
-        return int(volume_info)
-    
-    volume_map = {'상': 1, '중': 2, '하': 3}
-    if volume_info in volume_map:
-        return volume_map[volume_info]
-    
-    english_map = {
-        'first': 1, 'second': 2, 'third': 3,
-        'fourth': 4, 'fifth': 5
-    }
-    if volume_info.lower() in english_map:
-        return english_map[volume_info.lower()]
-    
-    return None
-
-def is_sequential_volumes(volumes: Set[int]) -> bool:
-    """권수가 연속적인지 확인합니다."""
-    if len(volumes) < 2:
-        return False
-        
-    sorted_vols = sorted(volumes)
-    sequential = all(sorted_vols[i+1] - sorted_vols[i] == 1 
-                    for i in range(len(sorted_vols)-1))
-    decimal_sequential = all(sorted_vols[i+1] - sorted_vols[i] in (1, 9, 10) 
-                           for i in range(len(sorted_vols)-1))
-    return sequential or decimal_sequential
-
-def is_same_series(files: List[Path]) -> bool:
-    """주어진 파일들이 같은 시리즈의 다른 권수인지 확인합니다."""
-    if len(files) < 2:
-        return False
-        
-    series_info = {}
-    base_name = None
-    
-    for file in files:
-        volume_info = extract_volume_info(file.stem)
-        if not volume_info:
-            return False
-            
-        series_name, volume = volume_info
-        normalized_name = normalize_series_name(series_name)
-        
-        if base_name is None:
-            base_name = normalized_name
-        elif base_name != normalized_name:
-            return False
-            
-        if normalized_name not in series_info:
-            series_info[normalized_name] = set()
-            
-        volume_num = get_volume_number(volume)
-        if volume_num is None:
-            return False
-            
-        series_info[normalized_name].add(volume_num)
-    
-    if len(series_info) == 1:
-        volumes = next(iter(series_info.values()))
-        if len(volumes) > 1 and len(volumes) == len(files):
-            return is_sequential_volumes(volumes)
-    
-    return False
-
-@lru_cache(maxsize=CACHE_SIZE)
-def normalize_filename(filename: str) -> str:
-    """파일명을 정규화합니다."""
-    cleaned = _METADATA_PATTERN.sub('', filename)
-    normalized = _SEPARATOR_PATTERN.sub('', cleaned)
-    
-    if not is_volume_pattern(normalized):
-        normalized = _NUMBER_PATTERN.sub('', normalized)
-    
-    normalized = _SPECIAL_PATTERN.sub('', normalized.lower())
-    return normalized.strip()
-
-@lru_cache(maxsize=CACHE_SIZE)
-def get_filename_key(filename: str) -> str:
-    """파일명에서 초기 그룹화를 위한 키를 생성합니다."""
-    normalized = normalize_filename(filename)
-    if len(normalized) >= 5:
-        return normalized[:5]
-    return normalized
-
-def is_different_pattern(filename1: str, filename2: str) -> bool:
-    """두 파일명의 패턴이 다른지 확인합니다."""
-    def extract_base_name(filename: str) -> str:
-        cleaned = re.sub(r'[\[\(\{].*?[\]\)\}]', '', filename)
-        cleaned = re.sub(r'\d+|[^\w\s가-힣]', '', cleaned)
-        return ' '.join(cleaned.split()).strip()
-    
-    base1 = extract_base_name(filename1)
-    base2 = extract_base_name(filename2)
-    
-    if base1 != base2:
-        return True
-    
-    return False
-
-def calculate_similarity(str1: str, str2: str) -> float:
-    """두 문자열 간의 유사도를 계산합니다."""
-    cache_key = f"{str1}:{str2}"
-    if cache_key in similarity_cache:
-        return similarity_cache[cache_key]
-    
-    info1 = extract_volume_info(str1)
-    info2 = extract_volume_info(str2)
-    
-    if info1 and info2:
-        series1, _ = info1
-        series2, _ = info2
-        norm1 = normalize_series_name(series1)
-        norm2 = normalize_series_name(series2)
-        
-        if norm1 == norm2:
-            similarity_cache[cache_key] = 0.0
-            return 0.0
-    
-    if is_different_pattern(str1, str2):
-        similarity_cache[cache_key] = 0.0
-        return 0.0
-    
-    result = SequenceMatcher(None, str1, str2).ratio()
-    similarity_cache[cache_key] = result
-    return result
-
-def process_file(file_path: Path) -> Optional[Tuple[Path, str, int]]:
-    """파일 정보를 처리합니다."""
-    try:
-        normalized_name = normalize_filename(file_path.stem)
-        if not normalized_name:
-            return None
-        
-        file_size = file_path.stat().st_size
-        return (file_path, normalized_name, file_size)
-    except Exception as e:
-        print(f"파일 처리 중 오류 발생: {file_path} - {str(e)}")
-        return None
-
-def process_file_batch(files: List[Path], batch_size: int = BATCH_SIZE) -> List[Tuple[Path, str, int]]:
-    """파일들을 배치로 처리합니다."""
-    results = []
-    max_workers = min(os.cpu_count() * 2, 48)
-    
-    def process_chunk(chunk: List[Path]) -> List[Tuple[Path, str, int]]:
-        chunk_results = []
-        for file in chunk:
-            try:
-                result = process_file(file)
-                if result:
-                    chunk_results.append(result)
-            except Exception as e:
-                print(f"파일 처리 중 오류 발생: {file} - {str(e)}")
-        return chunk_results
-    
-    chunks = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(process_chunk, chunk) for chunk in chunks]
-        
-        for future in futures:
-            try:
-                chunk_results = future.result()
-                results.extend(chunk_results)
-            except Exception as e:
-                print(f"배치 처리 중 오류 발생: {str(e)}")
-    
-    return results
-
-def find_all_files(root_dir: str) -> List[Tuple[Path, str, int]]:
-    """모든 .txt와 .epub 파일을 찾아서 병렬로 처리합니다."""
-    print("파일 검색 중...")
-    
-    def scan_directory(path: Path) -> Iterator[Path]:
-        for entry in path.rglob("*"):
-            if entry.is_file():
-                ext = entry.suffix.lower()
-                if ext in ('.txt', '.epub'):
-                    yield entry
-    
-    files = list(scan_directory(Path(root_dir)))
-    if not files:
-        return []
-    
-    cpu_count = os.cpu_count() or 1
-    worker_count = min(cpu_count * 2, 16)
-    
-    results = []
-    with ProcessPoolExecutor(max_workers=worker_count) as executor:
-        batch_size = max(20, min(100, len(files) // worker_count))
-        
-        with tqdm(total=len(files), desc="파일 처리 중") as pbar:
-            futures = []
-            for i in range(0, len(files), batch_size):
-                batch = files[i:i + batch_size]
-                futures.append(executor.submit(process_file_batch, batch))
-            
-            for future in as_completed(futures):
-                try:
-                    batch_results = future.result()
-                    results.extend(batch_results)
-                    pbar.update(len(batch_results))
-                except Exception as e:
-                    print(f"배치 처리 중 오류 발생: {str(e)}")
-    
-    return results
-
-def group_similar_files(files: List[Tuple[Path, str, int]], 
-                       similarity_threshold: float = 0.85) -> Dict[str, List[Path]]:
-    """유사한 이름을 가진 파일들을 그룹화합니다."""
-    series_groups = defaultdict(list)
-    for file_info in files:
-        file_path = file_info[0]
-        volume_info = extract_volume_info(file_path.stem)
-        if volume_info:
-            series_name, volume = volume_info
-            normalized_name = normalize_series_name(series_name)
-            series_groups[normalized_name].append(file_info)
-    
-    series_files = set()
-    for series_name, group in series_groups.items():
-        paths = [f[0] for f in group]
-        if len(paths) > 1 and is_same_series(paths):
-            series_files.update(paths)
-    
-    non_series_files = [f for f in files if f[0] not in series_files]
-    
-    size_groups = defaultdict(list)
-    for file_info in non_series_files:
-        size_mb = file_info[2] / (1024 * 1024)
-        size_group = int(size_mb)
-        size_groups[size_group].append(file_info)
-    
-    initial_groups = defaultdict(list)
-    for size_group in size_groups.values():
-        for file_info in size_group:
-            key = get_filename_key(file_info[1])
-            initial_groups[key].append(file_info)
-    
-    final_groups = {}
-    processed = set()
-    
-    for key, group_files in initial_groups.items():
-        for i, file1_info in enumerate(group_files):
-            file1, norm1, size1 = file1_info
-            if file1 in processed:
-                continue
-            
-            current_group = [file1]
-            processed.add(file1)
-            
-            min_size = size1 * 0.5
-            max_size = size1 * 1.5
-            
-            for file2_info in group_files[i+1:]:
-                file2, norm2, size2 = file2_info
-                if file2 in processed:
-                    continue
-                
-                if min_size <= size2 <= max_size:
-                    sim = calculate_similarity(file1.stem, file2.stem)
-                    if sim >= similarity_threshold:
-                        current_group.append(file2)
-                        processed.add(file2)
-            
-            if len(current_group) > 1:
-                final_groups[norm1] = current_group
-    
-    return final_groups
-
-def format_file_size(size_in_bytes: int) -> str:
-    """파일 크기를 읽기 쉬운 형식으로 변환합니다."""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_in_bytes < 1024:
-            return f"{size_in_bytes:.1f}{unit}"
-        size_in_bytes /= 1024
-    return f"{size_in_bytes:.1f}TB"
-
-def print_similar_groups(groups: Dict[str, List[Path]]):
-    """유사한 파일 그룹을 출력합니다."""
+def progress(iterable, desc: str):
+    """진행 표시줄을 붙입니다. tqdm 은 검색을 시작할 때 불러옵니다."""
+    from tqdm import tqdm
+    return tqdm(iterable, desc=desc, unit="개")
+
+def print_similar_groups(groups: Dict[str, List[int]], store: FileStore):
+    """유사한 파일 그룹을 출력합니다. 콘솔에서는 REPORT_PAGE_LINES 줄마다 멈춥니다."""
+    with STATS.stage('report') as stage:
+        page_lines = REPORT_PAGE_LINES if sys.stdout.isatty() else None
+        stage['items'] = write_report(groups, store, sys.stdout, 'text', page_lines,
+                                      prompt=get_user_input)
+
+def handle_duplicates(groups: Dict[str, List[int]], store: FileStore, root_dir: str,
+                      duplicate_dir: Optional[str] = None,
+                      journal: Optional[MoveJournal] = None):
+    """중복된 파일들을 처리합니다.
+
+    duplicate_dir 를 지정하지 않으면 Relocator 가 원본과 같은 장치의 폴더를 고릅니다.
+    journal 이 주어지면 그룹별 결정과 이동을 기록합니다. 이어서 하는 작업이라면
+    journal 을 미리 열어 두고, 새 작업이라면 여기서 start() 를 호출합니다.
+    """
     if not groups:
-        print("\n중복된 파일이 없습니다.")
         return
-        
-    print(f"\n{'='*50}")
-    print(f"총 {len(groups)}개의 중복 의심 파일 그룹이 발견되었습니다.")
-    print(f"{'='*50}")
     
-    for group_num, (group_name, files) in enumerate(groups.items(), 1):
-        print(f"\n[그룹 {group_num}] - {len(files)}개 파일")
-        print(f"{'-'*30}")
-        for file in files:
-            size = format_file_size(file.stat().st_size)
-            ext = file.suffix.lower()
-            print(f"  • {str(file)} ({size}) [{ext[1:]}]")
-
-def handle_duplicates(groups: Dict[str, List[Path]], duplicate_dir: str = 'duplicates'):
-    """중복된 파일들을 처리합니다."""
-    if not groups:
-        return
-        
-    duplicate_path = Path(duplicate_dir)
-    try:
-        duplicate_path.mkdir(exist_ok=True, parents=True)
-    except Exception as e:
-        print(f"\n❌ 중복 파일 폴더 생성 실패: {str(e)}")
-        print("관리자 권한으로 프로그램을 실행해주세요.")
-        return
+    relocator = Relocator(root_dir, duplicate_dir)
+    if journal is not None and not journal.unfinished:
+        journal.start(root_dir, groups, store)
     
     print(f"\n{'='*50}")
     print("중복 파일 처리를 시작합니다.")
     print(f"{'='*50}")
     
-    for group_num, (group_name, files) in enumerate(groups.items(), 1):
+    for group_num, (group_name, file_ids) in enumerate(groups.items(), 1):
+        files = [store.path_str(file_id) for file_id in file_ids]
         while True:
             print(f"\n[그룹 {group_num}/{len(groups)}] - {len(files)}개 파일")
             print(f"{'-'*30}")
             
-            for idx, file in enumerate(files, 1):
-                size = format_file_size(file.stat().st_size)
-                print(f"{idx:2d}. {str(file)} ({size})")
+            for idx, (file, file_id) in enumerate(zip(files, file_ids), 1):
+                size = format_file_size(store.sizes[file_id])
+                print(f"{idx:2d}. {file} ({size})")
             
             print(f"\n{'='*30}")
             print("선택 옵션:")
@@ -471,49 +84,23 @@ def handle_duplicates(groups: Dict[str, List[Path]], duplicate_dir: str = 'dupli
                 choice = int(choice)
                 if choice == 0:
                     print("\n이 그룹을 건너뜁니다.")
+                    if journal is not None:
+                        journal.skip(group_name)
                     break
                 elif 1 <= choice <= len(files):
                     keep_file = files[choice - 1]
-                    print(f"\n선택한 파일: {str(keep_file)}")
-                    print(f"나머지 파일들을 '{str(duplicate_path)}' 폴더로 이동합니다...")
+                    print(f"\n선택한 파일: {keep_file}")
+                    print(f"나머지 파일들을 '{DUPLICATE_DIR_NAME}' 폴더로 이동합니다...")
                     
-                    moved_count = 0
-                    for file in files:
-                        if file != keep_file:
-                            target_path = duplicate_path / file.name
-                            max_retries = 3
-                            retry_count = 0
-                            
-                            while retry_count < max_retries:
-                                try:
-                                    # 파일이 이미 존재하는 경우 새로운 이름 생성
-                                    if target_path.exists():
-                                        base = target_path.stem
-                                        ext = target_path.suffix
-                                        counter = 1
-                                        while target_path.exists():
-                                            target_path = duplicate_path / f"{base}_{counter}{ext}"
-                                            counter += 1
-                                    
-                                    # 파일 이동
-                                    shutil.move(str(file), str(target_path))
-                                    moved_count += 1
-                                    print(f"  ✓ {str(file)} -> {str(target_path)}")
-                                    break
-                                    
-                                except PermissionError:
-                                    retry_count += 1
-                                    if retry_count < max_retries:
-                                        print(f"  ⚠ {str(file)} - 권한 오류, 재시도 중... ({retry_count}/{max_retries})")
-                                        time.sleep(1)  # 잠시 대기
-                                    else:
-                                        print(f"  ✗ {str(file)} - 권한 오류로 이동 실패")
-                                        
-                                except Exception as e:
-                                    print(f"  ✗ {str(file)} - 이동 실패: {str(e)}")
-                                    break
+                    moves = relocator.plan(file for file in files if file != keep_file)
+                    if journal is not None:
+                        journal.plan(group_name, moves)
+                        journal.sync()
+                    moved = relocator.execute(moves)
+                    if journal is not None:
+                        journal.moved(moved)
                     
-                    print(f"\n{moved_count}개 파일을 이동했습니다.")
+                    print(f"\n{len(moved)}개 파일을 이동했습니다.")
                     break
                 else:
                     print("\n❌ 잘못된 번호입니다. 다시 선택해주세요.")
@@ -521,10 +108,18 @@ def handle_duplicates(groups: Dict[str, List[Path]], duplicate_dir: str = 'dupli
                 print("\n❌ 숫자를 입력해주세요.")
             except Exception as e:
                 print(f"\n❌ 오류가 발생했습니다: {str(e)}")
+    
+    retried = relocator.retry_deferred()
+    if retried:
+        print(f"\n{len(retried)}개 파일을 추가로 이동했습니다.")
+    if journal is not None:
+        journal.moved(retried)
+        journal.finish()
 
 def get_user_input(prompt: str) -> str:
     """사용자 입력을 안전하게 받습니다."""
     if sys.platform == 'win32':
+        import msvcrt
         print(prompt, end='', flush=True)
         result = ''
         while True:
@@ -548,10 +143,394 @@ def wait_key():
     """사용자 입력을 기다립니다."""
     print("\n아무 키나 누르면 프로그램이 종료됩니다...")
     if sys.platform == 'win32':
+        import msvcrt
         msvcrt.getch()
     else:
         input()
 
+def _extract_metadata_stage(store: FileStore, workers: Optional[int]) -> None:
+    with STATS.stage('epub') as stage:
+        found = extract_epub_metadata(store, workers=workers)
+        stage['items'] = found
+    print(f"EPUB 메타데이터: {found}개 파일")
+
+def analyze_directory(target_dir: str, similarity_threshold: float,
+                      use_index: bool = True, incremental: bool = False, full: bool = False,
+                      content_hash: bool = True,
+                      workers: Optional[int] = None,
+                      similarity_mode: str = SIMILARITY_MODE,
+                      epub_metadata: bool = False,
+                      text_fingerprint: bool = False,
+                      size_ratios: Tuple[float, float] = (SIZE_RATIO_LOWER, SIZE_RATIO_UPPER),
+                      io_backend: Optional[IOBackend] = None
+                      ) -> Tuple[FileStore, Dict[str, List[int]]]:
+    """디렉토리를 검색하고 중복 의심 그룹을 찾습니다.
+
+    use_index 가 켜져 있으면 검색 색인을 사용합니다. incremental 이 켜져 있고 이전 색인이
+    있으면 full 이 아닌 한 변경된 파일이 포함된 후보 그룹만 보고하므로, 이전에 보고한
+    그룹은 다시 나오지 않습니다. full 이면 mtime 이 그대로인 폴더도 다시 읽습니다.
+    epub_metadata 가 켜져 있으면 EPUB 의 OPF 제목과 시리즈 정보로 이름을 비교하고,
+    text_fingerprint 가 켜져 있으면 .txt 파일의 내용 지문도 비교합니다.
+    size_ratios 는 이름을 비교할 두 파일의 크기 비율 (하한, 상한) 입니다.
+    io_backend 가 주어지면 검색과 내용 해시의 파일 입출력을 그 위에서 실행합니다.
+    """
+    index = None
+    if use_index:
+        try:
+            index = ScanIndex(target_dir)
+        except (sqlite3.Error, OSError) as e:
+            print(f"\n⚠ 검색 색인을 열 수 없어 전체 검색을 진행합니다: {str(e)}")
+    
+    print("\n파일 검색 및 분석 중...")
+    if index is None:
+        with STATS.stage('scan') as stage:
+            store = FileStore().extend(progress(scan_files(target_dir, io_backend=io_backend),
+                                                "파일 처리 중"))
+            stage['items'] = len(store)
+        if epub_metadata:
+            _extract_metadata_stage(store, workers)
+        groups = group_similar_files(store, similarity_threshold,
+                                     content_hash=content_hash, workers=workers,
+                                     similarity_mode=similarity_mode,
+                                     text_fingerprint=text_fingerprint,
+                                     size_ratios=size_ratios, io_backend=io_backend)
+    else:
+        incremental = incremental and not index.is_new and not full
+        if incremental:
+            print("이전 검색 색인을 사용하여 변경된 파일만 분석합니다.")
+        with STATS.stage('scan') as stage:
+            store = FileStore().extend(progress(index.scan(io_backend=io_backend, full=full),
+                                                "파일 처리 중"))
+            stage['items'] = len(store)
+        if epub_metadata:
+            _extract_metadata_stage(store, workers)
+        groups = group_similar_files(store, similarity_threshold,
+                                     index.changed if incremental else None,
+                                     content_hash=content_hash, hash_index=index,
+                                     workers=workers, similarity_mode=similarity_mode,
+                                     text_fingerprint=text_fingerprint,
+                                     size_ratios=size_ratios, io_backend=io_backend)
+        index.close()
+    
+    cache_stats = CACHE.stats()
+    print(f"캐시 적중률: {cache_stats['hit_rate']:.1%} "
+          f"({cache_stats['entries']}개 항목, {format_file_size(cache_stats['bytes'])})")
+    return store, groups
+
+@contextlib.contextmanager
+def analyze_directory_external(target_dir: str, similarity_threshold: float, memory_budget: int,
+                               use_index: bool = True, content_hash: bool = True,
+                               workers: Optional[int] = None,
+                               similarity_mode: str = SIMILARITY_MODE,
+                               temp_dir: Optional[str] = None,
+                               size_ratios: Tuple[float, float] = (SIZE_RATIO_LOWER, SIZE_RATIO_UPPER),
+                               io_backend: Optional[IOBackend] = None):
+    """analyze_directory 의 메모리 예산 모드입니다. ExternalGrouping 을 넘겨줍니다.
+
+    검색과 그룹화는 그룹을 처음 반복할 때 진행되며, 검색 색인과 임시 파일은
+    블록을 벗어날 때 닫습니다. memory_budget 의 단위는 바이트입니다.
+    """
+    index = None
+    if use_index:
+        try:
+            index = ScanIndex(target_dir)
+        except (sqlite3.Error, OSError) as e:
+            print(f"\n⚠ 검색 색인을 열 수 없어 전체 검색을 진행합니다: {str(e)}")
+    
+    print(f"\n파일 검색 및 분석 중 (메모리 예산 {format_file_size(memory_budget)})...")
+    records = progress(index.scan(io_backend=io_backend) if index is not None
+                       else scan_files(target_dir, io_backend=io_backend), "파일 처리 중")
+    try:
+        with ExternalGrouping(records, similarity_threshold, memory_budget,
+                              content_hash=content_hash, hash_index=index, workers=workers,
+                              similarity_mode=similarity_mode, temp_dir=temp_dir,
+                              size_ratios=size_ratios, io_backend=io_backend) as grouping:
+            yield grouping
+    finally:
+        if index is not None:
+            index.close()
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """일괄 처리 모드의 명령줄 인자를 해석합니다."""
+    parser = argparse.ArgumentParser(
+        description="소설 파일 정리 프로그램 - 일괄 처리 모드",
+        epilog="인자 없이 실행하면 대화형 모드로 동작합니다.")
+    parser.add_argument('target_dir', help="처리할 디렉토리 경로")
+    parser.add_argument('--threshold', type=float, default=0.75, help="유사도 임계값 (기본값: 0.75)")
+    parser.add_argument('--keep', choices=sorted(KEEP_POLICIES), default='largest',
+                        help="그룹에서 남길 파일을 고르는 규칙 (기본값: largest)")
+    parser.add_argument('--plan', default='-', help="이동 계획을 기록할 파일 (기본값: 표준 출력)")
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help="계획 형식 (기본값: 파일 확장자가 .csv 이면 csv, 아니면 jsonl)")
+    parser.add_argument('--report', metavar='FILE', default=None,
+                        help="그룹 보고서를 기록할 파일 (확장자에 따라 html/csv/json, 그 외는 텍스트)")
+    parser.add_argument('--series-report', metavar='FILE', default=None,
+                        help="시리즈별 빠진 권, 같은 권의 사본, 개별 권을 대신하는 완결 파일을 기록할 파일 "
+                             "(확장자에 따라 csv/json, 그 외는 텍스트)")
+    parser.add_argument('--apply', action='store_true', help="계획대로 파일을 이동")
+    parser.add_argument('--duplicate-dir',
+                        help=f"중복 파일을 옮길 폴더 (기본값: 원본과 같은 장치의 '{DUPLICATE_DIR_NAME}' 폴더)")
+    parser.add_argument('--resume', action='store_true',
+                        help="중단된 이전 작업을 다시 분석하지 않고 이어서 진행 (--apply 포함)")
+    parser.add_argument('--undo', action='store_true', help="마지막 작업에서 이동한 파일을 원래 위치로 되돌림")
+    parser.add_argument('--incremental', action='store_true',
+                        help="이전 실행 이후 새로 추가되거나 수정된 파일이 포함된 그룹만 보고")
+    parser.add_argument('--full', action='store_true',
+                        help="색인이 있어도 모든 폴더를 다시 읽고 모든 파일을 다시 분석")
+    parser.add_argument('--no-index', action='store_true', help="검색 색인을 사용하지 않음")
+    parser.add_argument('--no-hash', action='store_true', help="내용 해시 비교를 하지 않음")
+    parser.add_argument('--similarity', choices=SIMILARITY_MODES, default=SIMILARITY_MODE,
+                        help="유사도 계산 방식 (ratio: 기존과 같은 값, lcs: 더 빠른 근사값)")
+    parser.add_argument('--size-ratio', type=float, nargs=2, metavar=('LOWER', 'UPPER'),
+                        default=(SIZE_RATIO_LOWER, SIZE_RATIO_UPPER),
+                        help=f"이름을 비교할 두 파일의 크기 비율 범위 (기본값: {SIZE_RATIO_LOWER} {SIZE_RATIO_UPPER})")
+    parser.add_argument('--epub-metadata', action='store_true',
+                        help="EPUB 의 OPF 메타데이터(제목, 저자, 시리즈)로 이름을 비교")
+    parser.add_argument('--text-fingerprint', action='store_true',
+                        help="인코딩이나 줄바꿈만 다른 같은 내용의 .txt 파일도 찾음")
+    parser.add_argument('--stats', metavar='FILE', default=None,
+                        help="단계별 시간, 메모리, 내부 카운터를 요약하고 JSON 으로 저장")
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help="이름 비교 구간을 cProfile 로 기록 (병렬 처리 시 현재 프로세스만 기록되므로 --workers 1 권장)")
+    parser.add_argument('--workers', type=int, help="이름 비교에 사용할 프로세스 수")
+    parser.add_argument('--memory-budget', type=int, metavar='MB', default=None,
+                        help="메모리가 부족한 큰 라이브러리용: 파일 정보를 임시 파일에 두고 "
+                             "후보 그룹 단위로 읽어 그룹화할 때의 메모리 예산")
+    parser.add_argument('--temp-dir', default=None,
+                        help="--memory-budget 의 임시 파일을 만들 폴더 (기본값: 시스템 임시 폴더)")
+    parser.add_argument('--io-backend', choices=IO_BACKENDS, default='local',
+                        help="파일 입출력 방식 (network: SMB/NFS 처럼 지연 시간이 긴 공유 폴더용, "
+                             "많은 작업을 동시에 보내고 지연 시간에 따라 조절)")
+    parser.add_argument('--io-workers', type=int, default=IO_WORKERS,
+                        help=f"--io-backend network 의 최대 동시 입출력 작업 수 (기본값: {IO_WORKERS})")
+    parser.add_argument('--watch', action='store_true',
+                        help="분석 뒤 종료하지 않고 폴더를 감시하며 새 파일이 만든 중복 그룹을 바로 보고")
+    parser.add_argument('--poll', action='store_true',
+                        help="--watch 에서 inotify 대신 주기적으로 폴더를 확인")
+    parser.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+                        help=f"--poll 의 확인 간격 (기본값: {WATCH_INTERVAL}초)")
+    parser.add_argument('--snapshot-interval', type=float, default=None, metavar='SECONDS',
+                        help="--watch 에서 바뀐 내용을 검색 색인에 기록하는 간격 (기본값: 종료할 때만)")
+    args = parser.parse_args(argv)
+    lower, upper = args.size_ratio
+    if not 0 < lower <= 1 <= upper:
+        parser.error("--size-ratio 는 0 < LOWER <= 1 <= UPPER 이어야 합니다")
+    args.size_ratio = (lower, upper)
+    if args.io_workers < 1:
+        parser.error("--io-workers 는 1 이상이어야 합니다")
+    if args.memory_budget is not None:
+        if args.memory_budget <= 0:
+            parser.error("--memory-budget 은 0 보다 커야 합니다")
+        if args.epub_metadata or args.text_fingerprint or args.series_report:
+            parser.error("--memory-budget 은 --epub-metadata, --text-fingerprint, --series-report 와 "
+                         "함께 사용할 수 없습니다")
+    if args.series_report and args.resume:
+        parser.error("--series-report 는 --resume 과 함께 사용할 수 없습니다")
+    if args.watch:
+        if args.apply or args.resume or args.undo or args.memory_budget is not None:
+            parser.error("--watch 는 --apply, --resume, --undo, --memory-budget 과 함께 사용할 수 없습니다")
+        if args.watch_interval <= 0:
+            parser.error("--watch-interval 은 0 보다 커야 합니다")
+        if args.snapshot_interval is not None and args.snapshot_interval <= 0:
+            parser.error("--snapshot-interval 은 0 보다 커야 합니다")
+    if args.format is None:
+        args.format = 'csv' if args.plan.lower().endswith('.csv') else 'jsonl'
+    return args
+
+def open_io_backend(args: argparse.Namespace):
+    """--io-backend network 이면 IOBackend 를, 아니면 None 을 넘겨주는 컨텍스트를 반환합니다."""
+    if args.io_backend == 'network':
+        return IOBackend(args.io_workers)
+    return contextlib.nullcontext()
+
+_MATCH_REASONS = {'content': "내용 동일", 'name': "이름 유사"}
+
+def print_live_match(match: LiveMatch, store: FileStore) -> None:
+    reasons = {other: (reason, score) for other, reason, score in match.matches}
+    title = "새 중복 그룹" if match.new_group else "중복 그룹에 추가"
+    print(f"\n{title} ({len(match.group)}개 파일, {match.seconds * 1000:.1f}ms): "
+          f"{store.path_str(match.file_id)}")
+    for file_id in match.group:
+        if file_id == match.file_id:
+            continue
+        reason, score = reasons.get(file_id, (None, 0.0))
+        if reason is None:
+            label = "같은 그룹"
+        elif reason == 'name':
+            label = f"{_MATCH_REASONS[reason]} {score:.2f}"
+        else:
+            label = _MATCH_REASONS[reason]
+        print(f"  - {store.path_str(file_id)} ({label}, {format_file_size(store.sizes[file_id])})")
+    sys.stdout.flush()
+
+def run_watch(args: argparse.Namespace) -> int:
+    """라이브러리를 한 번 읽어 메모리 색인을 만든 뒤 폴더를 감시하며 새 중복 그룹을 보고합니다.
+
+    검색 색인을 사용하면 --snapshot-interval 마다와 종료할 때 바뀐 내용을 색인에 기록하므로
+    다음 시작에서는 바뀐 폴더만 다시 읽습니다.
+    """
+    STATS.enabled = args.stats is not None
+    root_dir = os.path.abspath(args.target_dir)
+    index = None
+    if not args.no_index:
+        try:
+            index = ScanIndex(root_dir)
+        except (sqlite3.Error, OSError) as e:
+            print(f"\n⚠ 검색 색인을 열 수 없어 전체 검색을 진행합니다: {str(e)}")
+    
+    with open_io_backend(args) as io_backend:
+        print("\n파일 검색 중...")
+        with STATS.stage('scan') as stage:
+            records = (index.scan(io_backend=io_backend) if index is not None
+                       else scan_files(root_dir, io_backend=io_backend))
+            store = FileStore().extend(progress(records, "파일 처리 중"))
+            stage['items'] = len(store)
+    with STATS.stage('watch_index') as stage:
+        live = LiveIndex(root_dir, store, args.threshold, content_hash=not args.no_hash,
+                         hash_index=index, size_ratios=args.size_ratio)
+        stage['items'] = len(live)
+    known = {path: (store.sizes[file_id], store.mtimes[file_id]) for path, file_id in live.paths.items()}
+    watcher = open_watcher(root_dir, args.watch_interval, poll=args.poll, known=known)
+    print(f"{len(live)}개 파일을 색인했습니다. {root_dir} 를 감시합니다 "
+          f"({f'{args.watch_interval}초마다 확인' if isinstance(watcher, PollingWatcher) else 'inotify'}). "
+          f"Ctrl+C 로 종료합니다.")
+    sys.stdout.flush()
+    
+    last_snapshot = time.monotonic()
+    try:
+        for events in watcher.events():
+            for action, path in events:
+                if action == 'remove':
+                    live.remove(path)
+                    continue
+                match = live.add_path(path)
+                if match is not None:
+                    print_live_match(match, store)
+            if (index is not None and args.snapshot_interval is not None
+                    and time.monotonic() - last_snapshot >= args.snapshot_interval):
+                live.snapshot(index)
+                last_snapshot = time.monotonic()
+    except KeyboardInterrupt:
+        print("\n감시를 종료합니다.")
+    finally:
+        watcher.close()
+        if index is not None:
+            written = live.snapshot(index)
+            index.close()
+            print(f"검색 색인에 새 파일 {written}개를 기록했습니다.")
+    
+    if args.stats is not None:
+        print(STATS.summary())
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump(STATS.report(), f, ensure_ascii=False, indent=2)
+    return 0
+
+def run_batch(argv: List[str]) -> int:
+    """사용자 입력 없이 분석하고 이동 계획을 기록합니다. 종료 코드를 반환합니다."""
+    args = parse_args(argv)
+    if not os.path.isdir(args.target_dir):
+        print(f"❌ 오류: 디렉토리가 존재하지 않습니다: {args.target_dir}", file=sys.stderr)
+        return 2
+    if args.watch:
+        return run_watch(args)
+    
+    # 계획을 표준 출력으로 내보낼 때는 진행 메시지가 섞이지 않도록 표준 오류로 보냅니다.
+    log_stream = sys.stderr if args.plan == '-' else sys.stdout
+    journal = MoveJournal.for_directory(args.target_dir)
+    
+    if args.undo:
+        with contextlib.redirect_stdout(log_stream), open_io_backend(args) as io_backend:
+            restored, failed = journal.undo(io_backend=io_backend)
+        print(f"{restored}개 파일을 되돌렸습니다. (실패 {failed}개)", file=log_stream)
+        return 1 if failed else 0
+    
+    if journal.unfinished and not args.resume:
+        print("❌ 완료되지 않은 이전 작업이 있습니다. --resume 으로 이어서 하거나 "
+              "--undo 로 되돌린 뒤 다시 실행해주세요.", file=sys.stderr)
+        return 2
+    
+    STATS.enabled = args.stats is not None
+    STATS.profile_path = args.profile
+    recovered = 0
+    
+    with contextlib.ExitStack() as resources:
+        io_backend = resources.enter_context(open_io_backend(args))
+        with contextlib.redirect_stdout(log_stream):
+            if args.resume and journal.unfinished:
+                args.apply = True
+                relocator = Relocator(journal.root_dir, args.duplicate_dir, io_backend=io_backend)
+                recovered = journal.recover(relocator)
+                print(f"이전 작업을 이어서 진행합니다. 중단된 이동 {recovered}개를 마무리했습니다.")
+                store, groups = journal.remaining_groups()
+            elif args.memory_budget is not None:
+                # 그룹은 보고서나 계획을 기록하면서 찾으므로 작업 기록에는 그룹을 하나씩 남깁니다.
+                store = None
+                groups = resources.enter_context(analyze_directory_external(
+                    args.target_dir, args.threshold, args.memory_budget * 1024 * 1024,
+                    use_index=not args.no_index, content_hash=not args.no_hash,
+                    workers=args.workers, similarity_mode=args.similarity, temp_dir=args.temp_dir,
+                    size_ratios=args.size_ratio, io_backend=io_backend))
+                relocator = (Relocator(args.target_dir, args.duplicate_dir, io_backend=io_backend)
+                             if args.apply else None)
+                if relocator is not None:
+                    journal.start(args.target_dir, {}, FileStore())
+            else:
+                store, groups = analyze_directory(args.target_dir, args.threshold,
+                                                  use_index=not args.no_index,
+                                                  incremental=args.incremental, full=args.full,
+                                                  content_hash=not args.no_hash, workers=args.workers,
+                                                  similarity_mode=args.similarity,
+                                                  epub_metadata=args.epub_metadata,
+                                                  text_fingerprint=args.text_fingerprint,
+                                                  size_ratios=args.size_ratio,
+                                                  io_backend=io_backend)
+                relocator = (Relocator(args.target_dir, args.duplicate_dir, io_backend=io_backend)
+                             if args.apply else None)
+                if relocator is not None:
+                    journal.start(args.target_dir, groups, store)
+        
+        if args.series_report is not None:
+            series_format = report_format_for(args.series_report)
+            if series_format not in SERIES_REPORT_FORMATS:
+                series_format = 'text'
+            with open(args.series_report, 'w', encoding='utf-8', newline='', errors='surrogateescape') as report, \
+                    STATS.stage('series_report') as stage:
+                index = SeriesIndex(store, range(len(store)))
+                stage['items'] = write_series_report(index, store, report, series_format)
+        
+        if args.report is not None:
+            with open(args.report, 'w', encoding='utf-8', newline='', errors='surrogateescape') as report, \
+                    contextlib.redirect_stdout(log_stream), STATS.stage('report') as stage:
+                stage['items'] = write_report(groups, store, report, report_format_for(args.report))
+        
+        if args.plan == '-':
+            output = sys.stdout
+        else:
+            output = open(args.plan, 'w', encoding='utf-8', newline='', errors='surrogateescape')
+        try:
+            with contextlib.redirect_stdout(log_stream), STATS.stage('plan') as stage:
+                group_count, moved_count = write_plan(groups, store, args.keep, output,
+                                                      args.format, relocator,
+                                                      journal if relocator is not None else None)
+                stage['items'] = group_count
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        
+        file_count = len(store) if store is not None else groups.file_count
+    
+    summary = f"{file_count}개 파일, {group_count}개 그룹, {moved_count + recovered}개 파일 이동"
+    if recovered:
+        summary += f" (중단된 이동 {recovered}개 포함)"
+    print(summary, file=log_stream)
+    if args.stats is not None:
+        print(STATS.summary(), file=log_stream)
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump(STATS.report(), f, ensure_ascii=False, indent=2)
+    elif STATS.profile_summary:
+        print(f"\n프로파일 ({args.profile}):\n{STATS.profile_summary}", file=log_stream)
+    return 0
+
 def main():
     try:
         print(f"\n{'='*50}")
@@ -569,21 +548,31 @@ def main():
 
         similarity_threshold = 0.75
 
-        print("\n파일 검색 중...")
-        files = find_all_files(target_dir)
-        if not files:
+        journal = MoveJournal.for_directory(target_dir)
+        if journal.unfinished:
+            response = get_user_input("\n완료되지 않은 이전 작업이 있습니다. 이어서 하시겠습니까? (Y/n): ")
+            if response.lower() != 'n':
+                recovered = journal.recover(Relocator(journal.root_dir))
+                print(f"\n중단된 이동 {recovered}개를 마무리했습니다.")
+                store, groups = journal.remaining_groups()
+                handle_duplicates(groups, store, journal.root_dir, journal=journal)
+                if not groups:
+                    journal.finish()
+                print("\n✓ 모든 작업이 완료되었습니다.")
+                return
+            journal.discard()
+
+        store, groups = analyze_directory(target_dir, similarity_threshold)
+        if not len(store):
             print("\n처리할 파일을 찾을 수 없습니다.")
             return
-
-        print("\n파일 분석 중...")
-        groups = group_similar_files(files, similarity_threshold)
         
-        print_similar_groups(groups)
+        print_similar_groups(groups, store)
         
         if groups:
             response = get_user_input("\n중복 파일 처리를 시작하시겠습니까? (Y/n): ")
             if response.lower() != 'n':
-                handle_duplicates(groups)
+                handle_duplicates(groups, store, target_dir, journal=journal)
                 print("\n✓ 모든 작업이 완료되었습니다.")
             else:
                 print("\n작업을 취소했습니다.")
@@ -594,8 +583,13 @@ def main():
         print(f"\n❌ 오류가 발생했습니다: {str(e)}")
 
 if __name__ == '__main__':
+    mp.freeze_support()
+    # 작업 프로세스에서는 실행되지 않으므로 콘솔 설정과 메모리 조회는 여기서 한 번만 합니다.
+    setup_encoding()
+    configure_cache()
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(sys.argv[1:]))
     try:
-        mp.freeze_support()
         main()
     except Exception as e:
         print(f"\n프로그램 실행 중 오류가 발생했습니다: {str(e)}")
@@ -0,0 +1,3644 @@
+"""
+소설 파일 정리 프로그램의 핵심 기능
+
+파일명 정규화와 분석, 파일 검색과 색인, 내용 해시, 이름 유사도 그룹화,
+보고서와 이동 계획 작성, 중복 파일 이동을 제공합니다. 사용자 입력과 진행 표시는
+main.py 가 담당하므로 이 모듈은 플랫폼에 관계없이 불러올 수 있습니다.
+
+프로세스 풀의 작업 프로세스도 이 모듈을 다시 불러오므로, 불러올 때는 시스템
+정보를 조회하지 않고 무거운 의존성(numpy, psutil, cProfile)은 처음 사용할 때
+불러옵니다. 메모리 크기에 따른 캐시 예산은 부모 프로세스에서 configure_cache()
+로 한 번 정하고 process_pool() 이 작업 프로세스에 넘겨 줍니다.
+"""
+import os
+from pathlib import Path
+from difflib import SequenceMatcher
+from typing import List, Dict, Set, Tuple, Optional, Iterator, Iterable, NamedTuple, Callable, Union
+import shutil
+import errno
+import re
+from collections import defaultdict, deque, OrderedDict
+from array import array
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from functools import wraps
+from stat import S_ISREG
+import sqlite3
+import tempfile
+import itertools
+import bisect
+import contextlib
+import csv
+import json
+import hashlib
+import heapq
+import mmap
+import threading
+import time
+import io
+import zipfile
+import codecs
+import html
+import posixpath
+import xml.etree.ElementTree as ElementTree
+
+try:
+    import xxhash
+except ImportError:  # xxhash 가 없으면 표준 라이브러리의 blake2b 를 사용
+    xxhash = None
+
+_UNLOADED = object()
+np = _UNLOADED  # numpy 는 _numpy() 로 처음 사용할 때 불러옴
+
+def _numpy():
+    """numpy 모듈을 반환합니다. 없으면 None 이며 파이썬 정수 비트 연산으로 계산합니다."""
+    global np
+    if np is _UNLOADED:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+# 버전 정보
+VERSION = "1.0.3"
+
+# 메모리 관련 상수 설정
+CACHE_BYTES = 256 * 1024 * 1024  # 캐시 메모리 예산 상한 (바이트)
+CACHE_MEMORY_FRACTION = 8  # 사용 가능한 메모리 중 캐시에 쓸 비율의 역수
+
+# 파일 검색 관련 상수 설정
+SCAN_EXTENSIONS = ('.txt', '.epub')  # 처리 대상 확장자
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # 디렉토리 탐색 스레드 수
+INDEX_FILENAME = '.clean_up_novel.db'  # 검색 색인 파일 이름
+INDEX_COMMIT_INTERVAL = 1000  # 색인 커밋 간격 (디렉토리 수)
+INDEX_SCHEMA_VERSION = 3  # 색인 형식 버전
+JOURNAL_FILENAME = '.clean_up_novel.journal'  # 이동 작업 기록 파일 이름
+JOURNAL_SYNC_RECORDS = 256  # 작업 기록을 fsync 하는 간격 (기록 수)
+
+# 파일 이동 관련 상수 설정
+DUPLICATE_DIR_NAME = 'duplicates'  # 중복 파일을 옮길 폴더 이름
+MOVE_WORKERS = 8  # 동시에 실행할 이동 작업 수
+MOVE_BATCH_FILES = 256  # 일괄 처리 모드에서 한 번에 이동할 파일 수
+MOVE_RETRIES = 3  # 권한 오류 재시도 횟수
+
+# 네트워크 입출력 설정
+IO_BACKENDS = ('local', 'network')  # local: 작업별 스레드 풀, network: 지연 시간에 맞춰 동시 작업 수를 조절하는 IOBackend
+IO_WORKERS = 256  # network 백엔드에서 동시에 진행할 입출력 작업 수 상한
+IO_MIN_WORKERS = 8  # 지연 시간이 늘어나도 유지할 최소 동시 작업 수
+IO_START_WORKERS = 32  # 처음 허용할 동시 작업 수
+IO_STAT_BATCH = 32  # 작업 하나에서 stat 할 같은 디렉토리의 파일 수
+IO_READ_WORKERS = 32  # 파일 전체를 읽는 작업의 최대 동시 수 (대역폭이 한계라 더 늘려도 빨라지지 않음)
+IO_ADJUST_SAMPLES = 64  # 동시 작업 수를 조정하기 전에 모을 지연 시간 표본 수
+IO_LATENCY_TOLERANCE = 2.0  # 지연 시간 중앙값이 기준의 이 배수를 넘으면 동시 작업 수를 줄임
+
+# 그룹화 관련 상수 설정
+GROUP_PARALLEL_MIN_FILES = 20000  # 이보다 적은 파일은 현재 프로세스에서 비교
+GROUP_BATCH_FILES = 2000  # 프로세스 풀 작업 하나에 담을 최소 파일 수
+SIZE_RATIO_LOWER = 0.5  # 작은 파일이 큰 파일의 이 비율 이상이어야 비교
+SIZE_RATIO_UPPER = 1.5  # 큰 파일이 작은 파일의 이 비율 이하여야 비교
+
+# 시리즈 색인 설정
+SERIES_MISSING_RATIO = 1.0  # 빠진 권 수가 가진 권 수의 이 배수 이하일 때만 빠진 권으로 보고 (1-120 같은 화수 범위 제외)
+SERIES_REPORT_FORMATS = ('text', 'csv', 'json')  # 시리즈 보고서 형식
+
+# 외부(디스크) 그룹화 설정
+EXTERNAL_RECORD_BYTES = 1024  # 비교 중인 파일 하나가 차지하는 메모리 추정값 (바이트)
+EXTERNAL_SQLITE_FRACTION = 4  # 메모리 예산 중 임시 데이터베이스 페이지 캐시에 쓸 비율의 역수
+EXTERNAL_CACHE_FRACTION = 4  # 메모리 예산 중 CACHE 에 쓸 비율의 역수
+EXTERNAL_INSERT_BATCH = 10000  # 임시 데이터베이스에 한 번에 기록할 레코드 수
+
+# 내용 해시 관련 상수 설정
+HASH_PARTIAL_BYTES = 4 * 1024  # 부분 해시에 사용할 앞/뒤 바이트 수
+HASH_READ_SIZE = 1024 * 1024  # 이 크기 이상의 파일은 mmap 으로 읽음
+HASH_WORKERS = min(16, (os.cpu_count() or 1) * 2)  # 해시 계산 스레드 수
+
+# EPUB 메타데이터 설정
+EPUB_METADATA_MAX_BYTES = 1024 * 1024  # 읽을 container.xml/OPF 의 최대 크기
+EPUB_PARALLEL_MIN_FILES = 1000  # 이보다 적은 EPUB 은 현재 프로세스에서 읽음
+EPUB_BATCH_FILES = 256  # 프로세스 풀 작업 하나에 담을 EPUB 수
+
+# 텍스트 내용 지문 설정
+TEXT_DETECT_BYTES = 64 * 1024  # 인코딩 추정에 사용할 앞부분 크기
+TEXT_BLOCK_BYTES = 1024 * 1024  # 한 번에 디코딩할 크기
+TEXT_MIN_LINE_CHARS = 10  # 이보다 짧은 줄은 지문에 사용하지 않음
+TEXT_MAX_FEATURES = 4096  # 지문에 사용할 최대 줄 수 (선택용 해시가 작은 줄부터)
+TEXT_SIMHASH_DISTANCE = 3  # 같은 내용으로 볼 지문 간 최대 해밍 거리
+TEXT_PARALLEL_MIN_FILES = 200  # 이보다 적은 파일은 현재 프로세스에서 처리
+TEXT_BATCH_FILES = 64  # 프로세스 풀 작업 하나에 담을 파일 수
+
+# 보고서 설정
+REPORT_FORMATS = ('text', 'csv', 'json', 'html')  # 지원하는 보고서 형식
+REPORT_PAGE_LINES = 40  # 콘솔 출력 한 페이지의 줄 수
+
+# 유사도 계산 설정
+SIMILARITY_MODES = ('ratio', 'lcs')  # ratio: SequenceMatcher 와 같은 값, lcs: 최장 공통 부분 수열 비율
+SIMILARITY_MODE = 'ratio'  # 기본 유사도 계산 방식
+SIMILARITY_NUMPY_MIN = 32  # 이 수 이상의 후보를 한 번에 비교할 때 numpy 를 사용
+
+# 감시 모드 설정
+WATCH_INTERVAL = 2.0  # 폴더를 다시 확인하는 간격, inotify 에서는 이벤트를 기다리는 최대 시간 (초)
+WATCH_EVENT_BUFFER = 64 * 1024  # inotify 이벤트를 한 번에 읽을 바이트 수
+
+# 실행 통계 설정
+STATS_SAMPLE_INTERVAL = 0.05  # 단계별 최대 메모리 측정 간격 (초)
+STATS_PROFILE_LINES = 20  # 프로파일 요약에 표시할 함수 수
+
+class BoundedCache:
+    """바이트 예산 안에서 LRU 방식으로 항목을 교체하는 캐시입니다.
+
+    정규화 결과와 유사도 계산 결과를 하나의 예산으로 관리하며, 키는
+    (종류, 인자...) 형태의 튜플입니다. 스레드에서 함께 사용할 수 있습니다.
+    프로세스 풀의 작업 프로세스는 각자 같은 예산의 캐시를 따로 가집니다.
+    """
+    
+    _ENTRY_OVERHEAD = 100  # OrderedDict 항목당 대략적인 부가 비용
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def _entry_size(cls, key: tuple, value) -> int:
+        size = sys.getsizeof(key) + sys.getsizeof(value) + cls._ENTRY_OVERHEAD
+        return size + sum(sys.getsizeof(part) for part in key)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, key: tuple, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key: tuple, value) -> None:
+        size = self._entry_size(key, value)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            self._evict()
+    
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._data:
+            _, (_, evicted_size) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+    
+    def resize(self, max_bytes: int) -> None:
+        """예산을 바꾸고 넘치는 항목을 오래된 것부터 버립니다."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+    
+    def stats(self) -> Dict[str, float]:
+        """적중/실패 횟수와 사용량을 반환합니다."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._data),
+            'bytes': self._bytes,
+        }
+
+_MISSING = object()
+
+def cached(namespace: str):
+    """함수 결과를 전역 CACHE 에 (namespace, 인자...) 키로 저장하는 데코레이터입니다."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            key = (namespace,) + args
+            value = CACHE.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(*args)
+                CACHE.put(key, value)
+            return value
+        return wrapper
+    return decorator
+
+# 전역 캐시 설정 (시스템 메모리에 맞춘 예산은 configure_cache() 에서 정함)
+CACHE = BoundedCache(CACHE_BYTES)
+
+def configure_cache(max_bytes: Optional[int] = None) -> int:
+    """캐시 예산을 정하고 반환합니다.
+
+    max_bytes 를 지정하지 않으면 사용 가능한 메모리의 1/CACHE_MEMORY_FRACTION
+    (최대 CACHE_BYTES) 로 정합니다. 메모리 조회에 psutil 을 불러오므로 부모
+    프로세스에서 한 번만 호출하고, 작업 프로세스는 process_pool() 로 값을 넘겨받습니다.
+    """
+    if max_bytes is None:
+        import psutil
+        max_bytes = min(CACHE_BYTES, psutil.virtual_memory().available // CACHE_MEMORY_FRACTION)
+    CACHE.resize(max_bytes)
+    return max_bytes
+
+def _init_worker(cache_bytes: int) -> None:
+    """작업 프로세스를 부모에서 정한 캐시 예산으로 초기화합니다."""
+    CACHE.resize(cache_bytes)
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """작업 프로세스 풀을 만듭니다. 작업 프로세스는 시스템 정보를 다시 조회하지 않습니다."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(CACHE.max_bytes,))
+
+class Stats:
+    """단계별 실행 시간, CPU 시간, 항목 수, 최대 메모리와 내부 카운터를 기록합니다.
+
+    카운터와 히스토그램은 항상 모으고, 시간과 메모리 측정은 enabled 일 때만 합니다.
+    CPU 시간에는 종료된 자식 프로세스(그룹화 프로세스 풀)의 시간이 포함됩니다.
+    profile_path 가 지정되면 profile() 구간을 cProfile 로 기록합니다.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.profile_path: Optional[str] = None
+        self.stages: List[dict] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.histograms: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.profile_summary = ''
+    
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+    
+    def observe(self, name: str, value: int) -> None:
+        """value 를 2의 거듭제곱 구간으로 나눈 히스토그램에 기록합니다."""
+        self.histograms[name][1 << max(0, value - 1).bit_length()] += 1
+    
+    def merge(self, counters: Dict[str, int]) -> None:
+        """다른 프로세스에서 모은 카운터를 더합니다."""
+        for name, amount in counters.items():
+            self.counters[name] += amount
+    
+    @staticmethod
+    def _cpu_time() -> float:
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """단계 하나를 측정합니다. 넘겨받은 dict 의 'items' 에 처리한 항목 수를 기록합니다."""
+        record = {'stage': name, 'items': 0}
+        if not self.enabled:
+            yield record
+            return
+        
+        import psutil
+        process = psutil.Process()
+        peak = [process.memory_info().rss]
+        stop = threading.Event()
+        
+        def sample():
+            while not stop.wait(STATS_SAMPLE_INTERVAL):
+                peak[0] = max(peak[0], process.memory_info().rss)
+        
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        wall = time.perf_counter()
+        cpu = self._cpu_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = self._cpu_time() - cpu
+            stop.set()
+            sampler.join()
+            record['peak_rss'] = max(peak[0], process.memory_info().rss)
+            self._add_stage(record)
+    
+    def _add_stage(self, record: dict) -> None:
+        """단계 기록을 추가합니다. 같은 단계를 여러 번 측정하면 하나로 합칩니다."""
+        for existing in self.stages:
+            if existing['stage'] == record['stage']:
+                for name in ('items', 'wall_seconds', 'cpu_seconds'):
+                    existing[name] += record[name]
+                existing['peak_rss'] = max(existing['peak_rss'], record['peak_rss'])
+                return
+        self.stages.append(record)
+    
+    @contextlib.contextmanager
+    def profile(self):
+        """profile_path 가 지정된 경우 구간을 cProfile 로 기록합니다."""
+        if self.profile_path is None:
+            yield
+            return
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self.profile_path)
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(STATS_PROFILE_LINES)
+            self.profile_summary = output.getvalue()
+    
+    def report(self) -> dict:
+        """JSON 으로 저장할 수 있는 통계를 반환합니다."""
+        return {
+            'stages': self.stages,
+            'counters': dict(self.counters),
+            'histograms': {name: {str(bound): count for bound, count in sorted(values.items())}
+                           for name, values in self.histograms.items()},
+            'cache': CACHE.stats(),
+        }
+    
+    def summary(self) -> str:
+        """사람이 읽기 위한 요약을 반환합니다."""
+        lines = [f"\n{'단계':<12}{'항목 수':>10}{'시간(초)':>10}{'CPU(초)':>10}{'최대 메모리':>12}"]
+        for record in self.stages:
+            lines.append(f"{record['stage']:<12}{record['items']:>10,}{record['wall_seconds']:>10.3f}"
+                         f"{record['cpu_seconds']:>10.3f}{format_file_size(record['peak_rss']):>12}")
+        if self.counters:
+            lines.append("")
+            lines.extend(f"{name}: {amount:,}" for name, amount in sorted(self.counters.items()))
+        for name, values in self.histograms.items():
+            lines.append(f"\n{name} 분포:")
+            lines.extend(f"  ≤{bound:<8,} {count:,}" for bound, count in sorted(values.items()))
+        cache_stats = CACHE.stats()
+        lines.append(f"\n캐시 적중률: {cache_stats['hit_rate']:.1%} "
+                     f"(적중 {cache_stats['hits']:,}, 실패 {cache_stats['misses']:,})")
+        if self.profile_summary:
+            lines.append(f"\n프로파일 ({self.profile_path}):\n{self.profile_summary}")
+        return '\n'.join(lines)
+
+# 전역 실행 통계
+STATS = Stats()
+
+class IOBackend:
+    """지연 시간이 긴 파일 시스템(SMB/NFS 공유 폴더)을 위한 입출력 실행기입니다.
+
+    작업마다 만드는 CPU 수 기준의 스레드 풀 대신 최대 max_workers 개의 스레드를
+    공유하고, 동시에 진행할 작업 수(limit)를 관찰한 지연 시간에 따라 조절합니다.
+    IO_ADJUST_SAMPLES 개의 표본마다 작업당 지연 시간의 중앙값을 기준(가장 빨랐던
+    중앙값)과 비교해, 기준의 IO_LATENCY_TOLERANCE 배 이내면 limit 을 늘리고
+    넘으면 줄입니다. min_workers 에서도 느리면 그 값을 새 기준으로 삼습니다. 서버가 감당하는 동안에는 수백 개의 작업을 동시에 보내고,
+    응답이 느려지기 시작하면 물러섭니다.
+    
+    submit() 은 바로 Future 를 반환하므로 호출하는 쪽이 limit 안에서 작업을
+    보내야 하며, map() 은 이를 대신 지켜줍니다.
+    """
+    
+    def __init__(self, max_workers: int = IO_WORKERS, min_workers: int = IO_MIN_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.limit = max(self.min_workers, min(IO_START_WORKERS, self.max_workers))
+        self.peak_limit = self.limit
+        self.operations = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='io')
+        self._lock = threading.Lock()
+        self._samples: List[float] = []
+        self._baseline: Optional[float] = None
+    
+    def _record(self, seconds: float, operations: int) -> None:
+        """작업 하나의 지연 시간을 기록하고 필요하면 limit 을 조정합니다."""
+        latency = seconds / max(1, operations)
+        with self._lock:
+            self.operations += operations
+            STATS.observe('io_latency_us', int(latency * 1000000))
+            self._samples.append(latency)
+            if len(self._samples) < IO_ADJUST_SAMPLES:
+                return
+            samples = sorted(self._samples)
+            self._samples = []
+            median = samples[len(samples) // 2]
+            if self._baseline is None or median < self._baseline:
+                self._baseline = median
+            
+            if median <= self._baseline * IO_LATENCY_TOLERANCE:
+                self.limit = min(self.max_workers, self.limit + max(1, self.limit // 4))
+            elif self.limit > self.min_workers:
+                self.limit = max(self.min_workers, self.limit * 3 // 4)
+                STATS.count('io_backoffs')
+            else:
+                # 최소 동시 작업 수에서도 느리다면 연결 자체가 느려진 것이므로 기준을 새로 잡습니다.
+                self._baseline = median
+            self.peak_limit = max(self.peak_limit, self.limit)
+    
+    def submit(self, fn: Callable, *args, operations: int = 1) -> Future:
+        """fn(*args) 를 실행합니다. operations 는 작업에 포함된 입출력 호출 수입니다."""
+        def run():
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._record(time.perf_counter() - start, operations)
+        return self._executor.submit(run)
+    
+    def map(self, fn: Callable, items: Iterable, max_in_flight: Optional[int] = None) -> Iterator:
+        """executor.map 처럼 결과를 순서대로 내되, 진행 중인 작업을 limit 개로 제한합니다.
+
+        max_in_flight 가 주어지면 limit 과 그 값 중 작은 쪽을 따릅니다.
+        """
+        pending = deque()
+        for item in items:
+            while len(pending) >= min(self.limit, max_in_flight or self.limit):
+                yield pending.popleft().result()
+            pending.append(self.submit(fn, item))
+        while pending:
+            yield pending.popleft().result()
+    
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        STATS.count('io_operations', self.operations)
+        STATS.count('io_peak_concurrency', self.peak_limit)
+    
+    def __enter__(self) -> 'IOBackend':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _io_map(fn: Callable, items: Iterable, io_backend: Optional[IOBackend],
+            max_workers: int, max_in_flight: Optional[int] = None) -> Iterator:
+    """io_backend 가 있으면 그 위에서, 없으면 max_workers 개의 스레드 풀에서 fn 을 실행합니다."""
+    if io_backend is not None:
+        yield from io_backend.map(fn, items, max_in_flight)
+        return
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        yield from executor.map(fn, items)
+
+# 컴파일된 정규식 패턴
+_METADATA_PATTERN = re.compile(r'[\[\(\{].*?[\]\)\}]')
+_SEPARATOR_PATTERN = re.compile(r'[_\-+\s]')
+_NUMBER_PATTERN = re.compile(r'\d+|완$|完$')
+_SPECIAL_PATTERN = re.compile(r'[^\w가-힣]')
+_BASE_NAME_STRIP_PATTERN = re.compile(r'\d+|[^\w\s가-힣]')
+_COMPLETED_PATTERN = re.compile(r'완결|完|\(완\)|완$')
+_BASE_TITLE_COMPLETED_PATTERN = re.compile(r'\(완결\)|완결|\(完\)|完')
+_BASE_TITLE_VOLUME_PATTERN = re.compile(r'\d+권|\d+부|[상중하]권|vol\.\d+|volume\d+|\d+-\d+권|시즌\d+|season\d+')
+_BASE_TITLE_STRIP_PATTERN = re.compile(r'\d+|[^\w\s]')
+_SERIES_SEPARATOR_PATTERN = re.compile(r'[\s\-_]+')
+_SERIES_WORD_PATTERN = re.compile(r'시리즈|series', re.IGNORECASE)
+_SERIES_UNIT_PATTERN = re.compile(r'권|화|편|장|part|vol|volume', re.IGNORECASE)
+_DIGITS_PATTERN = re.compile(r'\d+')
+_RANGE_PATTERN = re.compile(r'\d+\s*[-~]\s*\d+')
+_VOLUME_PATTERNS = [
+    re.compile(pattern) for pattern in [
+        r'\d+권.*?완결',
+        r'\d+권.*?完',
+        r'\d+권',
+        r'제\d+권',
+        r'\d+부',
+        r'[상중하]권',
+        r'vol\.\d+',
+        r'volume\d+',
+        r'\d+-\d+권',
+        r'시즌\d+',
+        r'season\d+'
+    ]
+]
+
+# 시리즈 인식을 위한 패턴 (위에서부터 우선 적용)
+_SERIES_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in [
+        r'(.*?)[\s_-]*(\d+)권',  # 기본 숫자+권
+        r'(.*?)[\s_-]*(\d+)-\d+권',  # 1-1권 형태
+        r'(.*?)[\s_-]*[제권]\s*(\d+)',  # 제1권, 권1 형태
+        r'(.*?)[\s_-]*(상|중|하)편?',  # 상/중/하 표기
+        r'(.*?)[\s_-]*(first|second|third|fourth|fifth)',  # 영문 표기
+        r'(.*?)[\s_-]*vol\.?\s*(\d+)',  # Vol.1 형태
+        r'(.*?)[\s_-]*part\.?\s*(\d+)',  # Part.1 형태
+        r'(.*?)[\s_-]*\#(\d+)',  # #1 형태
+        r'(.*?)[\s_-]*(\d+)화',  # 1화 형태
+        r'(.*?)[\s_-]*(\d+)장',  # 1장 형태
+        r'(.*?)[\s_-]*(\d+)편',  # 1편 형태
+        r'(.*?)[\s_-]*시즌\s*(\d+)',  # 시즌1 형태
+        r'(.*?)[\s_-]*season\s*(\d+)',  # season1 형태
+        r'(.*?)[\s_-]*(\d+)(?:\.(txt|epub))?$'  # 파일명 끝의 숫자
+    ]
+]
+
+@cached('metadata')
+def remove_metadata_tags(filename: str) -> str:
+    """파일명에서 메타데이터 태그를 제거합니다."""
+    cleaned = _METADATA_PATTERN.sub('', filename)
+    cleaned = ' '.join(cleaned.split())
+    return cleaned.strip()
+
+def is_volume_pattern(filename: str) -> bool:
+    """파일명이 권수 패턴을 가지고 있는지 확인합니다."""
+    filename_lower = filename.lower()
+    return any(pattern.search(filename_lower) for pattern in _VOLUME_PATTERNS)
+
+def get_base_title(filename: str) -> str:
+    """파일명에서 권수 표시를 제외한 기본 제목을 추출합니다."""
+    base = _BASE_TITLE_COMPLETED_PATTERN.sub('', filename)
+    base = _BASE_TITLE_VOLUME_PATTERN.sub('', base)
+    base = _BASE_TITLE_STRIP_PATTERN.sub('', base)
+    base = ' '.join(base.split())
+    return base.strip()
+
+def normalize_series_name(title: str) -> str:
+    """시리즈명을 정규화합니다."""
+    normalized = _SERIES_SEPARATOR_PATTERN.sub('', title)
+    normalized = _METADATA_PATTERN.sub('', normalized)
+    normalized = _SERIES_WORD_PATTERN.sub('', normalized)
+    normalized = _SERIES_UNIT_PATTERN.sub('', normalized)
+    normalized = _DIGITS_PATTERN.sub('', normalized)
+    return normalized.lower()
+
+def _match_series(filename: str) -> Optional[Tuple[str, str]]:
+    for pattern in _SERIES_PATTERNS:
+        match = pattern.search(filename)
+        if match:
+            series_name = match.group(1).strip()
+            volume_info = match.group(2)
+            
+            if len(series_name) < 2:
+                continue
+                
+            return series_name, volume_info
+    
+    return None
+
+class TitleInfo(NamedTuple):
+    """파일명 분석 결과입니다."""
+    series_name: Optional[str]  # 시리즈명 (권수 패턴이 없으면 None)
+    volume: Optional[str]  # 권수 표기 ('3', '상', 'second' 등)
+    volume_number: Optional[int]  # 권수를 숫자로 변환한 값
+    series_key: Optional[str]  # normalize_series_name 을 적용한 시리즈명
+    completed: bool  # 완결/完 표기 여부
+    tags: Tuple[str, ...]  # [], (), {} 로 감싼 메타데이터 태그
+    base_name: str  # extract_base_name 결과
+    extension: str  # 소문자 확장자 ('.txt' 등)
+    
+    def to_json(self) -> str:
+        return json.dumps(self, ensure_ascii=False)
+    
+    @classmethod
+    def from_json(cls, data: str) -> 'TitleInfo':
+        values = json.loads(data)
+        values[5] = tuple(values[5])
+        return cls(*values)
+
+@cached('title')
+def parse_title(stem: str, extension: str = '') -> TitleInfo:
+    """파일명을 한 번에 분석하여 시리즈, 권수, 완결 여부, 태그 정보를 반환합니다.
+
+    시리즈 패턴은 _SERIES_PATTERNS 의 순서대로 적용되며 결과는 캐시됩니다.
+    """
+    volume_info = _match_series(stem)
+    if volume_info:
+        series_name, volume = volume_info
+        volume_number = get_volume_number(volume)
+        series_key = normalize_series_name(series_name)
+    else:
+        series_name = volume = volume_number = series_key = None
+    
+    return TitleInfo(
+        series_name=series_name,
+        volume=volume,
+        volume_number=volume_number,
+        series_key=series_key,
+        completed=_COMPLETED_PATTERN.search(stem) is not None,
+        tags=tuple(tag[1:-1].strip() for tag in _METADATA_PATTERN.findall(stem)),
+        base_name=extract_base_name(stem),
+        extension=extension.lower(),
+    )
+
+def extract_volume_info(filename: str) -> Optional[Tuple[str, str]]:
+    """파일명에서 시리즈명과 권수 정보를 추출합니다."""
+    info = parse_title(filename)
+    if info.series_name is None:
+        return None
+    return info.series_name, info.volume
+
+def get_volume_number(volume_info: str) -> Optional[int]:
+    """권수 정보를 숫자로 변환합니다."""
+    if volume_info.isdigit():
+        return int(volume_info)
+    
+    volume_map = {'상': 1, '중': 2, '하': 3}
+    if volume_info in volume_map:
+        return volume_map[volume_info]
+    
+    english_map = {
+        'first': 1, 'second': 2, 'third': 3,
+        'fourth': 4, 'fifth': 5
+    }
+    if volume_info.lower() in english_map:
+        return english_map[volume_info.lower()]
+    
+    return None
+
+def is_sequential_volumes(volumes: Set[int]) -> bool:
+    """권수가 연속적인지 확인합니다."""
+    if len(volumes) < 2:
+        return False
+        
+    sorted_vols = sorted(volumes)
+    sequential = all(sorted_vols[i+1] - sorted_vols[i] == 1 
+                    for i in range(len(sorted_vols)-1))
+    decimal_sequential = all(sorted_vols[i+1] - sorted_vols[i] in (1, 9, 10) 
+                           for i in range(len(sorted_vols)-1))
+    return sequential or decimal_sequential
+
+def is_same_series(infos: List[TitleInfo]) -> bool:
+    """주어진 파일들이 같은 시리즈의 다른 권수인지 확인합니다.
+
+    infos 는 각 파일의 parse_title 결과입니다.
+    """
+    if len(infos) < 2:
+        return False
+        
+    volumes = set()
+    base_name = None
+    
+    for info in infos:
+        if info.series_key is None:
+            return False
+        
+        if base_name is None:
+            base_name = info.series_key
+        elif base_name != info.series_key:
+            return False
+            
+        if info.volume_number is None:
+            return False
+            
+        volumes.add(info.volume_number)
+    
+    if len(volumes) > 1 and len(volumes) == len(infos):
+        return is_sequential_volumes(volumes)
+    
+    return False
+
+class SeriesEntry:
+    """시리즈 색인의 시리즈 하나입니다."""
+    
+    __slots__ = ('name', 'volumes', 'unnumbered', 'completed', 'complete_sets')
+    
+    def __init__(self, infos: List[TitleInfo], file_ids: List[int]):
+        self.name = infos[file_ids[0]].series_name  # 처음 본 파일의 시리즈명
+        self.volumes: Dict[int, List[int]] = defaultdict(list)  # 권수 -> 파일 ID 목록
+        self.unnumbered: List[int] = []  # 권수를 숫자로 바꾸지 못한 파일
+        self.completed = False  # 권 파일 중 완결/完 표기가 있는지
+        self.complete_sets: List[int] = []  # 권수 없이 완결 표기만 있는 같은 제목의 파일
+        for file_id in file_ids:
+            info = infos[file_id]
+            if info.volume_number is None:
+                self.unnumbered.append(file_id)
+            else:
+                self.volumes[info.volume_number].append(file_id)
+            self.completed = self.completed or info.completed
+    
+    @property
+    def title(self) -> str:
+        """태그를 뺀 표시용 시리즈명입니다."""
+        return remove_metadata_tags(self.name)
+    
+    def missing_volumes(self) -> List[int]:
+        """1권부터 가장 높은 권 사이에서 빠진 권을 반환합니다.
+
+        빠진 권이 가진 권의 SERIES_MISSING_RATIO 배보다 많으면 권수가 아니라
+        화수 범위(1-120, 1-159 등)로 보고 빈 목록을 반환합니다.
+        """
+        if len(self.volumes) < 2:
+            return []
+        missing = [volume for volume in range(1, max(self.volumes)) if volume not in self.volumes]
+        if len(missing) > len(self.volumes) * SERIES_MISSING_RATIO:
+            return []
+        return missing
+    
+    def duplicate_volumes(self) -> List[Tuple[int, List[int]]]:
+        """파일이 둘 이상인 권을 (권수, 파일 ID 목록) 으로 반환합니다."""
+        return [(volume, ids) for volume, ids in sorted(self.volumes.items()) if len(ids) > 1]
+
+class SeriesIndex:
+    """정규화된 시리즈명(TitleInfo.series_key)별 파일 색인입니다.
+
+    파일 레코드의 parse_title 결과를 한 번 훑어 시리즈 키별 파일 ID 를 모으고,
+    권수, 완결 표기 같은 시리즈 정보(SeriesEntry)는 필요한 시리즈만 만듭니다.
+    그룹화는 series_files() 로 이름 비교에서 뺄 시리즈를 고르고, findings() 는
+    빠진 권, 같은 권의 사본, 개별 권을 대신할 수 있는 완결 파일을 알려줍니다.
+    
+    권수 없이 완결 표기만 있는 파일은 findings() 에서 제목을 시리즈 키로 맞추며,
+    이름에 숫자가 없거나 '1-200' 같은 범위가 있을 때만 완결 파일로 봅니다
+    ('제목 4 완결' 은 마지막 권일 수 있음).
+    """
+    
+    def __init__(self, store: 'FileStore', file_ids: Iterable[int]):
+        self.store = store
+        self.files: Dict[str, List[int]] = defaultdict(list)  # 시리즈 키 -> 파일 ID 목록
+        self._complete_candidates: List[int] = []
+        for file_id in file_ids:
+            self.add(file_id)
+    
+    def add(self, file_id: int) -> None:
+        info = self.store.infos[file_id]
+        if info.series_key is not None:
+            self.files[info.series_key].append(file_id)
+        elif info.completed:
+            self._complete_candidates.append(file_id)
+    
+    def remove(self, file_id: int) -> None:
+        info = self.store.infos[file_id]
+        if info.series_key is None:
+            if info.completed:
+                self._complete_candidates.remove(file_id)
+            return
+        file_ids = self.files[info.series_key]
+        file_ids.remove(file_id)
+        if not file_ids:
+            del self.files[info.series_key]
+    
+    def entry(self, key: str) -> SeriesEntry:
+        return SeriesEntry(self.store.infos, self.files[key])
+    
+    def is_series(self, key: str) -> bool:
+        """is_same_series 와 같은 기준으로 연속된 권들로 이루어진 시리즈인지 확인합니다."""
+        file_ids = self.files.get(key, ())
+        if len(file_ids) < 2:
+            return False
+        infos = self.store.infos
+        volumes = {infos[file_id].volume_number for file_id in file_ids}
+        return None not in volumes and len(volumes) == len(file_ids) and is_sequential_volumes(volumes)
+    
+    def series_files(self) -> Set[int]:
+        """is_series() 인 시리즈의 파일 ID 를 반환합니다."""
+        series_files = set()
+        for key, file_ids in self.files.items():
+            if self.is_series(key):
+                series_files.update(file_ids)
+        return series_files
+    
+    def _complete_sets(self) -> Dict[str, List[int]]:
+        """시리즈 키별로 개별 권을 대신할 수 있는 완결 파일을 찾습니다."""
+        complete_sets = defaultdict(list)
+        for file_id in self._complete_candidates:
+            title = self.store.title(file_id)
+            if _DIGITS_PATTERN.search(title) and not _RANGE_PATTERN.search(title):
+                continue
+            key = normalize_series_name(_COMPLETED_PATTERN.sub('', self.store.infos[file_id].base_name))
+            if key in self.files:
+                complete_sets[key].append(file_id)
+        return complete_sets
+    
+    def findings(self) -> Iterator[Tuple[str, SeriesEntry, List[int], List[Tuple[int, List[int]]]]]:
+        """보고할 내용이 있는 시리즈를 (시리즈 키, 항목, 빠진 권, 같은 권의 사본) 으로 냅니다.
+
+        개별 권을 대신할 수 있는 완결 파일은 항목의 complete_sets 에 있습니다.
+        태그만 있는 이름처럼 시리즈 키가 빈 항목은 서로 다른 작품이 섞이므로 건너뜁니다.
+        """
+        complete_sets = self._complete_sets()
+        for key in sorted(self.files):
+            if not key or (len(self.files[key]) < 2 and key not in complete_sets):
+                continue
+            entry = self.entry(key)
+            if not entry.volumes:
+                continue
+            entry.complete_sets = complete_sets.get(key, [])
+            missing = entry.missing_volumes()
+            duplicates = entry.duplicate_volumes()
+            if missing or duplicates or entry.complete_sets:
+                yield key, entry, missing, duplicates
+
+@cached('normalize')
+def normalize_filename(filename: str) -> str:
+    """파일명을 정규화합니다."""
+    cleaned = _METADATA_PATTERN.sub('', filename)
+    normalized = _SEPARATOR_PATTERN.sub('', cleaned)
+    
+    if not is_volume_pattern(normalized):
+        normalized = _NUMBER_PATTERN.sub('', normalized)
+    
+    normalized = _SPECIAL_PATTERN.sub('', normalized.lower())
+    return normalized.strip()
+
+@cached('key')
+def get_filename_key(filename: str) -> str:
+    """파일명에서 초기 그룹화를 위한 키를 생성합니다."""
+    normalized = normalize_filename(filename)
+    if len(normalized) >= 5:
+        return normalized[:5]
+    return normalized
+
+def extract_base_name(filename: str) -> str:
+    """태그, 숫자, 특수문자를 제거한 비교용 기본 이름을 추출합니다."""
+    cleaned = _METADATA_PATTERN.sub('', filename)
+    cleaned = _BASE_NAME_STRIP_PATTERN.sub('', cleaned)
+    return ' '.join(cleaned.split()).strip()
+
+def is_different_pattern(filename1: str, filename2: str) -> bool:
+    """두 파일명의 패턴이 다른지 확인합니다."""
+    base1 = extract_base_name(filename1)
+    base2 = extract_base_name(filename2)
+    
+    if base1 != base2:
+        return True
+    
+    return False
+
+def build_candidate_index(store: 'FileStore', file_ids: Iterable[int]) -> Dict[str, List[int]]:
+    """이름 비교 후보 그룹을 만듭니다.
+
+    calculate_similarity 는 기본 이름(extract_base_name)이 다른 쌍에 항상 0.0 을
+    반환하므로, 기본 이름이 같은 파일끼리만 묶으면 유사도에 도달할 수 있는 쌍을
+    빠짐없이 찾을 수 있습니다. 앞 5글자 키와 달리 권수 표기나 태그가 이름 앞에
+    붙어 정규화된 이름의 앞부분이 달라진 파일도 같은 후보 그룹에 들어갑니다.
+    """
+    infos = store.infos
+    candidates = defaultdict(list)
+    for file_id in file_ids:
+        candidates[infos[file_id].base_name].append(file_id)
+    return candidates
+
+def calculate_similarity(str1: str, str2: str,
+                         info1: Optional[TitleInfo] = None,
+                         info2: Optional[TitleInfo] = None) -> float:
+    """두 문자열 간의 유사도를 계산합니다.
+
+    두 문자열을 정렬한 순서로 계산하고 캐시하므로 인자 순서와 관계없이
+    같은 결과를 반환합니다. 파일 레코드에 이미 있는 parse_title 결과를
+    info1, info2 로 넘기면 정규식을 다시 실행하지 않습니다.
+    """
+    info1 = info1 or parse_title(str1)
+    info2 = info2 or parse_title(str2)
+    return _cached_similarity(str1, str2, info1.series_key, info2.series_key,
+                              info1.base_name, info2.base_name)
+
+def _cached_similarity(str1: str, str2: str, series1: Optional[str], series2: Optional[str],
+                       base1: str, base2: str) -> float:
+    if str2 < str1:
+        str1, str2 = str2, str1
+    cache_key = ('similarity', str1, str2)
+    result = CACHE.get(cache_key)
+    if result is not None:
+        return result
+    
+    if series1 is not None and series1 == series2:
+        result = 0.0
+    elif base1 != base2:
+        result = 0.0
+    else:
+        STATS.counters['sequence_matcher_calls'] += 1
+        result = SequenceMatcher(None, str1, str2).ratio()
+    CACHE.put(cache_key, result)
+    return result
+
+def _char_masks(query: str) -> Dict[str, int]:
+    """문자별로 query 에서 나타나는 위치를 비트로 표시한 값을 만듭니다."""
+    masks = {}
+    for position, char in enumerate(query):
+        masks[char] = masks.get(char, 0) | (1 << position)
+    return masks
+
+def _lcs_lengths(query: str, candidates: List[str]) -> List[int]:
+    """query 와 각 후보의 최장 공통 부분 수열(LCS) 길이를 비트 병렬 방식으로 계산합니다.
+
+    query 의 길이만큼의 비트 벡터 하나로 후보의 문자마다 DP 표의 한 행을
+    갱신합니다(Allison-Dix/Hyyrö). numpy 가 있고 query 가 64글자 이하이며
+    후보가 SIMILARITY_NUMPY_MIN 개 이상이면 후보 전체를 한 번에 계산합니다.
+    """
+    length = len(query)
+    if not length or not candidates:
+        return [0] * len(candidates)
+    if length <= 64 and len(candidates) >= SIMILARITY_NUMPY_MIN and _numpy() is not None:
+        return _lcs_lengths_numpy(query, candidates)
+    
+    masks = _char_masks(query)
+    full = (1 << length) - 1
+    lengths = []
+    for candidate in candidates:
+        v = full
+        for char in candidate:
+            u = v & masks.get(char, 0)
+            v = (v + u) | (v - u)
+        lengths.append(length - bin(v & full).count('1'))
+    return lengths
+
+def _lcs_lengths_numpy(query: str, candidates: List[str]) -> List[int]:
+    """_lcs_lengths 의 numpy 구현입니다. 후보 하나가 uint64 하나를 사용합니다."""
+    np = _numpy()
+    masks = _char_masks(query)
+    codes = np.array(sorted(ord(char) for char in masks), dtype=np.uint32)
+    code_masks = np.array([masks[chr(code)] for code in codes], dtype=np.uint64)
+    
+    # 후보를 같은 길이로 채워 (후보 수, 최대 길이) 문자 코드 표로 만듭니다.
+    # 채운 자리의 NUL 은 파일 이름에 나오지 않으므로 마스크가 0 이 되어 결과에 영향이 없습니다.
+    width = max(map(len, candidates))
+    # 디코딩할 수 없는 이름의 surrogateescape 문자도 코드 값 그대로 표에 넣습니다.
+    text = ''.join(candidate.ljust(width, '\0') for candidate in candidates)
+    table = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'),
+                          dtype=np.uint32).reshape(len(candidates), width)
+    index = np.minimum(np.searchsorted(codes, table), len(codes) - 1)
+    column_masks = np.where(codes[index] == table, code_masks[index], np.uint64(0))
+    
+    v = np.full(len(candidates), (1 << len(query)) - 1, dtype=np.uint64)
+    for column in column_masks.T:
+        u = v & column
+        v = (v + u) | (v - u)
+    v &= np.uint64((1 << len(query)) - 1)
+    if hasattr(np, 'bitwise_count'):
+        ones = np.bitwise_count(v)
+    else:
+        ones = np.unpackbits(v.view(np.uint8)).reshape(len(candidates), 64).sum(axis=1)
+    return (len(query) - ones.astype(np.int64)).tolist()
+
+class SimilarityScorer:
+    """한 후보 그룹 안의 유사도를 묶음으로 계산합니다.
+
+    mode 가 'ratio' 이면 SequenceMatcher.ratio() 와 정확히 같은 값을 반환합니다.
+    LCS 비율은 ratio 의 상한이므로 임계값에 못 미치는 후보는 비트 병렬 LCS 로
+    먼저 걸러내고, 남은 후보만 문자열별로 한 번 만든 SequenceMatcher 를 재사용하여
+    계산합니다. 'lcs' 이면 2 * LCS / (두 길이의 합) 을 그대로 반환합니다.
+    이 값은 ratio 보다 작지 않으며, 같은 후보 그룹의 파일 이름 쌍에서는 차이가
+    거의 없습니다(benchmark.py 의 2만 개 라이브러리에서 0.6 이상인 쌍은 모두 같음).
+    임의의 문자열에서는 최대 0.2 정도까지 커질 수 있습니다.
+    같은 시리즈 키를 가진 쌍과 기본 이름이 다른 쌍은 calculate_similarity 와
+    마찬가지로 계산하지 않고 0.0 을 반환합니다.
+    """
+    
+    def __init__(self, mode: str = SIMILARITY_MODE):
+        if mode not in SIMILARITY_MODES:
+            raise ValueError(f"알 수 없는 유사도 계산 방식입니다: {mode}")
+        self.mode = mode
+        self._matchers: Dict[str, SequenceMatcher] = {}
+    
+    def _ratio(self, str1: str, str2: str) -> float:
+        # calculate_similarity 와 같이 정렬한 순서와 같은 캐시 키를 사용하고,
+        # 뒤 문자열의 색인(b2j)은 문자열마다 한 번만 만듭니다.
+        if str2 < str1:
+            str1, str2 = str2, str1
+        cache_key = ('similarity', str1, str2)
+        result = CACHE.get(cache_key)
+        if result is not None:
+            return result
+        matcher = self._matchers.get(str2)
+        if matcher is None:
+            matcher = self._matchers[str2] = SequenceMatcher(None, '', str2)
+        matcher.set_seq1(str1)
+        STATS.counters['sequence_matcher_calls'] += 1
+        result = matcher.ratio()
+        CACHE.put(cache_key, result)
+        return result
+    
+    def score(self, query: str, candidates: List[str], threshold: float = 0.0,
+              query_info: Optional[TitleInfo] = None,
+              candidate_infos: Optional[List[TitleInfo]] = None) -> List[float]:
+        """query 와 각 후보의 유사도 목록을 반환합니다.
+
+        threshold 에 도달할 수 없는 후보는 정확한 값을 계산하지 않고 0.0 으로 반환합니다.
+        """
+        scores = [0.0] * len(candidates)
+        positions = range(len(candidates))
+        if query_info is not None and candidate_infos is not None:
+            series_key = query_info.series_key
+            positions = [k for k in positions
+                         if candidate_infos[k].base_name == query_info.base_name
+                         and (series_key is None or candidate_infos[k].series_key != series_key)]
+        
+        # 길이 차이만으로 임계값에 도달할 수 없는 후보를 먼저 제외합니다.
+        length = len(query)
+        positions = [k for k in positions
+                     if length + len(candidates[k])
+                     and 2 * min(length, len(candidates[k])) >= threshold * (length + len(candidates[k]))]
+        lcs = _lcs_lengths(query, [candidates[k] for k in positions])
+        STATS.counters['pairs_pruned_bound'] += len(candidates) - len(positions)
+        for k, common in zip(positions, lcs):
+            bound = 2 * common / (length + len(candidates[k]))
+            if bound < threshold:
+                STATS.counters['pairs_pruned_bound'] += 1
+                continue
+            scores[k] = bound if self.mode == 'lcs' else self._ratio(query, candidates[k])
+        return scores
+    
+    def score_pairs(self, pairs: Iterable[Tuple[str, str]], threshold: float = 0.0) -> List[float]:
+        """(문자열, 문자열) 쌍 목록의 유사도를 반환합니다. 앞 문자열이 같은 쌍을 묶어 계산합니다."""
+        pairs = list(pairs)
+        by_query = defaultdict(list)
+        for position, (query, candidate) in enumerate(pairs):
+            by_query[query].append(position)
+        scores = [0.0] * len(pairs)
+        for query, positions in by_query.items():
+            for position, score in zip(positions, self.score(
+                    query, [pairs[position][1] for position in positions], threshold)):
+                scores[position] = score
+        return scores
+
+class EpubMetadata(NamedTuple):
+    """EPUB 의 OPF 패키지 문서에서 읽은 메타데이터입니다."""
+    title: Optional[str]
+    creator: Optional[str]
+    series: Optional[str]
+    series_index: Optional[str]
+    
+    def title_stem(self) -> Optional[str]:
+        """파일 이름 대신 비교에 사용할 제목입니다. 시리즈 정보가 있으면 'N권' 형식으로 만듭니다."""
+        if self.series and self.series_index:
+            index = self.series_index
+            if index.endswith('.0'):
+                index = index[:-2]
+            return f"{self.series} {index}권"
+        return self.title
+
+# 검색 레코드: (디렉토리 경로, 파일 이름, 정규화된 이름, 크기, 수정 시각(ns), 파일명 분석 결과)
+FileRecord = Tuple[str, str, str, int, int, TitleInfo]
+
+class FileStore:
+    """파일 정보를 정수 ID 로 관리하는 열(column) 기반 저장소입니다.
+
+    경로는 디렉토리와 파일 이름으로 나누어 intern 한 문자열로 보관하고
+    크기와 수정 시각은 array('q') 에 저장합니다. 이후 단계는 모두 정수 ID 로 동작하며
+    Path 객체는 파일 입출력이 필요할 때 path() 로만 만듭니다.
+    EPUB 메타데이터는 읽은 파일만 metadata 에 ID 별로 보관합니다.
+    """
+    
+    __slots__ = ('dirs', 'dir_ids', 'names', 'normalized', 'sizes', 'mtimes', 'infos', 'metadata',
+                 '_dir_lookup')
+    
+    def __init__(self):
+        self.dirs: List[str] = []
+        self.dir_ids = array('q')
+        self.names: List[str] = []
+        self.normalized: List[str] = []
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.infos: List[TitleInfo] = []
+        self.metadata: Dict[int, EpubMetadata] = {}
+        self._dir_lookup: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def add(self, dir_path: str, name: str, normalized: str, size: int, mtime_ns: int,
+            info: TitleInfo) -> int:
+        """파일 하나를 추가하고 ID 를 반환합니다."""
+        dir_id = self._dir_lookup.get(dir_path)
+        if dir_id is None:
+            dir_id = self._dir_lookup[dir_path] = len(self.dirs)
+            self.dirs.append(dir_path)
+        self.dir_ids.append(dir_id)
+        self.names.append(name)
+        self.normalized.append(sys.intern(normalized))
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+        self.infos.append(info)
+        return len(self.names) - 1
+    
+    def extend(self, records: Iterable[FileRecord]) -> 'FileStore':
+        """검색 레코드를 모두 추가합니다. 제너레이터를 그대로 넘길 수 있습니다."""
+        for record in records:
+            self.add(*record)
+        return self
+    
+    def record(self, file_id: int) -> FileRecord:
+        """파일 하나의 검색 레코드를 다시 만듭니다."""
+        return (self.dirs[self.dir_ids[file_id]], self.names[file_id], self.normalized[file_id],
+                self.sizes[file_id], self.mtimes[file_id], self.infos[file_id])
+    
+    def path_str(self, file_id: int) -> str:
+        return os.path.join(self.dirs[self.dir_ids[file_id]], self.names[file_id])
+    
+    def path(self, file_id: int) -> Path:
+        return Path(self.path_str(file_id))
+    
+    def stem(self, file_id: int) -> str:
+        return os.path.splitext(self.names[file_id])[0]
+    
+    def title(self, file_id: int) -> str:
+        """이름 비교에 사용할 제목입니다. EPUB 메타데이터가 있으면 그 제목을 사용합니다."""
+        metadata = self.metadata.get(file_id)
+        title = metadata.title_stem() if metadata is not None else None
+        return title or self.stem(file_id)
+    
+    def set_metadata(self, file_id: int, metadata: EpubMetadata) -> None:
+        """메타데이터를 저장하고 파일명 분석 결과를 메타데이터 제목 기준으로 바꿉니다."""
+        self.metadata[file_id] = metadata
+        title = metadata.title_stem()
+        if title:
+            self.infos[file_id] = parse_title(title, self.infos[file_id].extension)
+
+def _list_directory(dir_path: str) -> Tuple[List[tuple], List[str]]:
+    """디렉토리 하나를 읽어 대상 파일 항목과 하위 디렉토리 목록을 반환합니다.
+
+    파일 항목은 (DirEntry, 확장자를 뺀 이름, 확장자, 정규화된 이름) 이며
+    stat() 은 호출하지 않습니다. 정규화된 이름이 비는 파일은 제외합니다.
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != DUPLICATE_DIR_NAME:
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    stem, ext = os.path.splitext(entry.name)
+                    if ext.lower() not in SCAN_EXTENSIONS:
+                        continue
+                    normalized_name = normalize_filename(stem)
+                    if normalized_name:
+                        files.append((entry, stem, ext, normalized_name))
+                except OSError as e:
+                    print(f"파일 처리 중 오류 발생: {entry.path} - {str(e)}")
+    except OSError as e:
+        print(f"디렉토리 검색 중 오류 발생: {dir_path} - {str(e)}")
+    return files, subdirs
+
+def _stat_entries(dir_path: str, files: List[tuple]) -> List[FileRecord]:
+    """_list_directory 가 반환한 파일 항목의 크기와 수정 시각을 읽어 레코드를 만듭니다."""
+    records = []
+    for entry, stem, ext, normalized_name in files:
+        try:
+            stat = entry.stat()
+        except OSError as e:
+            print(f"파일 처리 중 오류 발생: {entry.path} - {str(e)}")
+            continue
+        records.append((dir_path, entry.name, normalized_name, stat.st_size,
+                        stat.st_mtime_ns, parse_title(stem, ext)))
+    return records
+
+def _scan_directory(dir_path: str) -> Tuple[List[FileRecord], List[str]]:
+    """디렉토리 하나를 읽어 파일 레코드와 하위 디렉토리 목록을 반환합니다.
+
+    os.scandir 의 DirEntry 가 가진 정보를 그대로 사용하므로 파일마다
+    별도의 is_file()/stat() 호출이 필요하지 않습니다.
+    """
+    files, subdirs = _list_directory(dir_path)
+    return _stat_entries(dir_path, files), subdirs
+
+def scan_files(root_dir: str, max_workers: int = SCAN_WORKERS,
+               io_backend: Optional[IOBackend] = None) -> Iterator[FileRecord]:
+    """하위 디렉토리를 병렬로 탐색하며 파일 레코드를 생성합니다.
+
+    디렉토리 단위로 스레드 풀에 작업을 나누고, 완료된 디렉토리의 레코드를
+    즉시 yield 하므로 전체 탐색이 끝나기 전에 다음 단계가 처리를 시작할 수 있습니다.
+    대기 중인 작업 수는 max_workers 의 두 배로 제한됩니다.
+    io_backend 가 주어지면 _scan_files_batched 로 탐색합니다.
+    """
+    if io_backend is not None:
+        yield from _scan_files_batched(root_dir, io_backend)
+        return
+    
+    max_workers = max(1, max_workers)
+    pending_dirs = deque([str(root_dir)])
+    running = set()
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending_dirs or running:
+            while pending_dirs and len(running) < max_workers * 2:
+                running.add(executor.submit(_scan_directory, pending_dirs.popleft()))
+            
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                records, subdirs = future.result()
+                pending_dirs.extend(subdirs)
+                STATS.count('directories_scanned')
+                STATS.count('stat_calls', len(records))
+                yield from records
+
+def _scan_files_batched(root_dir: str, io_backend: IOBackend) -> Iterator[FileRecord]:
+    """scan_files 의 네트워크 공유 폴더용 구현입니다.
+
+    디렉토리 목록 읽기와 stat 을 별도 작업으로 나누어, 파일이 많은 디렉토리도
+    IO_STAT_BATCH 개씩 여러 작업으로 동시에 stat 합니다. 진행 중인 작업 수는
+    io_backend.limit 을 따르고, 메모리를 아끼기 위해 쌓인 stat 작업을 먼저 보냅니다.
+    """
+    pending_dirs = deque([str(root_dir)])
+    pending_stats = deque()
+    running = {}
+    
+    while pending_dirs or pending_stats or running:
+        while (pending_dirs or pending_stats) and len(running) < io_backend.limit:
+            if pending_stats:
+                dir_path, files = pending_stats.popleft()
+                running[io_backend.submit(_stat_entries, dir_path, files, operations=len(files))] = None
+            else:
+                dir_path = pending_dirs.popleft()
+                running[io_backend.submit(_list_directory, dir_path)] = dir_path
+        
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            dir_path = running.pop(future)
+            if dir_path is None:
+                records = future.result()
+                STATS.count('stat_calls', len(records))
+                yield from records
+                continue
+            files, subdirs = future.result()
+            pending_dirs.extend(subdirs)
+            STATS.count('directories_scanned')
+            for i in range(0, len(files), IO_STAT_BATCH):
+                pending_stats.append((dir_path, files[i:i + IO_STAT_BATCH]))
+
+def _new_hasher():
+    """내용 비교에 사용할 비암호화 해시 객체를 생성합니다."""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+def hash_file_partial(file_path: Path, size: int) -> str:
+    """파일의 앞/뒤 HASH_PARTIAL_BYTES 바이트만 읽어 해시합니다."""
+    hasher = _new_hasher()
+    with open(file_path, 'rb') as f:
+        if size <= HASH_PARTIAL_BYTES * 2:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(HASH_PARTIAL_BYTES))
+            f.seek(-HASH_PARTIAL_BYTES, os.SEEK_END)
+            hasher.update(f.read(HASH_PARTIAL_BYTES))
+    return hasher.hexdigest()
+
+def hash_file_full(file_path: Path, size: int) -> str:
+    """파일 전체를 해시합니다. 큰 파일은 mmap 으로 읽습니다."""
+    hasher = _new_hasher()
+    with open(file_path, 'rb') as f:
+        if size >= HASH_READ_SIZE:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+        else:
+            hasher.update(f.read())
+    return hasher.hexdigest()
+
+def _hash_files(hash_func, targets: List[Tuple[Path, int]],
+                max_workers: int = HASH_WORKERS,
+                io_backend: Optional[IOBackend] = None,
+                max_in_flight: Optional[int] = None) -> List[Optional[str]]:
+    """여러 파일을 스레드 풀(또는 io_backend)에서 해시합니다. 읽기에 실패한 파일은 None 입니다.
+
+    max_in_flight 는 io_backend 에서 동시에 진행할 해시 수의 상한입니다.
+    """
+    def run(target: Tuple[Path, int]) -> Optional[str]:
+        file_path, size = target
+        try:
+            return hash_func(file_path, size)
+        except OSError as e:
+            print(f"파일 해시 중 오류 발생: {file_path} - {str(e)}")
+            return None
+    
+    return list(_io_map(run, targets, io_backend, max_workers, max_in_flight))
+
+def find_exact_duplicates(store: 'FileStore', file_ids: Iterable[int],
+                          hash_index: Optional['ScanIndex'] = None,
+                          io_backend: Optional[IOBackend] = None) -> List[List[int]]:
+    """내용이 완전히 같은 파일 그룹을 찾습니다.
+
+    크기가 정확히 같은 파일끼리만 앞/뒤 일부를 해시하고, 부분 해시까지
+    같은 파일만 전체를 해시합니다. hash_index 가 주어지면 색인에 저장된
+    해시를 재사용하고 새로 계산한 해시를 저장합니다. 파일 읽기는
+    io_backend 가 주어지면 그 위에서 실행합니다.
+    
+    색인의 레코드는 mtime 이 그대로인 폴더에서 그대로 가져오므로, 해시하기 전에
+    후보 파일을 다시 조회합니다. 크기나 mtime 이 바뀐 파일은 store 와 색인을 새 값으로
+    고치고 저장된 해시를 쓰지 않으며, 사라진 파일은 후보에서 뺍니다.
+    """
+    sizes = store.sizes
+    size_buckets = defaultdict(list)
+    for file_id in file_ids:
+        if sizes[file_id] > 0:
+            size_buckets[sizes[file_id]].append(file_id)
+    candidates = [f for bucket in size_buckets.values() if len(bucket) > 1 for f in bucket]
+    if not candidates:
+        return []
+    
+    paths = {file_id: store.path_str(file_id) for file_id in candidates}
+    
+    def stat(file_id: int) -> Optional[Tuple[int, int]]:
+        try:
+            result = os.stat(paths[file_id])
+        except OSError:
+            return None
+        return result.st_size, result.st_mtime_ns
+    
+    stale = set()
+    current = []
+    for file_id, signature in zip(candidates, _io_map(stat, candidates, io_backend, HASH_WORKERS)):
+        if signature is None:
+            continue
+        if signature != (sizes[file_id], store.mtimes[file_id]):
+            sizes[file_id], store.mtimes[file_id] = signature
+            stale.add(file_id)
+        current.append(file_id)
+    STATS.count('hash_stale_records', len(stale))
+    if stale:
+        if hash_index is not None:
+            hash_index.refresh_files([(paths[f], sizes[f], store.mtimes[f]) for f in stale])
+        size_buckets = defaultdict(list)
+        for file_id in current:
+            if sizes[file_id] > 0:
+                size_buckets[sizes[file_id]].append(file_id)
+        current = [f for bucket in size_buckets.values() if len(bucket) > 1 for f in bucket]
+    candidates = current
+    
+    known = hash_index.get_hashes([paths[f] for f in candidates if f not in stale]) if hash_index else {}
+    
+    def resolve(column: int, hash_func, targets: List[int],
+                max_in_flight: Optional[int] = None) -> Dict[int, Optional[str]]:
+        hashes = {}
+        missing = []
+        for file_id in targets:
+            cached = known.get(paths[file_id])
+            if cached and cached[column]:
+                hashes[file_id] = cached[column]
+            else:
+                missing.append(file_id)
+        computed = _hash_files(hash_func, [(Path(paths[f]), sizes[f]) for f in missing],
+                               io_backend=io_backend, max_in_flight=max_in_flight)
+        hashes.update(zip(missing, computed))
+        if hash_index is not None:
+            hash_index.store_hashes(column, [(paths[f], value) for f, value in zip(missing, computed) if value])
+        return hashes
+    
+    partial_hashes = resolve(0, hash_file_partial, candidates)
+    partial_buckets = defaultdict(list)
+    for file_id in candidates:
+        partial = partial_hashes.get(file_id)
+        if partial:
+            partial_buckets[(sizes[file_id], partial)].append(file_id)
+    
+    # 부분 해시가 파일 전체를 덮는 작은 파일은 부분 해시가 곧 전체 해시입니다.
+    exact_buckets = {}
+    need_full = []
+    for (size, partial), bucket in partial_buckets.items():
+        if len(bucket) < 2:
+            continue
+        if size <= HASH_PARTIAL_BYTES * 2:
+            exact_buckets[(size, partial)] = bucket
+        else:
+            need_full.extend(bucket)
+    
+    full_hashes = resolve(1, hash_file_full, need_full, IO_READ_WORKERS)
+    for file_id in need_full:
+        full = full_hashes.get(file_id)
+        if full:
+            exact_buckets.setdefault((sizes[file_id], full), []).append(file_id)
+    
+    return [bucket for bucket in exact_buckets.values() if len(bucket) > 1]
+
+_OPF_NS = {
+    'container': 'urn:oasis:names:tc:opendocument:xmlns:container',
+    'opf': 'http://www.idpf.org/2007/opf',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+}
+
+def _read_zip_entry(archive: zipfile.ZipFile, name: str) -> bytes:
+    """압축 파일에서 항목 하나를 읽습니다. EPUB_METADATA_MAX_BYTES 보다 크면 오류입니다."""
+    info = archive.getinfo(name)
+    if info.file_size > EPUB_METADATA_MAX_BYTES:
+        raise ValueError(f"메타데이터 항목이 너무 큽니다: {name}")
+    return archive.read(info)
+
+def _element_text(element: Optional[ElementTree.Element]) -> Optional[str]:
+    if element is None or element.text is None:
+        return None
+    return ' '.join(element.text.split()) or None
+
+def read_epub_metadata(file_path: str) -> Optional[EpubMetadata]:
+    """EPUB 의 제목, 저자, 시리즈 정보를 읽습니다.
+
+    zip 중앙 디렉토리와 META-INF/container.xml, OPF 문서만 읽으며 본문은 풀지 않습니다.
+    calibre:series/calibre:series_index 와 EPUB 3 의 belongs-to-collection/
+    group-position 을 모두 지원합니다. 읽을 수 없는 파일은 None 을 반환합니다.
+    """
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            container = ElementTree.fromstring(_read_zip_entry(archive, 'META-INF/container.xml'))
+            rootfile = container.find('.//container:rootfile', _OPF_NS)
+            if rootfile is None or not rootfile.get('full-path'):
+                return None
+            opf_path = posixpath.normpath(rootfile.get('full-path'))
+            package = ElementTree.fromstring(_read_zip_entry(archive, opf_path))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, ElementTree.ParseError):
+        return None
+    
+    metadata = package.find('opf:metadata', _OPF_NS)
+    if metadata is None:
+        return None
+    
+    series = series_index = None
+    collections = {}
+    for meta in metadata.findall('opf:meta', _OPF_NS):
+        name = meta.get('name')
+        prop = meta.get('property')
+        if name == 'calibre:series':
+            series = meta.get('content') or series
+        elif name == 'calibre:series_index':
+            series_index = meta.get('content') or series_index
+        elif prop == 'belongs-to-collection':
+            collections[meta.get('id')] = _element_text(meta)
+        elif prop == 'group-position' and meta.get('refines', '').lstrip('#') in collections:
+            series = series or collections[meta.get('refines').lstrip('#')]
+            series_index = series_index or _element_text(meta)
+    if series is None and collections:
+        series = next(iter(collections.values()))
+    
+    return EpubMetadata(
+        title=_element_text(metadata.find('dc:title', _OPF_NS)),
+        creator=_element_text(metadata.find('dc:creator', _OPF_NS)),
+        series=series,
+        series_index=series_index,
+    )
+
+def _read_epub_metadata_batch(paths: List[str]) -> List[Optional[EpubMetadata]]:
+    """여러 EPUB 의 메타데이터를 읽습니다. 프로세스 풀 작업 단위입니다."""
+    return [read_epub_metadata(path) for path in paths]
+
+def extract_epub_metadata(store: FileStore, file_ids: Optional[Iterable[int]] = None,
+                          workers: Optional[int] = None) -> int:
+    """store 의 EPUB 파일에서 메타데이터를 읽어 저장하고 읽은 파일 수를 반환합니다.
+
+    EPUB_PARALLEL_MIN_FILES 개 이상이면 EPUB_BATCH_FILES 개씩 나누어 프로세스
+    풀에서 읽습니다. 결과는 set_metadata 로 저장되어 이후 그룹화와 시리즈 판정이
+    메타데이터의 제목을 사용합니다.
+    """
+    if file_ids is None:
+        file_ids = range(len(store))
+    epub_ids = [file_id for file_id in file_ids if store.infos[file_id].extension == '.epub']
+    paths = [store.path_str(file_id) for file_id in epub_ids]
+    batches = [paths[i:i + EPUB_BATCH_FILES] for i in range(0, len(paths), EPUB_BATCH_FILES)]
+    
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(paths) >= EPUB_PARALLEL_MIN_FILES:
+        with process_pool(workers) as executor:
+            results = [metadata for batch in executor.map(_read_epub_metadata_batch, batches)
+                       for metadata in batch]
+    else:
+        results = [metadata for batch in batches for metadata in _read_epub_metadata_batch(batch)]
+    
+    found = 0
+    for file_id, metadata in zip(epub_ids, results):
+        if metadata is not None:
+            store.set_metadata(file_id, metadata)
+            found += 1
+    STATS.count('epub_metadata', found)
+    return found
+
+def _decodes_cleanly(sample: bytes, encoding: str) -> bool:
+    """sample 이 encoding 으로 오류 없이 디코딩되는지 확인합니다. 잘라 읽은 끝부분의 깨진 문자는 무시합니다."""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def detect_text_encoding(sample: bytes) -> str:
+    """파일 앞부분으로 텍스트 인코딩을 추정합니다.
+
+    BOM 이 있으면 그대로 따르고, 없으면 UTF-16(NUL 바이트 위치), UTF-8, CP949
+    순서로 확인합니다. CP949 는 EUC-KR 을 포함합니다.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith(codecs.BOM_UTF16_LE):
+        return 'utf-16-le'
+    if sample.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16-be'
+    if sample:
+        # 한글이 대부분인 UTF-16 은 공백, 숫자 같은 ASCII 글자에서만 NUL 이 나오므로
+        # 비율보다 NUL 이 짝수와 홀수 위치 중 한쪽에 모여 있는지를 보고, 실제로 디코딩되는지 확인합니다.
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        if (odd_nuls > len(sample) // 64 and odd_nuls > even_nuls * 4
+                and _decodes_cleanly(sample, 'utf-16-le')):
+            return 'utf-16-le'
+        if (even_nuls > len(sample) // 64 and even_nuls > odd_nuls * 4
+                and _decodes_cleanly(sample, 'utf-16-be')):
+            return 'utf-16-be'
+    if _decodes_cleanly(sample, 'utf-8'):
+        return 'utf-8'
+    return 'cp949'
+
+def _text_lines(lines: Iterable[str]) -> List[str]:
+    """splitlines 로 나눈 줄의 공백과 줄바꿈을 정리하고 짧은 줄을 뺀 목록을 반환합니다.
+
+    줄바꿈(CRLF/LF) 과 공백 차이는 결과에 영향을 주지 않습니다.
+    """
+    return [line for line in (' '.join(line.split()) for line in lines)
+            if len(line) >= TEXT_MIN_LINE_CHARS]
+
+def _simhash(hashes: List[int]) -> int:
+    """64비트 특징 해시 목록의 SimHash 를 계산합니다."""
+    if not hashes:
+        return 0
+    np = _numpy()
+    if np is not None:
+        bits = np.unpackbits(np.array(hashes, dtype='<u8').view(np.uint8).reshape(-1, 8),
+                             axis=1, bitorder='little')
+        counts = bits.sum(axis=0, dtype=np.int64)
+    else:
+        counts = [sum((value >> bit) & 1 for value in hashes) for bit in range(64)]
+    fingerprint = 0
+    for bit in range(64):
+        if 2 * int(counts[bit]) > len(hashes):
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def fingerprint_text(file_path: str, size: int) -> Optional[int]:
+    """.txt 파일 내용의 64비트 지문을 계산합니다.
+
+    인코딩을 추정한 뒤 mmap 으로 TEXT_BLOCK_BYTES 씩 디코딩하며 공백과 줄바꿈을 정리한
+    줄의 해시를 구하고, 선택용 해시가 가장 작은 TEXT_MAX_FEATURES 개 줄만 남겨 SimHash 를
+    만듭니다. 표본 줄을 파일 안의 위치가 아니라 내용으로 고르므로, 인코딩이나 줄바꿈,
+    BOM 만 다른 같은 소설은 같은 줄을 골라 지문이 같고 메모리는 파일 크기와 관계없이
+    일정합니다. 쓸 만한 줄이 없거나 읽을 수 없으면 None 을 반환합니다.
+    """
+    if size == 0:
+        return None
+    features = {}  # 선택용 해시 -> 지문용 해시
+    largest = []  # features 의 선택용 해시 (부호를 바꾼 최소 힙)
+    try:
+        with open(file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            encoding = detect_text_encoding(mapped[:TEXT_DETECT_BYTES])
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            rest = ''
+            for start in range(0, len(mapped), TEXT_BLOCK_BYTES):
+                final = start + TEXT_BLOCK_BYTES >= len(mapped)
+                text = rest + decoder.decode(mapped[start:start + TEXT_BLOCK_BYTES], final)
+                if start == 0:
+                    text = text.lstrip('\ufeff')
+                # 블록 끝에서 잘렸을 수 있는 마지막 줄은 줄바꿈과 함께 다음 블록에 이어 붙입니다.
+                lines = text.splitlines(keepends=True)
+                rest = '' if final or not lines else lines.pop()
+                for line in _text_lines(lines):
+                    digest = hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest()
+                    key = int.from_bytes(digest[8:], 'little')
+                    if key in features:
+                        continue
+                    if len(features) < TEXT_MAX_FEATURES:
+                        heapq.heappush(largest, -key)
+                    elif key < -largest[0]:
+                        del features[-heapq.heappushpop(largest, -key)]
+                    else:
+                        continue
+                    features[key] = int.from_bytes(digest[:8], 'little')
+    except (OSError, ValueError, LookupError) as e:
+        print(f"내용 지문 계산 중 오류 발생: {file_path} - {str(e)}")
+        return None
+    if not features:
+        return None
+    return _simhash(list(features.values()))
+
+def _fingerprint_batch(items: List[Tuple[str, int]]) -> List[Optional[int]]:
+    """여러 파일의 지문을 계산합니다. 프로세스 풀 작업 단위입니다."""
+    return [fingerprint_text(path, size) for path, size in items]
+
+def find_similar_texts(store: FileStore, file_ids: Iterable[int],
+                       workers: Optional[int] = None,
+                       max_distance: int = TEXT_SIMHASH_DISTANCE) -> List[Tuple[int, int]]:
+    """내용 지문이 가까운 .txt 파일 쌍을 찾습니다.
+
+    지문 계산은 TEXT_BATCH_FILES 개씩 프로세스 풀에서 진행하며 결과로 정수 하나씩만
+    돌려받으므로 메모리 사용량은 파일 수에 비례합니다. 64비트 지문을
+    max_distance + 1 개 구간으로 나누면 해밍 거리가 max_distance 이하인 두 지문은
+    적어도 한 구간이 같으므로, 구간 값이 같은 파일끼리만 거리를 계산합니다.
+    """
+    text_ids = [file_id for file_id in file_ids if store.infos[file_id].extension == '.txt']
+    items = [(store.path_str(file_id), store.sizes[file_id]) for file_id in text_ids]
+    batches = [items[i:i + TEXT_BATCH_FILES] for i in range(0, len(items), TEXT_BATCH_FILES)]
+    
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(items) >= TEXT_PARALLEL_MIN_FILES:
+        with process_pool(workers) as executor:
+            fingerprints = [value for batch in executor.map(_fingerprint_batch, batches)
+                            for value in batch]
+    else:
+        fingerprints = [value for batch in batches for value in _fingerprint_batch(batch)]
+    
+    bands = max_distance + 1
+    band_bits = -(-64 // bands)
+    band_mask = (1 << band_bits) - 1
+    buckets = defaultdict(list)
+    for file_id, fingerprint in zip(text_ids, fingerprints):
+        if fingerprint is None:
+            continue
+        for band in range(bands):
+            buckets[(band, (fingerprint >> (band * band_bits)) & band_mask)].append(
+                (file_id, fingerprint))
+    
+    pairs = set()
+    for members in buckets.values():
+        for k, (id1, fp1) in enumerate(members):
+            for id2, fp2 in members[k + 1:]:
+                if bin(fp1 ^ fp2).count('1') <= max_distance:
+                    pairs.add((min(id1, id2), max(id1, id2)))
+    STATS.count('text_fingerprints', sum(value is not None for value in fingerprints))
+    STATS.count('text_pairs', len(pairs))
+    return sorted(pairs)
+
+class ScanIndex:
+    """디렉토리 mtime 을 기준으로 변경된 부분만 다시 읽는 SQLite 검색 색인입니다.
+
+    파일마다 경로, 크기, mtime, inode, normalize_filename 결과,
+    parse_title 결과와 내용 해시를 저장합니다. 다음 실행에서 mtime 이
+    바뀌지 않은 디렉토리는 scandir 없이 색인의 레코드를 그대로 사용합니다.
+    디렉토리 mtime 은 항목이 추가/삭제/이름 변경될 때만 바뀌므로, 기존 파일의
+    내용만 수정된 경우는 해당 디렉토리가 다시 바뀔 때까지 감지되지 않습니다.
+    
+    경로와 parse_title 결과는 os.fsencode 한 BLOB 으로 저장합니다. Linux 의 CP949
+    파일 이름처럼 UTF-8 이 아닌 이름은 surrogateescape 문자열이 되어 TEXT 로
+    저장할 수 없기 때문입니다. 메서드가 주고받는 경로는 모두 str 입니다.
+    """
+    
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS dirs ('
+        ' path BLOB PRIMARY KEY, parent BLOB, mtime_ns INTEGER)',
+        'CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent)',
+        'CREATE TABLE IF NOT EXISTS files ('
+        ' path BLOB PRIMARY KEY, dir BLOB, size INTEGER, mtime_ns INTEGER,'
+        ' inode INTEGER, normalized TEXT, title BLOB,'
+        ' partial_hash TEXT, full_hash TEXT)',
+        'CREATE INDEX IF NOT EXISTS files_dir ON files(dir)',
+    )
+    
+    def __init__(self, root_dir: str, index_path: Optional[str] = None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.index_path = index_path or os.path.join(self.root_dir, INDEX_FILENAME)
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != INDEX_SCHEMA_VERSION:
+            # 색인은 다시 만들 수 있는 캐시이므로 형식이 바뀌면 새로 만듭니다.
+            self.conn.execute('DROP TABLE IF EXISTS dirs')
+            self.conn.execute('DROP TABLE IF EXISTS files')
+            self.conn.execute(f'PRAGMA user_version = {INDEX_SCHEMA_VERSION}')
+        for statement in self._SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+        self.is_new = self.conn.execute('SELECT 1 FROM dirs LIMIT 1').fetchone() is None
+        self.changed: Set[str] = set()
+        self._local = threading.local()
+    
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+    
+    def _reader(self) -> sqlite3.Connection:
+        """작업 스레드별 읽기 전용 연결을 반환합니다."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path)
+            self._local.conn = conn
+        return conn
+    
+    def _scan_directory(self, dir_path: str, mtime_ns: int, full: bool = False):
+        """색인을 참고해 디렉토리 하나를 처리합니다.
+
+        (레코드, (하위 디렉토리, mtime) 목록, 색인 갱신 정보) 를 반환하며
+        디렉토리가 바뀌지 않았다면 갱신 정보는 None 입니다. full 이면 디렉토리
+        mtime 과 관계없이 다시 읽고 파일마다 크기, mtime, inode 를 확인합니다.
+        """
+        reader = self._reader()
+        dir_key = os.fsencode(dir_path)
+        row = reader.execute('SELECT mtime_ns FROM dirs WHERE path = ?', (dir_key,)).fetchone()
+        
+        if not full and row is not None and row[0] == mtime_ns:
+            records = [
+                (dir_path, os.fsdecode(os.path.basename(path)), normalized, size, file_mtime,
+                 TitleInfo.from_json(os.fsdecode(title)))
+                for path, normalized, size, file_mtime, title in reader.execute(
+                    'SELECT path, normalized, size, mtime_ns, title FROM files WHERE dir = ?', (dir_key,))
+                if normalized
+            ]
+            subdirs = []
+            for (subdir,) in reader.execute('SELECT path FROM dirs WHERE parent = ?', (dir_key,)):
+                subdir = os.fsdecode(subdir)
+                try:
+                    subdirs.append((subdir, os.stat(subdir, follow_symlinks=False).st_mtime_ns))
+                except OSError:
+                    continue
+            return records, subdirs, None
+        
+        cached = {
+            path: (size, file_mtime, inode, normalized, title, partial_hash, full_hash)
+            for path, size, file_mtime, inode, normalized, title, partial_hash, full_hash
+            in reader.execute(
+                'SELECT path, size, mtime_ns, inode, normalized, title,'
+                ' partial_hash, full_hash FROM files WHERE dir = ?', (dir_key,))
+        }
+        records = []
+        subdirs = []
+        rows = []
+        changed = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != DUPLICATE_DIR_NAME:
+                                subdirs.append((entry.path, entry.stat(follow_symlinks=False).st_mtime_ns))
+                            continue
+                        if not entry.is_file():
+                            continue
+                        stem, ext = os.path.splitext(entry.name)
+                        if ext.lower() not in SCAN_EXTENSIONS:
+                            continue
+                        
+                        stat = entry.stat()
+                        inode = entry.inode()
+                        path_key = os.fsencode(entry.path)
+                        previous = cached.get(path_key)
+                        if previous and previous[:3] == (stat.st_size, stat.st_mtime_ns, inode):
+                            normalized_name, title, partial_hash, full_hash = previous[3:]
+                            info = TitleInfo.from_json(os.fsdecode(title))
+                        else:
+                            normalized_name = normalize_filename(stem)
+                            info = parse_title(stem, ext)
+                            title = os.fsencode(info.to_json())
+                            partial_hash = full_hash = None
+                            changed.append(entry.path)
+                        
+                        rows.append((path_key, dir_key, stat.st_size, stat.st_mtime_ns, inode,
+                                     normalized_name, title, partial_hash, full_hash))
+                        if normalized_name:
+                            records.append((dir_path, entry.name, normalized_name, stat.st_size,
+                                            stat.st_mtime_ns, info))
+                    except OSError as e:
+                        print(f"파일 처리 중 오류 발생: {entry.path} - {str(e)}")
+        except OSError as e:
+            print(f"디렉토리 검색 중 오류 발생: {dir_path} - {str(e)}")
+        
+        return records, subdirs, (mtime_ns, rows, changed, [subdir for subdir, _ in subdirs])
+    
+    def _apply_update(self, dir_path: str, parent: Optional[str], update) -> None:
+        """디렉토리 처리 결과를 색인에 반영합니다. 메인 스레드에서만 호출됩니다."""
+        mtime_ns, rows, changed, subdirs = update
+        conn = self.conn
+        dir_key = os.fsencode(dir_path)
+        
+        conn.execute('DELETE FROM files WHERE dir = ?', (dir_key,))
+        conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        
+        current = {os.fsencode(subdir) for subdir in subdirs}
+        for (subdir,) in conn.execute('SELECT path FROM dirs WHERE parent = ?', (dir_key,)).fetchall():
+            if subdir not in current:
+                prefix = subdir + os.fsencode(os.sep)
+                conn.execute('DELETE FROM files WHERE dir = ? OR substr(dir, 1, ?) = ?',
+                             (subdir, len(prefix), prefix))
+                conn.execute('DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?',
+                             (subdir, len(prefix), prefix))
+        
+        conn.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)',
+                     (dir_key, None if parent is None else os.fsencode(parent), mtime_ns))
+        self.changed.update(changed)
+    
+    def get_hashes(self, paths: List[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """경로별로 저장된 (부분 해시, 전체 해시) 를 반환합니다."""
+        hashes = {}
+        for i in range(0, len(paths), 500):
+            chunk = [os.fsencode(path) for path in paths[i:i + 500]]
+            query = ('SELECT path, partial_hash, full_hash FROM files WHERE path IN (%s)'
+                     % ','.join('?' * len(chunk)))
+            for path, partial_hash, full_hash in self.conn.execute(query, chunk):
+                hashes[os.fsdecode(path)] = (partial_hash, full_hash)
+        return hashes
+    
+    def refresh_files(self, rows: List[Tuple[str, int, int]]) -> None:
+        """제자리에서 수정된 파일의 (경로, 크기, mtime) 을 기록하고 저장된 해시를 지웁니다."""
+        self.conn.executemany('UPDATE files SET size = ?, mtime_ns = ?, partial_hash = NULL,'
+                              ' full_hash = NULL WHERE path = ?',
+                              [(size, mtime_ns, os.fsencode(path)) for path, size, mtime_ns in rows])
+        self.conn.commit()
+        self.changed.update(path for path, _, _ in rows)
+    
+    def store_hashes(self, column: int, rows: List[Tuple[str, str]]) -> None:
+        """계산한 해시를 저장합니다. column 이 0 이면 부분 해시, 1 이면 전체 해시입니다."""
+        name = ('partial_hash', 'full_hash')[column]
+        self.conn.executemany(f'UPDATE files SET {name} = ? WHERE path = ?',
+                              [(value, os.fsencode(path)) for path, value in rows])
+        self.conn.commit()
+    
+    def record_changes(self, rows: List[tuple], removed: Iterable[str], dirs: Iterable[str]) -> None:
+        """검색 없이 알게 된 파일 변경(감시 모드)을 색인에 반영합니다.
+
+        rows 는 files 테이블의 행(경로, 디렉토리, parse_title 결과는 str), removed 는
+        지울 파일 경로입니다. dirs 의 mtime 은 -1 로 기록하므로 다음 scan() 에서 이
+        디렉토리들만 다시 읽으며, 그때 저장된 행과 크기, mtime, inode 가 같은 파일은
+        분석 결과와 해시를 그대로 사용합니다.
+        """
+        conn = self.conn
+        conn.executemany('DELETE FROM files WHERE path = ?', [(os.fsencode(path),) for path in removed])
+        conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         [(os.fsencode(path), os.fsencode(dir_path), size, mtime_ns, inode, normalized,
+                           os.fsencode(title), partial_hash, full_hash)
+                          for path, dir_path, size, mtime_ns, inode, normalized, title,
+                          partial_hash, full_hash in rows])
+        for dir_path in dirs:
+            dir_key = os.fsencode(dir_path)
+            if conn.execute('UPDATE dirs SET mtime_ns = -1 WHERE path = ?', (dir_key,)).rowcount == 0:
+                parent = None if dir_path == self.root_dir else os.fsencode(os.path.dirname(dir_path))
+                conn.execute('INSERT INTO dirs VALUES (?, ?, -1)', (dir_key, parent))
+        conn.commit()
+    
+    def scan(self, max_workers: int = SCAN_WORKERS,
+             io_backend: Optional[IOBackend] = None, full: bool = False) -> Iterator[FileRecord]:
+        """scan_files 와 같은 레코드를 생성하면서 색인을 갱신합니다.
+
+        바뀐 디렉토리의 새 파일이나 수정된 파일 경로는 self.changed 에 모입니다.
+        io_backend 가 주어지면 디렉토리 작업을 그 위에서 io_backend.limit 개까지 동시에 실행합니다.
+        full 이면 mtime 이 그대로인 디렉토리도 다시 읽어, 디렉토리 mtime 을 바꾸지 않는
+        제자리 수정까지 반영합니다.
+        """
+        max_workers = max(1, max_workers)
+        root_mtime = os.stat(self.root_dir).st_mtime_ns
+        pending_dirs = deque([(self.root_dir, None, root_mtime)])
+        running = {}
+        updated = 0
+        
+        with contextlib.ExitStack() as stack:
+            if io_backend is None:
+                executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+                submit, limit = executor.submit, lambda: max_workers * 2
+            else:
+                submit, limit = io_backend.submit, lambda: io_backend.limit
+            while pending_dirs or running:
+                while pending_dirs and len(running) < limit():
+                    dir_path, parent, mtime_ns = pending_dirs.popleft()
+                    future = submit(self._scan_directory, dir_path, mtime_ns, full)
+                    running[future] = (dir_path, parent)
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path, parent = running.pop(future)
+                    records, subdirs, update = future.result()
+                    pending_dirs.extend((subdir, dir_path, mtime_ns) for subdir, mtime_ns in subdirs)
+                    STATS.count('directories_scanned')
+                    if update is not None:
+                        self._apply_update(dir_path, parent, update)
+                        updated += 1
+                        STATS.count('directories_reread')
+                        if updated % INDEX_COMMIT_INTERVAL == 0:
+                            self.conn.commit()
+                    yield from records
+        
+        self.conn.commit()
+
+class UnionFind:
+    """0 부터 n-1 까지의 정수를 서로소 집합으로 관리합니다. add() 로 원소를 늘릴 수 있습니다.
+
+    경로 압축과 크기 기준 합치기를 사용하므로 합치는 순서와 관계없이
+    같은 간선 집합에서는 항상 같은 묶음이 만들어집니다.
+    """
+    
+    __slots__ = ('parent', 'size')
+    
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+    
+    def find(self, x: int) -> int:
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+    
+    def add(self) -> int:
+        """원소 하나를 새 집합으로 추가하고 반환합니다."""
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+    
+    def union(self, a: int, b: int) -> bool:
+        """두 원소의 집합을 합칩니다. 이미 같은 집합이면 False 를 반환합니다."""
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return True
+    
+    def groups(self, members: Optional[Iterable[int]] = None) -> List[List[int]]:
+        """원소가 둘 이상인 집합을 반환합니다.
+
+        각 집합은 오름차순이고, 집합끼리는 가장 작은 원소 순서로 정렬됩니다.
+        members 가 주어지면 그 원소만 살펴봅니다.
+        """
+        clusters = defaultdict(list)
+        for x in sorted(range(len(self.parent)) if members is None else set(members)):
+            clusters[self.find(x)].append(x)
+        return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+def in_size_window(size1: int, size2: int, lower: float = SIZE_RATIO_LOWER,
+                   upper: float = SIZE_RATIO_UPPER) -> bool:
+    """두 파일 크기가 비교 대상이 될 만큼 비슷한지 확인합니다. 순서와 관계없습니다."""
+    small, big = (size1, size2) if size1 <= size2 else (size2, size1)
+    return lower * big <= small and big <= upper * small
+
+def _group_bucket(stems: List[str], sizes: 'array', series_keys: List[Optional[str]],
+                  base_name: str, similarity_threshold: float,
+                  similarity_mode: str = SIMILARITY_MODE,
+                  size_ratios: Tuple[float, float] = (SIZE_RATIO_LOWER, SIZE_RATIO_UPPER)
+                  ) -> List[List[int]]:
+    """후보 그룹 하나 안에서 유사한 파일을 묶습니다.
+
+    크기가 비슷하고(in_size_window) 유사도가 임계값 이상인 모든 쌍을 간선으로
+    보고 연결된 파일을 하나로 묶으므로, A~B, B~C 이면 A 와 C 가 비슷하지 않아도
+    같은 묶음이 되며 결과가 파일 순서에 따라 달라지지 않습니다. 이미 같은 묶음인
+    쌍은 다시 계산하지 않습니다. 반환값은 후보 그룹 안에서의 위치 목록이며,
+    다른 후보 그룹과 독립적이므로 별도 프로세스에서 실행할 수 있습니다.
+
+    파일을 크기 순으로 정렬한 뒤 두 포인터로 각 파일보다 크면서 크기 범위
+    (size_ratios 의 (하한, 상한)) 안에 드는 파일까지만 살펴보므로, 크기가 크게
+    다른 파일은 쌍으로 만들지도 않습니다. 크기 범위는 정렬 순서에서 구간이 되고
+    구간의 끝은 뒤 파일로 갈수록 뒤로만 움직입니다.
+    """
+    count = len(stems)
+    clusters = UnionFind(count)
+    scorer = SimilarityScorer(similarity_mode)
+    compared = pruned_size = 0
+    order = sorted(range(count), key=lambda k: sizes[k])
+    end = 0
+    
+    for rank, i in enumerate(order):
+        stem1 = stems[i]
+        series1 = series_keys[i]
+        size1 = sizes[i]
+        
+        end = max(end, rank + 1)
+        while end < count and in_size_window(size1, sizes[order[end]], *size_ratios):
+            end += 1
+        pruned_size += count - end
+        
+        root = clusters.find(i)
+        candidates = [j for j in order[rank + 1:end] if clusters.find(j) != root]
+        # 같은 시리즈로 판정된 쌍은 calculate_similarity 와 마찬가지로 유사도가 0 입니다.
+        if series1 is not None:
+            candidates = [j for j in candidates if series_keys[j] != series1]
+        compared += len(candidates)
+        
+        scores = scorer.score(stem1, [stems[j] for j in candidates], similarity_threshold)
+        for j, sim in zip(candidates, scores):
+            if sim >= similarity_threshold:
+                clusters.union(i, j)
+    
+    STATS.count('pairs_compared', compared)
+    STATS.count('pairs_pruned_size', pruned_size)
+    return clusters.groups()
+
+def _group_bucket_batch(tasks: List[tuple]) -> Tuple[List[List[List[int]]], Dict[str, int]]:
+    """여러 후보 그룹을 한 번에 처리합니다. 프로세스 풀 작업 단위입니다.
+
+    작업 프로세스에서 늘어난 STATS 카운터를 결과와 함께 반환합니다.
+    """
+    before = dict(STATS.counters)
+    results = [_group_bucket(*task) for task in tasks]
+    return results, {name: amount - before.get(name, 0) for name, amount in STATS.counters.items()}
+
+def _group_buckets_parallel(tasks: List[tuple], workers: int) -> List[List[List[int]]]:
+    """후보 그룹들을 프로세스 풀에 나누어 처리하고 입력 순서대로 결과를 반환합니다.
+
+    큰 후보 그룹부터 먼저 제출하고, 작은 후보 그룹은 GROUP_BATCH_FILES 개
+    파일 단위로 묶어 제출하여 작업당 통신 비용을 줄입니다.
+    """
+    order = sorted(range(len(tasks)), key=lambda i: len(tasks[i][0]), reverse=True)
+    batches = []
+    current = []
+    current_files = 0
+    for index in order:
+        current.append(index)
+        current_files += len(tasks[index][0])
+        if current_files >= GROUP_BATCH_FILES:
+            batches.append(current)
+            current = []
+            current_files = 0
+    if current:
+        batches.append(current)
+    
+    results = [None] * len(tasks)
+    with process_pool(workers) as executor:
+        futures = {
+            executor.submit(_group_bucket_batch, [tasks[i] for i in batch]): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch_results, counters = future.result()
+            STATS.merge(counters)
+            for index, groups in zip(futures[future], batch_results):
+                results[index] = groups
+    return results
+
+def group_similar_files(store: FileStore, 
+                       similarity_threshold: float = 0.85,
+                       changed: Optional[Set[str]] = None,
+                       content_hash: bool = True,
+                       hash_index: Optional[ScanIndex] = None,
+                       workers: Optional[int] = None,
+                       similarity_mode: str = SIMILARITY_MODE,
+                       text_fingerprint: bool = False,
+                       size_ratios: Tuple[float, float] = (SIZE_RATIO_LOWER, SIZE_RATIO_UPPER),
+                       io_backend: Optional[IOBackend] = None
+                       ) -> Dict[str, List[int]]:
+    """유사한 이름을 가진 파일들을 그룹화합니다.
+
+    결과는 그룹 이름과 store 의 파일 ID 목록이며, 그룹과 그룹 안의 파일은 경로 순서입니다.
+    workers 는 이름 비교에 사용할 프로세스 수이며(기본값: CPU 수), 비교할 파일이
+    GROUP_PARALLEL_MIN_FILES 개 미만이거나 1 이면 현재 프로세스에서 처리합니다.
+    병렬 처리 결과는 순차 처리와 같습니다.
+    changed 가 주어지면 해당 경로가 포함된 후보 그룹만 비교합니다.
+    content_hash 가 켜져 있으면 내용이 완전히 같은 파일을 먼저 묶고, 각 묶음에서
+    정규화된 이름마다 경로가 가장 앞선 파일 하나씩만 이름 비교에 참여시킵니다.
+    결과는 검색 레코드가 들어온 순서와 관계없습니다.
+    similarity_mode 는 SimilarityScorer 의 계산 방식입니다.
+    text_fingerprint 가 켜져 있으면 내용 지문이 가까운 .txt 파일도 같은 그룹으로 묶습니다.
+    size_ratios 는 이름을 비교할 두 파일의 크기 비율 (하한, 상한) 입니다.
+    io_backend 가 주어지면 내용 해시를 위한 파일 읽기를 그 위에서 실행합니다.
+    """
+    sizes = store.sizes
+    infos = store.infos
+    file_ids = range(len(store))
+    
+    with STATS.stage('hash') as stage:
+        exact_groups = (find_exact_duplicates(store, file_ids, hash_index, io_backend)
+                        if content_hash else [])
+        stage['items'] = len(store) if content_hash else 0
+    
+    # 해시 단계에서 제자리 수정이 발견되면 changed 에 더해지므로 그 뒤에 계산합니다.
+    changed_ids = None
+    if changed is not None:
+        changed_ids = {file_id for file_id in file_ids if store.path_str(file_id) in changed}
+    STATS.count('exact_groups', len(exact_groups))
+    # 내용이 같은 묶음은 경로 순서로 정렬하고, 정규화된 이름마다 경로가 가장 앞선 파일 하나씩
+    # 이름 비교에 참여시킵니다. 나머지는 이름이 같은 파일의 사본이므로 비교에서 빼고 끝에서 합칩니다.
+    exact_groups = [sorted(group, key=store.path_str) for group in exact_groups]
+    hidden = set()
+    for group in exact_groups:
+        titles = {}
+        for file_id in group:
+            titles.setdefault(store.normalized[file_id], file_id)
+        participants = set(titles.values())
+        hidden.update(file_id for file_id in group if file_id not in participants)
+        if changed_ids is not None and not changed_ids.isdisjoint(group):
+            changed_ids.update(participants)
+    active_ids = [file_id for file_id in file_ids if file_id not in hidden]
+    
+    with STATS.stage('series') as stage:
+        series_files = SeriesIndex(store, active_ids).series_files()
+        non_series_files = [f for f in active_ids if f not in series_files]
+        stage['items'] = len(active_ids)
+    STATS.count('series_files', len(series_files))
+    
+    # 크기 비교는 후보 그룹 안에서 크기 순으로 정렬해 처리합니다(_group_bucket).
+    with STATS.stage('candidates') as stage:
+        initial_groups = build_candidate_index(store, non_series_files)
+        
+        buckets = []
+        tasks = []
+        for base_name, group_files in initial_groups.items():
+            STATS.observe('bucket_size', len(group_files))
+            if len(group_files) < 2:
+                continue
+            if changed_ids is not None and changed_ids.isdisjoint(group_files):
+                continue
+            buckets.append(group_files)
+            tasks.append((
+                [store.title(file_id) for file_id in group_files],
+                array('q', (sizes[file_id] for file_id in group_files)),
+                [infos[file_id].series_key for file_id in group_files],
+                base_name,
+                similarity_threshold,
+                similarity_mode,
+                size_ratios,
+            ))
+        stage['items'] = len(non_series_files)
+    
+    # 기본 이름이 다른 쌍은 후보 그룹으로 나누는 것만으로 비교에서 제외됩니다.
+    total = len(non_series_files)
+    STATS.count('pairs_pruned_base_name', total * (total - 1) // 2 -
+                sum(len(group) * (len(group) - 1) // 2 for group in initial_groups.values()))
+    
+    workers = workers or os.cpu_count() or 1
+    compare_files = sum(len(bucket) for bucket in buckets)
+    with STATS.stage('compare') as stage, STATS.profile():
+        if workers > 1 and compare_files >= GROUP_PARALLEL_MIN_FILES:
+            results = _group_buckets_parallel(tasks, workers)
+        else:
+            results = [_group_bucket(*task) for task in tasks]
+        stage['items'] = compare_files
+    
+    text_pairs = []
+    if text_fingerprint:
+        with STATS.stage('text') as stage:
+            text_pairs = find_similar_texts(store, active_ids, workers)
+            if changed_ids is not None:
+                text_pairs = [pair for pair in text_pairs if not changed_ids.isdisjoint(pair)]
+            stage['items'] = len(active_ids)
+    
+    # 이름 유사도, 내용이 같은 파일, 내용 지문이 가까운 파일 간선을 합쳐 최종 묶음을 만듭니다.
+    with STATS.stage('merge') as stage:
+        clusters = UnionFind(len(store))
+        named = set()
+        for group_files, groups in zip(buckets, results):
+            for positions in groups:
+                for position in positions[1:]:
+                    clusters.union(group_files[positions[0]], group_files[position])
+                named.update(group_files[position] for position in positions)
+        members = set(named)
+        for id1, id2 in text_pairs:
+            clusters.union(id1, id2)
+            members.update((id1, id2))
+        for group in exact_groups:
+            if changed_ids is not None and changed_ids.isdisjoint(group) and members.isdisjoint(group):
+                continue
+            for file_id in group[1:]:
+                clusters.union(group[0], file_id)
+            members.update(group)
+        
+        # 파일 ID 는 검색 스레드가 끝나는 순서를 따르므로, 실행마다 같은 결과가 나오도록
+        # 그룹 안과 그룹 사이를 경로 순서로 정렬하고 가장 앞선 경로로 이름을 정합니다.
+        path_str = store.path_str
+        ordered = sorted((sorted(cluster, key=path_str) for cluster in clusters.groups(members)),
+                         key=lambda cluster: path_str(cluster[0]))
+        final_groups = {}
+        for cluster in ordered:
+            first = cluster[0]
+            # 내용만 같은 묶음이나 정규화된 이름이 이미 쓰인 묶음은 경로를 이름으로 씁니다.
+            key = store.normalized[first]
+            if key in final_groups or named.isdisjoint(cluster):
+                key = f"#{store.path_str(first)}"
+            final_groups[key] = cluster
+        stage['items'] = len(members)
+    
+    return final_groups
+
+class ExternalGrouping:
+    """메모리 예산 안에서 디스크의 임시 데이터베이스를 사용해 그룹화합니다.
+
+    검색 레코드를 모두 메모리에 두지 않고 임시 SQLite 파일에 기록한 뒤, 크기와
+    기본 이름(extract_base_name) 색인 순서로 한 묶음씩 읽어 처리합니다.
+    내용 해시는 크기가 같은 파일끼리, 시리즈 판정은 시리즈 키가 같은 파일끼리,
+    이름 비교는 후보 그룹(build_candidate_index 와 같은 기준)끼리만 메모리에 올리므로
+    최대 메모리는 라이브러리 크기가 아니라 가장 큰 후보 그룹의 크기에 따라 정해집니다.
+    
+    반복하면 (그룹 이름, 그룹의 파일만 담은 FileStore) 를 찾는 즉시 하나씩 내며,
+    찾은 그룹은 임시 데이터베이스에도 기록되므로 다시 반복하면 기록된 그룹을 읽습니다.
+    그룹 내용은 group_similar_files 와 같지만 그룹 순서는 기본 이름 순서이고,
+    정규화된 이름이 겹칠 때 어느 그룹이 경로 이름을 쓰는지는 달라질 수 있습니다.
+    EPUB 메타데이터, 내용 지문, 변경된 파일만 비교하는 기능은 지원하지 않습니다.
+    경로, 이름, parse_title 결과와 시리즈 키는 ScanIndex 와 같이 os.fsencode 한 BLOB 으로 저장합니다.
+    """
+    
+    _SCHEMA = (
+        'CREATE TABLE files ('
+        ' id INTEGER PRIMARY KEY, dir BLOB, name BLOB, normalized TEXT, size INTEGER,'
+        ' mtime_ns INTEGER, title BLOB, base_name TEXT, series_key BLOB)',
+        # 내용이 같은 그룹의 대표 파일, hidden 은 이름 비교에서 빠지는 파일
+        'CREATE TABLE exact (id INTEGER PRIMARY KEY, rep INTEGER, hidden INTEGER)',
+        'CREATE TABLE series (key BLOB PRIMARY KEY)',  # 연속된 권수로 판정된 시리즈
+        'CREATE TABLE named (id INTEGER PRIMARY KEY)',  # 이름 비교 그룹에 들어간 파일
+        'CREATE TABLE keys (key BLOB PRIMARY KEY)',  # 사용한 그룹 이름
+        'CREATE TABLE results (seq INTEGER, key BLOB, id INTEGER)',  # 찾은 그룹
+        'CREATE TABLE deferred (seq INTEGER, id INTEGER)',  # 다른 그룹과 합쳐질 수 있는 이름 비교 그룹
+    )
+    _INDEXES = (
+        'CREATE INDEX files_size ON files(size)',
+        'CREATE INDEX files_base_name ON files(base_name)',
+        'CREATE INDEX files_series_key ON files(series_key)',
+        'CREATE INDEX exact_rep ON exact(rep)',
+    )
+    _COLUMNS = 'id, dir, name, normalized, size, mtime_ns, title'
+    
+    def __init__(self, records: Iterable[FileRecord], similarity_threshold: float,
+                 memory_budget: int, content_hash: bool = True,
+                 hash_index: Optional[ScanIndex] = None,
+                 workers: Optional[int] = None,
+                 similarity_mode: str = SIMILARITY_MODE,
+                 temp_dir: Optional[str] = None,
+                 size_ratios: Tuple[float, float] = (SIZE_RATIO_LOWER, SIZE_RATIO_UPPER),
+                 io_backend: Optional[IOBackend] = None):
+        self.similarity_threshold = similarity_threshold
+        self.similarity_mode = similarity_mode
+        self.size_ratios = size_ratios
+        self.content_hash = content_hash
+        self.hash_index = hash_index
+        self.io_backend = io_backend
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_files = max(GROUP_BATCH_FILES, memory_budget // 2 // EXTERNAL_RECORD_BYTES)
+        self.file_count = 0
+        self.group_count = 0
+        self._records = records
+        self._done = False
+        self._linked: Dict[int, int] = {}  # 이름 비교에 둘 이상 참여하는 내용 그룹의 파일 -> 대표 파일
+        self._deferred_count = 0
+        
+        self._cache_bytes = CACHE.max_bytes
+        CACHE.resize(min(CACHE.max_bytes, memory_budget // EXTERNAL_CACHE_FRACTION))
+        fd, self.path = tempfile.mkstemp(prefix='clean_up_novel_', suffix='.db', dir=temp_dir)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute(f'PRAGMA cache_size = -{max(1, memory_budget // EXTERNAL_SQLITE_FRACTION // 1024)}')
+        for statement in self._SCHEMA:
+            self.conn.execute(statement)
+    
+    def __enter__(self) -> 'ExternalGrouping':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """임시 데이터베이스를 닫고 지운 뒤 캐시 예산을 되돌립니다."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            with contextlib.suppress(OSError):
+                os.remove(self.path)
+            CACHE.resize(self._cache_bytes)
+    
+    def __iter__(self) -> Iterator[Tuple[str, FileStore]]:
+        if self._done:
+            return self._replay()
+        return self._run()
+    
+    @staticmethod
+    def _decode(rows: Iterable[tuple]) -> Iterator[tuple]:
+        """_COLUMNS 순서의 행에서 BLOB 으로 저장한 경로, 이름, parse_title 결과를 str 로 바꿉니다."""
+        for file_id, dir_path, name, normalized, size, mtime_ns, title in rows:
+            yield (file_id, os.fsdecode(dir_path), os.fsdecode(name), normalized, size, mtime_ns,
+                   os.fsdecode(title))
+    
+    def _load(self, rows: Iterable[tuple]) -> Tuple[FileStore, List[int]]:
+        """_decode 한 행으로 FileStore 와 행 ID 목록을 만듭니다."""
+        store = FileStore()
+        ids = []
+        for file_id, dir_path, name, normalized, size, mtime_ns, title in rows:
+            store.add(dir_path, name, normalized, size, mtime_ns, TitleInfo.from_json(title))
+            ids.append(file_id)
+        return store, ids
+    
+    def _select(self, file_ids: List[int]) -> Iterator[tuple]:
+        """행 ID 순서로 파일 행을 읽습니다."""
+        for i in range(0, len(file_ids), 500):
+            chunk = file_ids[i:i + 500]
+            yield from self._decode(self.conn.execute(
+                f'SELECT {self._COLUMNS} FROM files WHERE id IN (%s) ORDER BY id'
+                % ','.join('?' * len(chunk)), chunk))
+    
+    def _spill(self) -> None:
+        """검색 레코드를 임시 데이터베이스에 기록하고 색인을 만듭니다."""
+        with STATS.stage('spill') as stage:
+            insert = 'INSERT INTO files VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)'
+            batch = []
+            for dir_path, name, normalized, size, mtime_ns, info in self._records:
+                batch.append((os.fsencode(dir_path), os.fsencode(name), normalized, size, mtime_ns,
+                              os.fsencode(info.to_json()), info.base_name,
+                              None if info.series_key is None else os.fsencode(info.series_key)))
+                if len(batch) >= EXTERNAL_INSERT_BATCH:
+                    self.conn.executemany(insert, batch)
+                    self.file_count += len(batch)
+                    batch = []
+            self.conn.executemany(insert, batch)
+            self.file_count += len(batch)
+            for statement in self._INDEXES:
+                self.conn.execute(statement)
+            self.conn.commit()
+            stage['items'] = self.file_count
+    
+    def _find_exact(self) -> None:
+        """크기가 같은 파일을 chunk_files 개 정도씩 읽어 내용이 같은 그룹을 기록합니다."""
+        def resolve(rows: List[tuple]) -> None:
+            store, ids = self._load(rows)
+            for group in find_exact_duplicates(store, range(len(store)), self.hash_index,
+                                               self.io_backend):
+                # group_similar_files 와 같이 정규화된 이름마다 경로가 가장 앞선 파일이 참여합니다.
+                group = sorted(group, key=store.path_str)
+                titles = {}
+                for member in group:
+                    titles.setdefault(store.normalized[member], member)
+                participants = set(titles.values())
+                self.conn.executemany('INSERT INTO exact VALUES (?, ?, ?)',
+                                      [(ids[member], ids[group[0]], member not in participants)
+                                       for member in group[1:]])
+                if len(participants) > 1:
+                    self._linked.update((ids[member], ids[group[0]]) for member in participants)
+                STATS.count('exact_groups')
+        
+        with STATS.stage('hash') as stage:
+            rows = self._decode(self.conn.execute(
+                f'SELECT {self._COLUMNS} FROM files WHERE size IN ('
+                ' SELECT size FROM files WHERE size > 0 GROUP BY size HAVING COUNT(*) > 1)'
+                ' ORDER BY size, id'))
+            pending = []
+            for _, bucket in itertools.groupby(rows, key=lambda row: row[4]):
+                pending.extend(bucket)
+                if len(pending) >= self.chunk_files:
+                    resolve(pending)
+                    stage['items'] += len(pending)
+                    pending = []
+            resolve(pending)
+            stage['items'] += len(pending)
+    
+    def _find_series(self) -> None:
+        """시리즈 키가 같은 파일끼리 읽어 연속된 권수인 시리즈를 기록합니다."""
+        with STATS.stage('series') as stage:
+            rows = self.conn.execute(
+                'SELECT series_key, title FROM files'
+                ' WHERE series_key IS NOT NULL AND id NOT IN (SELECT id FROM exact WHERE hidden)'
+                ' ORDER BY series_key')
+            for series_key, group in itertools.groupby(rows, key=lambda row: row[0]):
+                infos = [TitleInfo.from_json(os.fsdecode(title)) for _, title in group]
+                stage['items'] += len(infos)
+                if len(infos) > 1 and is_same_series(infos):
+                    self.conn.execute('INSERT INTO series VALUES (?)', (series_key,))
+                    STATS.count('series_files', len(infos))
+    
+    def _compare(self) -> Iterator[Tuple[str, FileStore]]:
+        """후보 그룹을 chunk_files 개 정도씩 모아 비교하고 찾은 그룹을 냅니다."""
+        rows = self.conn.execute(
+            'SELECT id, base_name, name, size, title FROM files'
+            ' WHERE id NOT IN (SELECT id FROM exact WHERE hidden)'
+            ' AND (series_key IS NULL OR series_key NOT IN (SELECT key FROM series))'
+            ' ORDER BY base_name, id')
+        buckets = []
+        tasks = []
+        files = 0
+        for base_name, group in itertools.groupby(rows, key=lambda row: row[1]):
+            group = list(group)
+            STATS.observe('bucket_size', len(group))
+            if len(group) < 2:
+                continue
+            buckets.append([row[0] for row in group])
+            tasks.append((
+                [os.path.splitext(os.fsdecode(row[2]))[0] for row in group],
+                array('q', (row[3] for row in group)),
+                [TitleInfo.from_json(os.fsdecode(row[4])).series_key for row in group],
+                base_name,
+                self.similarity_threshold,
+                self.similarity_mode,
+                self.size_ratios,
+            ))
+            files += len(group)
+            if files >= self.chunk_files:
+                yield from self._compare_chunk(buckets, tasks, files)
+                buckets, tasks, files = [], [], 0
+        yield from self._compare_chunk(buckets, tasks, files)
+    
+    def _compare_chunk(self, buckets: List[List[int]], tasks: List[tuple],
+                       files: int) -> Iterator[Tuple[str, FileStore]]:
+        with STATS.stage('compare') as stage:
+            if self.workers > 1 and files >= GROUP_PARALLEL_MIN_FILES:
+                results = _group_buckets_parallel(tasks, self.workers)
+            else:
+                results = [_group_bucket(*task) for task in tasks]
+            stage['items'] = files
+        for file_ids, clusters in zip(buckets, results):
+            for positions in clusters:
+                cluster = [file_ids[position] for position in positions]
+                if any(file_id in self._linked for file_id in cluster):
+                    # 내용이 같은 파일을 통해 다른 후보 그룹의 결과와 이어질 수 있으므로 끝에서 합칩니다.
+                    self.conn.executemany('INSERT INTO deferred VALUES (?, ?)',
+                                          [(self._deferred_count, file_id) for file_id in cluster])
+                    self._deferred_count += 1
+                else:
+                    yield self._emit(cluster, named=True)
+    
+    def _emit_deferred(self) -> Iterator[Tuple[str, FileStore]]:
+        """미뤄 둔 이름 비교 그룹을 내용이 같은 파일로 이어진 것끼리 합쳐 냅니다."""
+        clusters = [[file_id for _, file_id in group] for _, group in itertools.groupby(
+            self.conn.execute('SELECT seq, id FROM deferred ORDER BY seq, id'), key=lambda row: row[0])]
+        links = UnionFind(len(clusters))
+        owners: Dict[int, int] = {}
+        for position, cluster in enumerate(clusters):
+            for file_id in cluster:
+                rep = self._linked.get(file_id)
+                if rep is not None:
+                    links.union(owners.setdefault(rep, position), position)
+        merged: Dict[int, Set[int]] = defaultdict(set)
+        for position, cluster in enumerate(clusters):
+            merged[links.find(position)].update(cluster)
+        for root in sorted(merged):
+            yield self._emit(sorted(merged[root]), named=True)
+    
+    def _emit(self, file_ids: List[int], named: bool) -> Tuple[str, FileStore]:
+        """그룹 하나를 기록하고 (그룹 이름, FileStore) 를 반환합니다.
+        
+        이름 비교 그룹에는 참여한 파일과 내용이 같은 파일을 함께 넣습니다.
+        """
+        members = set(file_ids)
+        if named:
+            reps = sorted(members | {self._linked[file_id] for file_id in file_ids
+                                     if file_id in self._linked})
+            members.update(reps)
+            for i in range(0, len(reps), 500):
+                chunk = reps[i:i + 500]
+                members.update(file_id for (file_id,) in self.conn.execute(
+                    'SELECT id FROM exact WHERE rep IN (%s)' % ','.join('?' * len(chunk)), chunk))
+            self.conn.executemany('INSERT OR IGNORE INTO named VALUES (?)',
+                                  [(file_id,) for file_id in members])
+        file_ids = sorted(members)
+        # group_similar_files 와 같이 파일은 경로 순서로 두고 가장 앞선 경로의 이름을 씁니다.
+        store, _ = self._load(sorted(self._select(file_ids), key=lambda row: os.path.join(row[1], row[2])))
+        
+        # 이름이 이미 쓰였거나 내용만 같은 그룹은 경로를 이름으로 씁니다.
+        key = store.normalized[0]
+        if not named or self.conn.execute('INSERT OR IGNORE INTO keys VALUES (?)',
+                                          (os.fsencode(key),)).rowcount == 0:
+            key = f"#{store.path_str(0)}"
+        self.conn.executemany('INSERT INTO results VALUES (?, ?, ?)',
+                              [(self.group_count, os.fsencode(key), file_id) for file_id in file_ids])
+        self.group_count += 1
+        return key, store
+    
+    def _run(self) -> Iterator[Tuple[str, FileStore]]:
+        self._spill()
+        if self.content_hash:
+            self._find_exact()
+        self._find_series()
+        yield from self._compare()
+        yield from self._emit_deferred()
+        
+        # 이름 비교 그룹에 들어가지 않은 내용이 같은 그룹
+        rows = self.conn.execute('SELECT rep, id FROM exact WHERE rep NOT IN (SELECT id FROM named)'
+                                 ' ORDER BY rep, id')
+        for rep, group in itertools.groupby(rows, key=lambda row: row[0]):
+            yield self._emit([rep] + [file_id for _, file_id in group], named=False)
+        self.conn.commit()
+        self._done = True
+    
+    def _replay(self) -> Iterator[Tuple[str, FileStore]]:
+        rows = self.conn.execute('SELECT seq, key, id FROM results ORDER BY seq, id')
+        for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            store, _ = self._load(sorted(self._select([file_id for _, _, file_id in group]),
+                                         key=lambda row: os.path.join(row[1], row[2])))
+            yield os.fsdecode(group[0][1]), store
+
+class LiveMatch(NamedTuple):
+    """감시 모드에서 새 파일이 들어간 중복 그룹입니다."""
+    file_id: int  # 새 파일
+    matches: List[Tuple[int, str, float]]  # (기존 파일, 'content'|'name', 유사도)
+    group: List[int]  # 감시 중에 만들어진 그룹 전체 (새 파일 포함)
+    new_group: bool  # 이미 보고한 그룹에 더해진 것이 아니라 새로 만들어진 그룹인지
+    seconds: float  # 새 파일 하나를 처리하는 데 걸린 시간
+
+class LiveIndex:
+    """감시 모드에서 새로 들어온 파일을 기존 라이브러리와 바로 비교하는 메모리 색인입니다.
+
+    group_similar_files 와 같은 기준을 파일 하나에 적용합니다. 기본 이름(후보 그룹)별로
+    크기 순으로 정렬한 목록, 시리즈 색인(SeriesIndex), 크기별 파일 목록과 계산한 내용
+    해시를 메모리에 두므로, 새 파일 하나를 처리하는 비용은 라이브러리 크기가 아니라
+    같은 후보 그룹의 크기 범위 안 파일과 크기가 같은 파일 수에 따라 정해집니다.
+    이름은 calculate_similarity 로, 내용은 부분 해시와 전체 해시 순서로 비교하며,
+    시리즈가 같은 파일끼리와 연속된 권으로 이루어진 시리즈는 이름 비교에서 뺍니다.
+    
+    add_path() 는 새 파일이 중복 그룹에 들어가면 LiveMatch 를 반환합니다. 그룹은 감시를
+    시작한 뒤 들어온 파일로 만들어지며 시작 전부터 있던 그룹은 보고하지 않습니다.
+    snapshot() 은 바뀐 내용을 검색 색인에 기록하여 다시 시작할 때 바뀐 폴더만 읽게 합니다.
+    """
+    
+    def __init__(self, root_dir: str, store: FileStore, similarity_threshold: float,
+                 content_hash: bool = True, hash_index: Optional[ScanIndex] = None,
+                 size_ratios: Tuple[float, float] = (SIZE_RATIO_LOWER, SIZE_RATIO_UPPER)):
+        self.root_dir = os.path.abspath(root_dir)
+        self.store = store
+        self.similarity_threshold = similarity_threshold
+        self.content_hash = content_hash
+        self.hash_index = hash_index
+        self.size_ratios = size_ratios
+        self.paths: Dict[str, int] = {}
+        self.buckets: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # 기본 이름 -> (크기, ID) 정렬 목록
+        self.by_size: Dict[int, List[int]] = defaultdict(list)
+        self.series = SeriesIndex(store, ())
+        self.hashes: Dict[int, List[Optional[str]]] = {}  # ID -> [부분 해시, 전체 해시]
+        self.removed: Set[int] = set()
+        self.clusters = UnionFind(len(store))
+        self.members: Dict[int, List[int]] = {}  # 감시 중에 만든 그룹의 대표 -> 파일 ID 목록
+        self._series_cache: Dict[str, bool] = {}
+        self._inodes: Dict[int, int] = {}
+        self._added: Set[int] = set()
+        self._hashed: Set[int] = set()
+        self._removed_paths: Set[str] = set()
+        self._touched_dirs: Set[str] = set()
+        
+        for file_id in range(len(store)):
+            self._index(file_id, sort=False)
+        for bucket in self.buckets.values():
+            bucket.sort()
+    
+    def __len__(self) -> int:
+        return len(self.paths)
+    
+    def _index(self, file_id: int, sort: bool = True) -> None:
+        store = self.store
+        size = store.sizes[file_id]
+        self.paths[store.path_str(file_id)] = file_id
+        bucket = self.buckets[store.infos[file_id].base_name]
+        if sort:
+            bisect.insort(bucket, (size, file_id))
+        else:
+            bucket.append((size, file_id))
+        if size > 0:
+            self.by_size[size].append(file_id)
+        self.series.add(file_id)
+        self._series_cache.pop(store.infos[file_id].series_key, None)
+    
+    def _unindex(self, file_id: int) -> None:
+        store = self.store
+        size = store.sizes[file_id]
+        info = store.infos[file_id]
+        path = store.path_str(file_id)
+        del self.paths[path]
+        self.buckets[info.base_name].remove((size, file_id))
+        if size > 0:
+            self.by_size[size].remove(file_id)
+        self.series.remove(file_id)
+        self._series_cache.pop(info.series_key, None)
+        self.removed.add(file_id)
+        self._removed_paths.add(path)
+        self._touched_dirs.add(os.path.dirname(path))
+    
+    def _is_series(self, key: str) -> bool:
+        result = self._series_cache.get(key)
+        if result is None:
+            result = self._series_cache[key] = self.series.is_series(key)
+        return result
+    
+    def _hash(self, file_id: int, column: int) -> Optional[str]:
+        """부분(column 0) 또는 전체(column 1) 해시를 계산하거나 색인에서 가져옵니다."""
+        hashes = self.hashes.get(file_id)
+        if hashes is None:
+            hashes = self.hashes[file_id] = [None, None]
+            if self.hash_index is not None and file_id not in self._added:
+                path = self.store.path_str(file_id)
+                known = self.hash_index.get_hashes([path]).get(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    stat = None
+                # 제자리에서 수정된 파일의 저장된 해시는 쓰지 않습니다.
+                if known and stat is not None and (stat.st_size, stat.st_mtime_ns) == (
+                        self.store.sizes[file_id], self.store.mtimes[file_id]):
+                    hashes[:] = known
+        if hashes[column] is None:
+            hash_func = (hash_file_partial, hash_file_full)[column]
+            try:
+                hashes[column] = hash_func(self.store.path(file_id), self.store.sizes[file_id])
+            except OSError as e:
+                print(f"파일 해시 중 오류 발생: {self.store.path_str(file_id)} - {str(e)}")
+                return None
+            self._hashed.add(file_id)
+            STATS.count('watch_hashes')
+        return hashes[column]
+    
+    def _same_content(self, file_id: int) -> List[int]:
+        """크기가 같은 파일 중 내용이 완전히 같은 파일을 찾습니다."""
+        size = self.store.sizes[file_id]
+        others = self.by_size.get(size)
+        if not others:
+            return []
+        partial = self._hash(file_id, 0)
+        if partial is None:
+            return []
+        same = [other for other in others if self._hash(other, 0) == partial]
+        if same and size > HASH_PARTIAL_BYTES * 2:
+            full = self._hash(file_id, 1)
+            same = [other for other in same if full is not None and self._hash(other, 1) == full]
+        return same
+    
+    def _match(self, file_id: int) -> List[Tuple[int, str, float]]:
+        """새 파일과 중복인 기존 파일을 (ID, 이유, 유사도) 로 찾습니다. 색인에 넣기 전에 호출합니다."""
+        store = self.store
+        infos = store.infos
+        info = infos[file_id]
+        size = store.sizes[file_id]
+        matches: Dict[int, Tuple[str, float]] = {}
+        
+        if self.content_hash and size > 0:
+            for other in self._same_content(file_id):
+                matches[other] = ('content', 1.0)
+        
+        if info.series_key is not None:
+            # 새 파일까지 넣었을 때 연속된 권이 되는 시리즈는 이름을 비교하지 않습니다.
+            self.series.add(file_id)
+            is_series = self.series.is_series(info.series_key)
+            self.series.remove(file_id)
+            if is_series:
+                return [(other, reason, score) for other, (reason, score) in matches.items()]
+        
+        # in_size_window 를 만족하는 크기 구간만 이진 탐색으로 잘라내어 비교합니다.
+        lower, upper = self.size_ratios
+        low = max(lower * size, size / upper)
+        high = min(upper * size, size / lower)
+        bucket = self.buckets.get(info.base_name, [])
+        title = store.title(file_id)
+        compared = 0
+        for other_size, other in bucket[bisect.bisect_left(bucket, (low, -1)):
+                                        bisect.bisect_right(bucket, (high, len(store)))]:
+            if other in matches or not in_size_window(size, other_size, lower, upper):
+                continue
+            other_info = infos[other]
+            if other_info.series_key is not None and (other_info.series_key == info.series_key
+                                                      or self._is_series(other_info.series_key)):
+                continue
+            compared += 1
+            score = calculate_similarity(title, store.title(other), info, other_info)
+            if score >= self.similarity_threshold:
+                matches[other] = ('name', score)
+        STATS.count('pairs_compared', compared)
+        return [(other, reason, score) for other, (reason, score) in matches.items()]
+    
+    def _join(self, file_id: int, others: Iterable[int]) -> List[int]:
+        """새 파일과 기존 파일을 한 그룹으로 합치고 그룹의 현재 파일 목록을 반환합니다."""
+        clusters = self.clusters
+        group = self.members.pop(clusters.find(file_id), [file_id])
+        for other in others:
+            other_root = clusters.find(other)
+            if clusters.find(file_id) == other_root:
+                continue
+            other_members = self.members.pop(other_root, [other])
+            clusters.union(file_id, other)
+            group.extend(other_members)
+        self.members[clusters.find(file_id)] = group
+        return sorted(member for member in group if member not in self.removed)
+    
+    def add_path(self, path: str) -> Optional[LiveMatch]:
+        """새로 생기거나 바뀐 파일을 색인에 넣고, 중복 그룹에 들어가면 LiveMatch 를 반환합니다."""
+        start = time.perf_counter()
+        dir_path, name = os.path.split(os.path.abspath(path))
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in SCAN_EXTENSIONS:
+            return None
+        if DUPLICATE_DIR_NAME in os.path.relpath(dir_path, self.root_dir).split(os.sep):
+            return None
+        normalized_name = normalize_filename(stem)
+        if not normalized_name:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        
+        store = self.store
+        existing = self.paths.get(os.path.join(dir_path, name))
+        if existing is not None:
+            if (store.sizes[existing], store.mtimes[existing]) == (stat.st_size, stat.st_mtime_ns):
+                return None
+            self._unindex(existing)
+        
+        file_id = store.add(dir_path, name, normalized_name, stat.st_size, stat.st_mtime_ns,
+                            parse_title(stem, ext))
+        self.clusters.add()
+        self._inodes[file_id] = stat.st_ino
+        self._added.add(file_id)
+        self._touched_dirs.add(dir_path)
+        matches = self._match(file_id)
+        self._index(file_id)
+        STATS.count('watch_files')
+        
+        others = [other for other, _, _ in matches]
+        new_group = not any(self.clusters.find(other) in self.members for other in others)
+        group = self._join(file_id, others) if matches else None
+        seconds = time.perf_counter() - start
+        STATS.observe('watch_latency_us', int(seconds * 1000000))
+        if group is None:
+            return None
+        STATS.count('watch_groups')
+        return LiveMatch(file_id, matches, group, new_group, seconds)
+    
+    def remove(self, path: str) -> int:
+        """삭제되거나 밖으로 옮겨진 파일(또는 폴더 아래의 모든 파일)을 색인에서 빼고 그 수를 반환합니다."""
+        path = os.path.abspath(path)
+        file_id = self.paths.get(path)
+        if file_id is not None:
+            self._unindex(file_id)
+            return 1
+        prefix = path + os.sep
+        file_ids = [file_id for other, file_id in self.paths.items() if other.startswith(prefix)]
+        for file_id in file_ids:
+            self._unindex(file_id)
+        return len(file_ids)
+    
+    def snapshot(self, index: ScanIndex) -> int:
+        """마지막 기록 이후 바뀐 파일과 계산한 해시를 검색 색인에 기록하고 기록한 새 파일 수를 반환합니다."""
+        store = self.store
+        rows = []
+        for file_id in sorted(self._added - self.removed):
+            hashes = self.hashes.get(file_id, (None, None))
+            rows.append((store.path_str(file_id), store.dirs[store.dir_ids[file_id]],
+                         store.sizes[file_id], store.mtimes[file_id], self._inodes[file_id],
+                         store.normalized[file_id], store.infos[file_id].to_json(),
+                         hashes[0], hashes[1]))
+        for column in (0, 1):
+            index.store_hashes(column, [(store.path_str(file_id), self.hashes[file_id][column])
+                                        for file_id in self._hashed - self._added - self.removed
+                                        if self.hashes[file_id][column]])
+        index.record_changes(rows, self._removed_paths, self._touched_dirs)
+        self._added.clear()
+        self._hashed.clear()
+        self._removed_paths.clear()
+        self._touched_dirs.clear()
+        return len(rows)
+
+class InotifyWatcher:
+    """Linux inotify 로 대상 폴더 아래의 파일 추가/삭제를 감지합니다.
+
+    하위 폴더마다 감시를 걸고, 새 폴더가 생기면 감시를 추가하면서 그 안의 파일을
+    새 파일로 알립니다. 파일은 쓰기를 마치고 닫히거나(IN_CLOSE_WRITE) 옮겨 들어온
+    (IN_MOVED_TO) 때 추가된 것으로 봅니다. ctypes 로 libc 를 직접 호출하므로
+    추가 패키지가 필요 없으며, 감시 수 한도를 넘으면 OSError 를 냅니다.
+    """
+    
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_ISDIR = 0x40000000
+    _MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    
+    def __init__(self, root_dir: str, interval: float = WATCH_INTERVAL):
+        import ctypes
+        import ctypes.util
+        import struct
+        self.root_dir = os.path.abspath(root_dir)
+        self.interval = interval
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._header = struct.Struct('iIII')
+        self._dirs: Dict[int, str] = {}
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        try:
+            self._watch_tree(self.root_dir)
+        except OSError:
+            self.close()
+            raise
+    
+    def _watch_tree(self, dir_path: str) -> List[str]:
+        """dir_path 와 하위 폴더에 감시를 걸고 그 안의 파일 경로를 반환합니다."""
+        files = []
+        pending = [dir_path]
+        while pending:
+            current = pending.pop()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(current), self._MASK)
+            if wd < 0:
+                error = self._ctypes.get_errno()
+                raise OSError(error, os.strerror(error), current)
+            self._dirs[wd] = current
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != DUPLICATE_DIR_NAME:
+                                pending.append(entry.path)
+                        else:
+                            files.append(entry.path)
+            except OSError as e:
+                print(f"디렉토리 검색 중 오류 발생: {current} - {str(e)}")
+        return files
+    
+    def _unwatch_tree(self, dir_path: str) -> None:
+        prefix = dir_path + os.sep
+        for wd, path in list(self._dirs.items()):
+            if path == dir_path or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self._dirs[wd]
+    
+    def _parse(self, data: bytes) -> List[Tuple[str, str]]:
+        events = []
+        offset = 0
+        header_size = self._header.size
+        while offset + header_size <= len(data):
+            wd, mask, _, length = self._header.unpack_from(data, offset)
+            name = data[offset + header_size:offset + header_size + length].rstrip(b'\0')
+            offset += header_size + length
+            if mask & self._IN_Q_OVERFLOW:
+                print("⚠ 변경 사항이 너무 많아 일부를 놓쳤을 수 있습니다. 다시 시작하면 반영됩니다.")
+                continue
+            if mask & self._IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            dir_path = self._dirs.get(wd)
+            if dir_path is None or not name:
+                continue
+            path = os.path.join(dir_path, os.fsdecode(name))
+            if mask & self._IN_ISDIR:
+                if mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                    if os.path.basename(path) != DUPLICATE_DIR_NAME:
+                        try:
+                            events.extend(('add', file_path) for file_path in self._watch_tree(path))
+                        except OSError as e:
+                            print(f"⚠ 새 폴더를 감시할 수 없습니다: {path} - {str(e)}")
+                elif mask & (self._IN_DELETE | self._IN_MOVED_FROM):
+                    self._unwatch_tree(path)
+                    events.append(('remove', path))
+            elif mask & (self._IN_CLOSE_WRITE | self._IN_MOVED_TO):
+                events.append(('add', path))
+            elif mask & (self._IN_DELETE | self._IN_MOVED_FROM):
+                events.append(('remove', path))
+        return events
+    
+    def events(self) -> Iterator[List[Tuple[str, str]]]:
+        """('add' 또는 'remove', 경로) 목록을 계속 냅니다. 변화가 없으면 interval 마다 빈 목록을 냅니다."""
+        import select
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], self.interval)
+            if not ready:
+                yield []
+                continue
+            yield self._parse(os.read(self.fd, WATCH_EVENT_BUFFER))
+    
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """폴더를 주기적으로 확인하여 파일 추가/삭제를 감지합니다. inotify 를 쓸 수 없을 때 사용합니다.
+
+    ScanIndex 와 마찬가지로 mtime 이 바뀐 폴더만 다시 읽습니다. 새 파일은 크기와
+    수정 시각이 한 번의 확인 간격 동안 그대로일 때(내려받기가 끝났을 때) 알립니다.
+    known 은 감시를 시작할 때 이미 색인에 있는 {경로: (크기, mtime)} 입니다.
+    """
+    
+    def __init__(self, root_dir: str, interval: float = WATCH_INTERVAL,
+                 known: Optional[Dict[str, Tuple[int, int]]] = None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.interval = interval
+        self.dirs: Dict[str, Tuple[int, List[str], Dict[str, Tuple[int, int]]]] = {}  # 폴더 -> (mtime, 하위 폴더, 파일)
+        self.pending: Dict[str, Tuple[int, int]] = {}  # 아직 크기가 바뀌고 있을 수 있는 새 파일
+        self._known: Dict[str, Dict[str, Tuple[int, int]]] = defaultdict(dict)
+        for path, signature in (known or {}).items():
+            self._known[os.path.dirname(path)][path] = signature
+    
+    def _read_dir(self, dir_path: str, mtime_ns: int, events: List[Tuple[str, str]]) -> None:
+        previous = self.dirs[dir_path][2] if dir_path in self.dirs else self._known.pop(dir_path, {})
+        subdirs = []
+        files = {}
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != DUPLICATE_DIR_NAME:
+                                subdirs.append(entry.path)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SCAN_EXTENSIONS:
+                            stat = entry.stat()
+                            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"디렉토리 검색 중 오류 발생: {dir_path} - {str(e)}")
+            return
+        for path, signature in files.items():
+            if previous.get(path) != signature and path not in self.pending:
+                self.pending[path] = signature
+        for path in previous:
+            if path not in files:
+                self.pending.pop(path, None)
+                events.append(('remove', path))
+        for subdir in self.dirs.get(dir_path, (0, [], {}))[1]:
+            if subdir not in subdirs:
+                self._forget(subdir)
+                events.append(('remove', subdir))
+        # 알리기 전인 새 파일은 이전 목록에 넣지 않아야 다음 확인에서 사라진 것으로 보지 않습니다.
+        self.dirs[dir_path] = (mtime_ns, subdirs,
+                               {path: signature for path, signature in files.items()
+                                if path not in self.pending or path in previous})
+    
+    def _forget(self, dir_path: str) -> None:
+        prefix = dir_path + os.sep
+        for path in [path for path in self.dirs if path == dir_path or path.startswith(prefix)]:
+            del self.dirs[path]
+        for path in [path for path in self.pending if path.startswith(prefix)]:
+            del self.pending[path]
+    
+    def poll(self) -> List[Tuple[str, str]]:
+        """한 번 확인하고 ('add' 또는 'remove', 경로) 목록을 반환합니다."""
+        events = []
+        settled = {}
+        for path, signature in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current == signature:
+                settled[path] = current
+            else:
+                self.pending[path] = current
+        
+        pending_dirs = [self.root_dir]
+        while pending_dirs:
+            dir_path = pending_dirs.pop()
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            state = self.dirs.get(dir_path)
+            if state is None or state[0] != mtime_ns:
+                self._read_dir(dir_path, mtime_ns, events)
+            pending_dirs.extend(self.dirs.get(dir_path, (0, [], {}))[1])
+        
+        for path, signature in settled.items():
+            if self.pending.get(path) == signature:
+                del self.pending[path]
+                state = self.dirs.get(os.path.dirname(path))
+                if state is not None:
+                    state[2][path] = signature
+                events.append(('add', path))
+        return events
+    
+    def events(self) -> Iterator[List[Tuple[str, str]]]:
+        """('add' 또는 'remove', 경로) 목록을 interval 마다 냅니다."""
+        while True:
+            yield self.poll()
+            time.sleep(self.interval)
+    
+    def close(self) -> None:
+        pass
+
+def open_watcher(root_dir: str, interval: float = WATCH_INTERVAL, poll: bool = False,
+                 known: Optional[Dict[str, Tuple[int, int]]] = None):
+    """Linux 에서는 InotifyWatcher 를, 그 외 환경이나 poll 이 켜져 있으면 PollingWatcher 를 만듭니다."""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root_dir, interval)
+        except (OSError, AttributeError) as e:
+            print(f"⚠ inotify 를 사용할 수 없어 {interval}초마다 폴더를 확인합니다: {str(e)}")
+    return PollingWatcher(root_dir, interval, known)
+
+def format_file_size(size_in_bytes: int) -> str:
+    """파일 크기를 읽기 쉬운 형식으로 변환합니다."""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_in_bytes < 1024:
+            return f"{size_in_bytes:.1f}{unit}"
+        size_in_bytes /= 1024
+    return f"{size_in_bytes:.1f}TB"
+
+def _format_mtime(mtime_ns: int) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(mtime_ns / 1e9))
+
+# 그룹 결과: group_similar_files 의 {그룹 이름: 파일 ID 목록} 또는 ExternalGrouping 같은
+# (그룹 이름, 그룹의 파일만 담은 FileStore) 스트림
+Groups = Union[Dict[str, List[int]], Iterable[Tuple[str, FileStore]]]
+
+def _group_items(groups: Groups, store: Optional[FileStore]) -> Iterator[Tuple[str, FileStore, List[int]]]:
+    """그룹마다 (그룹 이름, 저장소, 파일 ID 목록) 을 반환합니다.
+
+    groups 가 dict 이면 모든 그룹이 store 를 사용하고, 그렇지 않으면 스트림의
+    그룹별 FileStore 전체를 그룹으로 사용합니다.
+    """
+    if isinstance(groups, dict):
+        for group_name, file_ids in groups.items():
+            yield group_name, store, file_ids
+    else:
+        for group_name, group_store in groups:
+            yield group_name, group_store, list(range(len(group_store)))
+
+def _report_files(store: FileStore, file_ids: List[int]) -> List[Tuple[str, int, int, str]]:
+    """보고서에 쓸 (경로, 크기, 수정 시각(ns), 확장자) 목록입니다. 검색 때 모은 값만 사용합니다."""
+    return [(store.path_str(file_id), store.sizes[file_id], store.mtimes[file_id],
+             store.infos[file_id].extension.lstrip('.')) for file_id in file_ids]
+
+def write_report(groups: Groups, store: Optional[FileStore], output,
+                 report_format: str = 'text', page_lines: Optional[int] = None,
+                 prompt: Callable[[str], str] = input) -> int:
+    """중복 의심 그룹을 그룹 단위로 바로바로 기록하고 기록한 그룹 수를 반환합니다.
+
+    report_format 은 REPORT_FORMATS 중 하나입니다. 크기와 수정 시각은 검색할 때
+    store 에 저장된 값을 사용하므로 파일 시스템을 다시 조회하지 않습니다.
+    groups 가 스트림이면 store 는 사용하지 않으며, 그룹 수는 끝에 기록합니다.
+    page_lines 가 주어지면 'text' 출력을 그 줄 수마다 멈추고 prompt 로 사용자 입력을
+    기다리며, 사용자가 중단하면 그때까지 기록한 그룹 수를 반환합니다.
+    """
+    written = 0
+    printed_lines = 0
+    counted = isinstance(groups, dict)
+    
+    def emit(text: str) -> bool:
+        """텍스트를 출력하고, 사용자가 그만 보기를 고르면 False 를 반환합니다."""
+        nonlocal printed_lines, page_lines
+        output.write(text + '\n')
+        if page_lines:
+            printed_lines += text.count('\n') + 1
+            if printed_lines >= page_lines:
+                printed_lines = 0
+                output.flush()
+                answer = prompt("-- 계속: Enter, 모두 보기: a, 그만 보기: q -- ").strip().lower()
+                if answer == 'q':
+                    return False
+                if answer == 'a':
+                    page_lines = None
+        return True
+    
+    if report_format == 'text':
+        if counted and not groups:
+            emit("\n중복된 파일이 없습니다.")
+            return 0
+        if counted:
+            emit(f"\n{'='*50}\n총 {len(groups)}개의 중복 의심 파일 그룹이 발견되었습니다.\n{'='*50}")
+        else:
+            emit(f"\n{'='*50}\n중복 의심 파일 그룹\n{'='*50}")
+        stopped = False
+        for group_num, (_, group_store, file_ids) in enumerate(_group_items(groups, store), 1):
+            if not emit(f"\n[그룹 {group_num}] - {len(file_ids)}개 파일\n{'-'*30}"):
+                stopped = True
+                break
+            for path, size, _, ext in _report_files(group_store, file_ids):
+                if not emit(f"  • {path} ({format_file_size(size)}) [{ext}]"):
+                    stopped = True
+                    break
+            written += 1
+            if stopped:
+                break
+        if not counted and not stopped:
+            emit(f"\n총 {written}개의 중복 의심 파일 그룹이 발견되었습니다." if written
+                 else "\n중복된 파일이 없습니다.")
+    
+    elif report_format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(['group', 'key', 'path', 'size', 'mtime', 'ext'])
+        for group_num, (group_name, group_store, file_ids) in enumerate(_group_items(groups, store), 1):
+            for path, size, mtime_ns, ext in _report_files(group_store, file_ids):
+                writer.writerow([group_num, group_name, path, size, _format_mtime(mtime_ns), ext])
+            written += 1
+    
+    elif report_format == 'json':
+        # 전체를 메모리에 모으지 않도록 배열을 직접 열고 닫으며 그룹을 하나씩 씁니다.
+        output.write('[')
+        for group_num, (group_name, group_store, file_ids) in enumerate(_group_items(groups, store), 1):
+            record = {
+                'group': group_num,
+                'key': group_name,
+                'files': [{'path': path, 'size': size, 'mtime': _format_mtime(mtime_ns), 'ext': ext}
+                          for path, size, mtime_ns, ext in _report_files(group_store, file_ids)],
+            }
+            output.write((',\n' if written else '\n') + json.dumps(record, ensure_ascii=False))
+            written += 1
+        output.write('\n]\n')
+    
+    elif report_format == 'html':
+        title = f"중복 의심 파일 그룹 {len(groups)}개" if counted else "중복 의심 파일 그룹"
+        output.write('<!DOCTYPE html>\n<html lang="ko"><head><meta charset="utf-8">'
+                     '<title>중복 의심 파일 그룹</title><style>'
+                     'body{font-family:sans-serif}table{border-collapse:collapse}'
+                     'td,th{padding:2px 8px;border-bottom:1px solid #ddd}'
+                     'tr.group th{text-align:left;background:#eee}td.size{text-align:right}'
+                     f'</style></head><body>\n<h1>{title}</h1>\n<table>\n')
+        for group_num, (group_name, group_store, file_ids) in enumerate(_group_items(groups, store), 1):
+            output.write(f'<tr class="group"><th colspan="4">그룹 {group_num} - '
+                         f'{len(file_ids)}개 파일 ({html.escape(group_name)})</th></tr>\n')
+            for path, size, mtime_ns, ext in _report_files(group_store, file_ids):
+                output.write(f'<tr><td>{html.escape(path)}</td><td class="size">{format_file_size(size)}'
+                             f'</td><td>{_format_mtime(mtime_ns)}</td><td>{html.escape(ext)}</td></tr>\n')
+            written += 1
+        output.write('</table>\n')
+        if not counted:
+            output.write(f'<p>총 {written}개 그룹</p>\n')
+        output.write('</body></html>\n')
+    
+    else:
+        raise ValueError(f"알 수 없는 보고서 형식입니다: {report_format}")
+    
+    return written
+
+def report_format_for(path: str) -> str:
+    """보고서 파일 확장자로 형식을 정합니다."""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext == 'htm':
+        return 'html'
+    return ext if ext in REPORT_FORMATS else 'text'
+
+def _format_volumes(volumes: Iterable[int]) -> str:
+    """권수 목록을 '1-3, 5' 처럼 연속 구간으로 줄여 표시합니다."""
+    ranges = []
+    for volume in sorted(volumes):
+        if ranges and ranges[-1][1] == volume - 1:
+            ranges[-1][1] = volume
+        else:
+            ranges.append([volume, volume])
+    return ', '.join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+def write_series_report(index: SeriesIndex, store: FileStore, output,
+                        report_format: str = 'text') -> int:
+    """시리즈 색인에서 빠진 권, 같은 권의 사본, 개별 권을 대신하는 완결 파일을 기록합니다.
+
+    report_format 은 SERIES_REPORT_FORMATS 중 하나이며 기록한 시리즈 수를 반환합니다.
+    """
+    if report_format not in SERIES_REPORT_FORMATS:
+        raise ValueError(f"알 수 없는 보고서 형식입니다: {report_format}")
+    
+    written = 0
+    writer = None
+    if report_format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(['series', 'key', 'kind', 'volume', 'path'])
+    elif report_format == 'json':
+        output.write('[')
+    
+    for key, entry, missing, duplicates in index.findings():
+        STATS.count('series_missing_volumes', len(missing))
+        STATS.count('series_duplicate_volumes', len(duplicates))
+        STATS.count('series_complete_sets', len(entry.complete_sets))
+        if report_format == 'text':
+            state = ', 완결' if entry.completed else ''
+            lines = [f"\n[시리즈] {entry.title} ({_format_volumes(entry.volumes)}권{state})"]
+            if missing:
+                lines.append(f"  빠진 권: {_format_volumes(missing)}")
+            for volume, file_ids in duplicates:
+                lines.append(f"  {volume}권 사본 {len(file_ids)}개:")
+                lines.extend(f"    • {store.path_str(file_id)}" for file_id in file_ids)
+            for file_id in entry.complete_sets:
+                lines.append(f"  완결 파일 (개별 권 {len(entry.volumes)}개를 대신함): {store.path_str(file_id)}")
+            output.write('\n'.join(lines) + '\n')
+        elif report_format == 'csv':
+            for volume in missing:
+                writer.writerow([entry.title, key, 'missing', volume, ''])
+            for volume, file_ids in duplicates:
+                for file_id in file_ids:
+                    writer.writerow([entry.title, key, 'duplicate', volume, store.path_str(file_id)])
+            for file_id in entry.complete_sets:
+                writer.writerow([entry.title, key, 'complete_set', '', store.path_str(file_id)])
+        else:
+            record = {
+                'series': entry.title,
+                'key': key,
+                'volumes': sorted(entry.volumes),
+                'completed': entry.completed,
+                'missing': missing,
+                'duplicates': [{'volume': volume, 'paths': [store.path_str(f) for f in file_ids]}
+                               for volume, file_ids in duplicates],
+                'complete_sets': [store.path_str(f) for f in entry.complete_sets],
+            }
+            output.write((',\n' if written else '\n') + json.dumps(record, ensure_ascii=False))
+        written += 1
+    
+    if report_format == 'text':
+        output.write(f"\n총 {written}개 시리즈에서 확인할 내용이 있습니다.\n" if written
+                     else "\n확인할 시리즈가 없습니다.\n")
+    elif report_format == 'json':
+        output.write('\n]\n')
+    return written
+
+class Relocator:
+    """중복 파일을 모아 두는 폴더로 파일을 옮기는 이동 엔진입니다.
+
+    duplicate_dir 를 지정하지 않으면 원본과 같은 장치에 있는 검색 대상 폴더
+    (다른 장치가 연결된 하위 폴더라면 그 장치의 가장 상위 폴더) 아래
+    DUPLICATE_DIR_NAME 폴더를 사용하므로 이동이 복사 없이 os.rename 으로 끝납니다.
+    이름 충돌은 대상 폴더를 한 번만 읽어 메모리에서 해결하고, 이동은 스레드
+    풀에서 동시에 실행합니다. 권한 오류가 난 파일은 deferred 에 모아 두었다가
+    retry_deferred() 에서 다시 시도합니다. io_backend 가 주어지면 원본의 장치 조회와
+    이동을 그 위에서 동시에 실행합니다.
+    """
+    
+    def __init__(self, root_dir: str, duplicate_dir: Optional[str] = None,
+                 max_workers: int = MOVE_WORKERS, io_backend: Optional[IOBackend] = None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.duplicate_dir = os.path.abspath(duplicate_dir) if duplicate_dir else None
+        self.max_workers = max(1, max_workers)
+        self.io_backend = io_backend
+        self.deferred: List[Tuple[str, str]] = []
+        self.failed: List[Tuple[str, str]] = []
+        self._target_dirs: Dict[int, str] = {}
+        self._taken: Dict[str, Set[str]] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+    
+    def _target_dir(self, source: str, device: Optional[int] = None) -> str:
+        """원본 파일을 옮길 폴더를 정합니다. device 는 미리 조회한 원본의 장치 번호입니다."""
+        if self.duplicate_dir is not None:
+            return self.duplicate_dir
+        
+        if device is None:
+            device = os.stat(source).st_dev
+        target_dir = self._target_dirs.get(device)
+        if target_dir is None:
+            base = os.path.dirname(source)
+            if os.stat(self.root_dir).st_dev == device:
+                base = self.root_dir
+            else:
+                while True:
+                    parent = os.path.dirname(base)
+                    if (parent == base or not parent.startswith(self.root_dir)
+                            or os.stat(parent).st_dev != device):
+                        break
+                    base = parent
+            target_dir = self._target_dirs[device] = os.path.join(base, DUPLICATE_DIR_NAME)
+        return target_dir
+    
+    def _reserve(self, target_dir: str, name: str) -> str:
+        """대상 폴더에서 겹치지 않는 파일 이름을 예약합니다."""
+        taken = self._taken.get(target_dir)
+        if taken is None:
+            os.makedirs(target_dir, exist_ok=True)
+            taken = self._taken[target_dir] = set(os.listdir(target_dir))
+        
+        if name not in taken:
+            taken.add(name)
+            return name
+        
+        base, ext = os.path.splitext(name)
+        counter = self._counters.get((target_dir, name), 1)
+        while f"{base}_{counter}{ext}" in taken:
+            counter += 1
+        self._counters[(target_dir, name)] = counter + 1
+        unique_name = f"{base}_{counter}{ext}"
+        taken.add(unique_name)
+        return unique_name
+    
+    def plan(self, sources: Iterable[str]) -> List[Tuple[str, str]]:
+        """원본마다 이동할 경로를 정해 (원본, 대상) 목록을 반환합니다."""
+        devices = itertools.repeat(None)
+        if self.io_backend is not None and self.duplicate_dir is None:
+            def device_of(source: str):
+                try:
+                    return os.stat(source).st_dev
+                except OSError as e:
+                    return e
+            sources = list(sources)
+            devices = self.io_backend.map(device_of, sources)
+        
+        moves = []
+        for source, device in zip(sources, devices):
+            try:
+                if isinstance(device, OSError):
+                    raise device
+                target_dir = self._target_dir(source, device)
+                moves.append((source, os.path.join(target_dir, self._reserve(target_dir, os.path.basename(source)))))
+            except OSError as e:
+                self.failed.append((source, str(e)))
+                print(f"  ✗ {source} - 이동 실패: {str(e)}")
+        return moves
+    
+    @staticmethod
+    def _move(source: str, target: str) -> None:
+        try:
+            os.rename(source, target)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(source, target)
+    
+    def _run(self, moves: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+        """이동을 동시에 실행하고 (성공한 이동, 권한 오류가 난 이동) 을 반환합니다."""
+        moved = []
+        pending = []
+        
+        def attempt(move: Tuple[str, str]) -> Optional[Exception]:
+            try:
+                self._move(*move)
+                return None
+            except Exception as e:
+                return e
+        
+        results = _io_map(attempt, moves, self.io_backend, min(self.max_workers, len(moves)))
+        for (source, target), error in zip(moves, results):
+            if error is None:
+                moved.append((source, target))
+                print(f"  ✓ {source} -> {target}")
+            elif isinstance(error, PermissionError):
+                pending.append((source, target))
+            else:
+                self.failed.append((source, str(error)))
+                print(f"  ✗ {source} - 이동 실패: {str(error)}")
+        return moved, pending
+    
+    def execute(self, moves: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """이동을 실행하고 성공한 (원본, 대상) 목록을 반환합니다."""
+        moved, pending = self._run(moves)
+        for source, _ in pending:
+            print(f"  ⚠ {source} - 권한 오류, 나중에 다시 시도합니다")
+        self.deferred.extend(pending)
+        return moved
+    
+    def move(self, sources: Iterable[str]) -> List[Tuple[str, str]]:
+        """plan 과 execute 를 한 번에 수행합니다."""
+        return self.execute(self.plan(sources))
+    
+    def retry_deferred(self, retries: int = MOVE_RETRIES, delay: float = 1.0) -> List[Tuple[str, str]]:
+        """권한 오류로 미뤄둔 이동을 다시 시도합니다."""
+        moved = []
+        for attempt in range(retries):
+            if not self.deferred:
+                break
+            print(f"\n권한 오류로 미뤄둔 {len(self.deferred)}개 파일을 다시 이동합니다... ({attempt + 1}/{retries})")
+            time.sleep(delay)
+            retried, self.deferred = self._run(self.deferred)
+            moved.extend(retried)
+        
+        for source, _ in self.deferred:
+            self.failed.append((source, "권한 오류"))
+            print(f"  ✗ {source} - 권한 오류로 이동 실패")
+        self.deferred = []
+        return moved
+
+class MoveJournal:
+    """중복 파일 처리 과정을 기록하는 추가 전용(append-only) 작업 기록입니다.
+
+    JSON Lines 형식으로 분석된 그룹, 그룹별 이동 계획, 완료된 이동, 그룹 완료를
+    차례로 기록합니다. 이동 계획은 실행 전에 fsync 하고, 완료 기록은
+    JOURNAL_SYNC_RECORDS 개마다 모아서 fsync 합니다. 중단된 작업은 다시 분석하지
+    않고 이어서 진행할 수 있으며, undo() 로 기록된 이동을 거꾸로 되돌립니다.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._unsynced = 0
+        self._reset()
+        if os.path.exists(path):
+            self._load()
+    
+    def _reset(self) -> None:
+        self.root_dir: Optional[str] = None
+        self.groups: Dict[str, List[Tuple[str, int, int]]] = {}
+        self.plans: Dict[str, List[Tuple[str, str]]] = {}
+        self.decided: Set[str] = set()
+        self.done: Dict[str, str] = {}
+        self.finished = False
+    
+    @classmethod
+    def for_directory(cls, root_dir: str) -> 'MoveJournal':
+        return cls(os.path.join(os.path.abspath(root_dir), JOURNAL_FILENAME))
+    
+    @property
+    def unfinished(self) -> bool:
+        """완료되지 않은 이전 작업이 있는지 여부입니다."""
+        return self.root_dir is not None and not self.finished
+    
+    def _load(self) -> None:
+        with open(self.path, encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # 기록 도중 중단된 마지막 줄
+                op = record['op']
+                if op == 'session':
+                    self.root_dir = record['root']
+                elif op == 'group':
+                    self.groups[record['key']] = [tuple(item) for item in record['files']]
+                elif op == 'plan':
+                    self.plans[record['key']] = [tuple(move) for move in record['moves']]
+                    self.decided.add(record['key'])
+                elif op == 'skip':
+                    self.decided.add(record['key'])
+                elif op == 'move':
+                    self.done[record['src']] = record['dst']
+                elif op == 'undo':
+                    self.done.pop(record['src'], None)
+                elif op == 'end':
+                    self.finished = True
+    
+    def _open(self, mode: str) -> None:
+        if self._file is None:
+            self._file = open(self.path, mode, encoding='utf-8', errors='surrogateescape')
+    
+    def _append(self, record: dict) -> None:
+        self._open('a')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_SYNC_RECORDS:
+            self.sync()
+    
+    def sync(self) -> None:
+        """기록을 디스크에 확정합니다."""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+    
+    def start(self, root_dir: str, groups: Dict[str, List[int]], store: FileStore) -> None:
+        """새 작업을 시작합니다. 이전 기록은 지웁니다.
+
+        그룹을 스트림으로 받는 경우 groups 를 비워 두고 그룹마다 add_group() 을 호출합니다.
+        """
+        self.discard()
+        self.root_dir = os.path.abspath(root_dir)
+        self._open('w')
+        self._append({'op': 'session', 'root': self.root_dir, 'time': time.time()})
+        for key, file_ids in groups.items():
+            self.add_group(key, store, file_ids)
+        self.sync()
+    
+    def add_group(self, key: str, store: FileStore, file_ids: List[int]) -> None:
+        """분석된 그룹 하나를 기록합니다."""
+        files = [(store.path_str(i), store.sizes[i], store.mtimes[i]) for i in file_ids]
+        self.groups[key] = files
+        self._append({'op': 'group', 'key': key, 'files': files})
+    
+    def discard(self) -> None:
+        """이전 작업 기록을 버립니다. 파일은 다음 start() 에서 덮어씁니다."""
+        self.close()
+        self._reset()
+    
+    def plan(self, key: str, moves: List[Tuple[str, str]]) -> None:
+        """그룹의 이동 계획을 기록합니다. 이동 전에 sync() 해야 합니다."""
+        self.plans[key] = moves
+        self.decided.add(key)
+        self._append({'op': 'plan', 'key': key, 'moves': moves})
+    
+    def skip(self, key: str) -> None:
+        self.decided.add(key)
+        self._append({'op': 'skip', 'key': key})
+    
+    def moved(self, moves: List[Tuple[str, str]]) -> None:
+        """완료된 이동을 기록합니다."""
+        for source, target in moves:
+            self.done[source] = target
+            self._append({'op': 'move', 'src': source, 'dst': target})
+    
+    def finish(self) -> None:
+        self.finished = True
+        self._append({'op': 'end'})
+        self.close()
+    
+    def pending_moves(self) -> List[Tuple[str, str]]:
+        """계획되었지만 완료 기록이 없는 이동 목록입니다."""
+        return [(source, target) for key in self.plans for source, target in self.plans[key]
+                if source not in self.done]
+    
+    def remaining_groups(self) -> Tuple[FileStore, Dict[str, List[int]]]:
+        """아직 결정하지 않은 그룹을 기록된 정보만으로 다시 구성합니다."""
+        store = FileStore()
+        groups = {}
+        for key, files in self.groups.items():
+            if key in self.decided:
+                continue
+            file_ids = []
+            for path, size, mtime_ns in files:
+                dir_path, name = os.path.split(path)
+                stem, ext = os.path.splitext(name)
+                file_ids.append(store.add(dir_path, name, normalize_filename(stem), size, mtime_ns,
+                                          parse_title(stem, ext)))
+            groups[key] = file_ids
+        return store, groups
+    
+    def recover(self, relocator: 'Relocator') -> int:
+        """중단된 이동을 마무리하고 완료된 이동 수를 반환합니다.
+
+        이미 옮겨졌지만 기록되지 않은 이동은 기록만 하고, 원본이 남아 있는
+        이동은 다시 실행합니다.
+        """
+        to_run = []
+        finished = []
+        for source, target in self.pending_moves():
+            if os.path.exists(source):
+                if not os.path.exists(target):
+                    to_run.append((source, target))
+            elif os.path.exists(target):
+                finished.append((source, target))
+        self.moved(finished)
+        moved = relocator.execute(to_run) + relocator.retry_deferred()
+        self.moved(moved)
+        self.sync()
+        return len(finished) + len(moved)
+    
+    def undo(self, max_workers: int = MOVE_WORKERS,
+             io_backend: Optional[IOBackend] = None) -> Tuple[int, int]:
+        """기록된 이동을 최근 것부터 되돌립니다. (복원한 수, 실패한 수) 를 반환합니다."""
+        if self.root_dir is None:
+            return 0, 0
+        moves = list(self.done.items())[::-1]
+        
+        def restore(move: Tuple[str, str]) -> Optional[Exception]:
+            source, target = move
+            try:
+                if os.path.exists(source):
+                    raise FileExistsError(errno.EEXIST, "원래 위치에 파일이 이미 있습니다", source)
+                os.makedirs(os.path.dirname(source), exist_ok=True)
+                Relocator._move(target, source)
+                return None
+            except Exception as e:
+                return e
+        
+        restored = failed = 0
+        for (source, target), error in zip(moves, _io_map(restore, moves, io_backend, max_workers)):
+            if error is None:
+                restored += 1
+                self.done.pop(source, None)
+                self._append({'op': 'undo', 'src': source, 'dst': target})
+                print(f"  ↺ {target} -> {source}")
+            else:
+                failed += 1
+                print(f"  ✗ {target} - 되돌리기 실패: {str(error)}")
+        if not failed:
+            self._append({'op': 'end'})
+            self.finished = True
+        self.close()
+        return restored, failed
+
+def _keep_largest(store: FileStore, file_ids: List[int]) -> int:
+    return min(file_ids, key=lambda i: (-store.sizes[i], store.path_str(i)))
+
+def _keep_newest(store: FileStore, file_ids: List[int]) -> int:
+    return min(file_ids, key=lambda i: (-store.mtimes[i], store.path_str(i)))
+
+def _keep_epub(store: FileStore, file_ids: List[int]) -> int:
+    return min(file_ids, key=lambda i: (store.infos[i].extension != '.epub', -store.sizes[i],
+                                        store.path_str(i)))
+
+def _keep_shortest_path(store: FileStore, file_ids: List[int]) -> int:
+    return min(file_ids, key=lambda i: (len(store.path_str(i)), store.path_str(i)))
+
+# 그룹에서 남길 파일을 고르는 규칙 (동점이면 경로 순서로 앞선 파일)
+KEEP_POLICIES = {
+    'largest': _keep_largest,  # 가장 큰 파일
+    'newest': _keep_newest,  # 가장 최근에 수정된 파일
+    'epub': _keep_epub,  # epub 우선, 그다음 가장 큰 파일
+    'shortest': _keep_shortest_path,  # 경로가 가장 짧은 파일
+}
+
+def write_plan(groups: Groups, store: Optional[FileStore], keep_policy: str,
+               output, plan_format: str = 'jsonl',
+               relocator: Optional[Relocator] = None,
+               journal: Optional[MoveJournal] = None) -> Tuple[int, int]:
+    """그룹마다 남길 파일을 정하고 이동 계획을 output 에 그룹 단위로 기록합니다.
+
+    plan_format 은 'jsonl' 또는 'csv' 입니다. relocator 가 주어지면 기록한
+    그룹의 파일을 MOVE_BATCH_FILES 개씩 모아 이동하며, journal 이 주어지면
+    이동 계획과 결과를 작업 기록에 남깁니다. 작업 기록에 없는 그룹(스트림으로
+    받은 그룹)은 계획보다 먼저 기록합니다.
+    (그룹 수, 이동한 파일 수) 를 반환합니다.
+    """
+    choose = KEEP_POLICIES[keep_policy]
+    writer = None
+    if plan_format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(['group', 'action', 'path', 'size'])
+    
+    moved_count = 0
+    group_count = 0
+    pending = []
+    for group_count, (group_name, group_store, file_ids) in enumerate(_group_items(groups, store), 1):
+        keep_id = choose(group_store, file_ids)
+        move_ids = [file_id for file_id in file_ids if file_id != keep_id]
+        
+        if writer is not None:
+            writer.writerow([group_count, 'keep', group_store.path_str(keep_id), group_store.sizes[keep_id]])
+            for file_id in move_ids:
+                writer.writerow([group_count, 'move', group_store.path_str(file_id), group_store.sizes[file_id]])
+        else:
+            output.write(json.dumps({
+                'group': group_count,
+                'keep': group_store.path_str(keep_id),
+                'move': [group_store.path_str(file_id) for file_id in move_ids],
+            }, ensure_ascii=False) + '\n')
+        output.flush()
+        
+        if relocator is not None:
+            moves = relocator.plan(group_store.path_str(file_id) for file_id in move_ids)
+            if journal is not None:
+                if group_name not in journal.groups:
+                    journal.add_group(group_name, group_store, file_ids)
+                journal.plan(group_name, moves)
+            pending.extend(moves)
+            if len(pending) >= MOVE_BATCH_FILES:
+                moved_count += _execute_moves(relocator, pending, journal)
+                pending = []
+    
+    if relocator is not None:
+        moved_count += _execute_moves(relocator, pending, journal)
+        retried = relocator.retry_deferred()
+        moved_count += len(retried)
+        if journal is not None:
+            journal.moved(retried)
+            journal.finish()
+    
+    return group_count, moved_count
+
+def _execute_moves(relocator: Relocator, moves: List[Tuple[str, str]],
+                   journal: Optional[MoveJournal]) -> int:
+    """기록된 계획을 확정한 뒤 이동을 실행하고 결과를 기록합니다."""
+    if journal is not None:
+        journal.sync()
+    moved = relocator.execute(moves)
+    if journal is not None:
+        journal.moved(moved)
+    return len(moved)